@@ -9,17 +9,26 @@ __author__ = "Team TechTribe"
 
 # Import all agent functions for easier access
 try:
-    from .crop_advisor import get_crop_advice
-    from .market_broker import get_market_broker_response
-    from .crop_disease_detector import analyze_crop_image
-    from .alert_agent import check_disease_alert, collect_user_report
+    from .crop_advisor import get_crop_advice, aget_crop_advice, get_crop_advice_batch, aget_crop_advice_batch, \
+        stream_crop_advice
+    from .market_broker import get_market_broker_response, aget_market_broker_response, stream_market_broker_response
+    from .crop_disease_detector import analyze_crop_image, aanalyze_crop_image
+    from .alert_agent import check_disease_alert, acheck_disease_alert, collect_user_report
     
     __all__ = [
         'get_crop_advice',
         'get_market_broker_response', 
         'analyze_crop_image',
         'check_disease_alert',
-        'collect_user_report'
+        'collect_user_report',
+        'aget_crop_advice',
+        'aget_market_broker_response',
+        'aanalyze_crop_image',
+        'acheck_disease_alert',
+        'get_crop_advice_batch',
+        'aget_crop_advice_batch',
+        'stream_crop_advice',
+        'stream_market_broker_response'
     ]
 except ImportError as e:
     print(f"Warning: Could not import some agents: {e}")
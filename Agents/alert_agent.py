@@ -3,13 +3,19 @@
 import os
 import pandas as pd
 from datetime import datetime, timedelta
-import google.generativeai as genai
-from dotenv import load_dotenv
 
-# Load Gemini API
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel("gemini-1.5-flash")
+if __package__:
+    from .model_registry import get_model
+    from .report_store import REPORT_COLUMNS, get_report_store
+    from .outbreak import get_outbreak_detector
+    from .response_cache import normalize_text
+    from .alert_messages import get_message_cache
+else:  # run as a script from inside Agents/
+    from model_registry import get_model
+    from report_store import REPORT_COLUMNS, get_report_store
+    from outbreak import get_outbreak_detector
+    from response_cache import normalize_text
+    from alert_messages import get_message_cache
 
 # Initial static data
 initial_data = [
@@ -17,16 +23,33 @@ initial_data = [
     {"crop": "rice", "disease": "false smut", "location": "jaipur", "report_date": "2025-07-30"},
 ]
 
-# In-memory user reports
-user_reports = []
+def get_reports():
+    """Shared report store, seeded with initial_data the first time it is opened"""
+    store = get_report_store()
+    store.seed(initial_data)
+    return store
 
-def get_combined_dataframe():
-    return pd.concat([pd.DataFrame(initial_data), pd.DataFrame(user_reports)], ignore_index=True)
+def get_combined_dataframe(crop=None, location=None, days=None):
+    """Reports as a DataFrame, filtered in the store rather than in pandas"""
+    return pd.DataFrame(get_reports().query(crop, location, days), columns=list(REPORT_COLUMNS))
 
-def check_disease_alert(crop, location, is_alert, disease_name=None, date=None):
-    try:
-        if is_alert:
-            prompt = f"""
+def get_nearby_reports(crop, location, radius_km=None, days=7):
+    """Reports for a crop from every reported place within radius_km of a location"""
+    get_reports()
+    places = get_outbreak_detector().nearby_places(location, radius_km)
+    return get_reports().query(crop, places, days)
+
+# Alerts are written in English and then in the farmer's language
+DEFAULT_LANGUAGE = "hi"
+LANGUAGE_NAMES = {
+    "hi": "Hindi", "mr": "Marathi", "pa": "Punjabi", "gu": "Gujarati", "bn": "Bengali",
+    "ta": "Tamil", "te": "Telugu", "kn": "Kannada", "ml": "Malayalam", "or": "Odia",
+}
+
+def build_alert_prompt(is_alert, language=DEFAULT_LANGUAGE):
+    language_name = LANGUAGE_NAMES.get(language, "Hindi")
+    if is_alert:
+        prompt = f"""
 You are an agricultural assistant. please note the alert for the farmer.
 - A recent crop disease alert has been reported.
 - give the response for crop disease and solution what to do.
@@ -37,36 +60,130 @@ You are an agricultural assistant. please note the alert for the farmer.
 - give the solution for the crop disease.
 - Keep it concise and informative.
 - Suggest medicines/pesticides.
-- First in English, then in Hindi.
+- First in English, then in {language_name}.
 
 Do not give response in report format, just write a message.
 
-Remark - Always first explain in English, then explain in Hindi.
+Remark - Always first explain in English, then explain in {language_name}.
 """
-        elif not is_alert:
-            prompt = f"""
+    elif not is_alert:
+        prompt = f"""
 You are an agricultural assistant. please note the alert for the farmer.
 - No recent crop disease alerts have been reported.
 - Write a cheerful and motivating message for the farmer.
 - Encourage them to use our app..
-- First in English, then in Hindi.
+- First in English, then in {language_name}.
 
 Do not give response in report format, just write a message.
-Remark - Always first explain in English, then explain in Hindi.    
+Remark - Always first explain in English, then explain in {language_name}.    
 """    
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"⚠️ Gemini Error: {e}"
+    return prompt
+
+# Nothing fired, so there is nothing for the model to phrase
+NO_ALERT_MESSAGE = """✅ No recent disease outbreaks have been reported for {crop} around {location}. Keep inspecting your field regularly and report anything unusual through the app.
+
+✅ {location} के आसपास {crop} में हाल ही में किसी रोग के फैलने की कोई सूचना नहीं है। अपने खेत की नियमित जाँच करते रहें और कुछ भी असामान्य दिखे तो ऐप के ज़रिए रिपोर्ट करें।"""
+
+REPORT_RECORDED_MESSAGE = """📝 Thank you, your report of {disease} on {crop} in {location} has been recorded. We will alert farmers nearby if more reports come in.
+
+📝 धन्यवाद, {location} में {crop} पर {disease} की आपकी रिपोर्ट दर्ज कर ली गई है। और रिपोर्ट आने पर हम आसपास के किसानों को सतर्क करेंगे।"""
+
+def as_day(day):
+    """A "YYYY-MM-DD" string or date as a date; None stays None (today)"""
+    if isinstance(day, str):
+        return datetime.strptime(day, "%Y-%m-%d").date()
+    return day
+
+def find_outbreak(crop, location, disease_name=None, day=None):
+    """The largest outbreak fired for a crop and location (and disease, if given) as of day, default today"""
+    get_reports()
+    outbreaks = get_outbreak_detector().check(crop, location, today=as_day(day))
+    if disease_name:
+        outbreaks = [o for o in outbreaks if o["disease"] == normalize_text(disease_name)]
+    return outbreaks[0] if outbreaks else None
+
+# Shown while the advice for a new crop-disease pair is generated in the background
+ALERT_FALLBACK_ADVICE = """Inspect your field today, remove badly affected plants and contact your nearest Krishi Vigyan Kendra or agriculture officer before spraying.
+
+आज ही अपने खेत की जाँच करें, बुरी तरह प्रभावित पौधों को हटा दें और छिड़काव से पहले अपने नज़दीकी कृषि विज्ञान केंद्र या कृषि अधिकारी से संपर्क करें।"""
+
+def outbreak_header(crop, location, disease_name, outbreak=None):
+    """The local facts of an alert; the advice under it is shared across farmers"""
+    if outbreak:
+        places = ", ".join(outbreak["places"])
+        return (f"⚠️ Disease alert: {disease_name} on {crop} near {location} - "
+                f"{outbreak['recent']} reports in the last week from {places}.\n"
+                f"⚠️ रोग चेतावनी: {location} के पास {crop} में {disease_name} - "
+                f"पिछले सप्ताह {outbreak['recent']} रिपोर्ट ({places})।")
+    return f"⚠️ Disease alert: {disease_name} on {crop} near {location}.\n⚠️ रोग चेतावनी: {location} के पास {crop} में {disease_name}।"
+
+def generate_alert_message(crop, disease, alerted, language=DEFAULT_LANGUAGE):
+    """Model-written advice for a crop and disease, with nothing specific to one farmer in it"""
+    prompt = build_alert_prompt(alerted, language) + f"\nCrop: {crop}\nDisease: {disease}"
+    return get_model().generate_content(prompt).text.strip()
+
+async def agenerate_alert_message(crop, disease, alerted, language=DEFAULT_LANGUAGE):
+    """Async version of generate_alert_message"""
+    prompt = build_alert_prompt(alerted, language) + f"\nCrop: {crop}\nDisease: {disease}"
+    response = await get_model().generate_content_async(prompt)
+    return response.text.strip()
+
+def resolve_alert(crop, location, is_alert, disease_name, day=None):
+    """Returns (is_alert, outbreak); is_alert=None means decide from the reports in the week up to day"""
+    if is_alert is not None:
+        return is_alert, None
+    outbreak = find_outbreak(crop, location, disease_name, day)
+    return outbreak is not None, outbreak
+
+def check_disease_alert(crop, location, is_alert=None, disease_name=None, date=None, language=DEFAULT_LANGUAGE, wait=True):
+    """Alert text for a crop and location, from the reports in the week up to date (default today).
+
+    Advice comes from the message cache; on a miss or expiry it is generated now, or
+    with wait=False a generic template is used while it is generated in
+    the background.
+    """
+    is_alert, outbreak = resolve_alert(crop, location, is_alert, disease_name, date)
+    if not is_alert:
+        return NO_ALERT_MESSAGE.format(crop=crop, location=location)
+    disease_name = disease_name or (outbreak or {}).get("disease", "disease")
+    cache = get_message_cache(generate_alert_message)
+    if not wait:
+        # A miss is generated in the background, this answer uses the template
+        advice = cache.get(crop, disease_name, True, language) or ALERT_FALLBACK_ADVICE
+    else:
+        advice = cache.peek(crop, disease_name, True, language)
+        if advice is None:
+            try:
+                advice = cache.generate(crop, disease_name, True, language)
+            except Exception as e:
+                return f"⚠️ Gemini Error: {e}"
+    return outbreak_header(crop, location, disease_name, outbreak) + "\n\n" + advice
+
+async def acheck_disease_alert(crop, location, is_alert=None, disease_name=None, date=None, language=DEFAULT_LANGUAGE, wait=True):
+    """Async version of check_disease_alert"""
+    is_alert, outbreak = resolve_alert(crop, location, is_alert, disease_name, date)
+    if not is_alert:
+        return NO_ALERT_MESSAGE.format(crop=crop, location=location)
+    disease_name = disease_name or (outbreak or {}).get("disease", "disease")
+    cache = get_message_cache(generate_alert_message)
+    if not wait:
+        advice = cache.get(crop, disease_name, True, language) or ALERT_FALLBACK_ADVICE
+    else:
+        advice = cache.peek(crop, disease_name, True, language)
+        if advice is None:
+            try:
+                advice = await agenerate_alert_message(crop, disease_name, True, language)
+                cache.put(crop, disease_name, True, language, advice)
+            except Exception as e:
+                return f"⚠️ Gemini Error: {e}"
+    return outbreak_header(crop, location, disease_name, outbreak) + "\n\n" + advice
 
 def collect_user_report(crop, disease, location):
     today = datetime.today().strftime("%Y-%m-%d")
-    user_reports.append({
-        "crop": crop.lower(),
-        "disease": disease.lower(),
-        "location": location.lower(),
-        "report_date": today
-    })
-    gemini_msg = check_disease_alert(crop, location, True, disease, today)
-    return gemini_msg
-
+    get_reports().add(crop, disease, location, today)
+    get_outbreak_detector().observe(crop, disease, location, today)
+    # Only a report that tips the counts into an outbreak gets alert advice,
+    # and that never waits on the model
+    if find_outbreak(crop, location, disease) is None:
+        return REPORT_RECORDED_MESSAGE.format(crop=crop, disease=disease, location=location)
+    return check_disease_alert(crop, location, None, disease, today, wait=False)
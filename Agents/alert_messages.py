@@ -0,0 +1,240 @@
+# alert_messages.py - Pre-generated alert advice per (crop, disease, alerted, language)
+#
+#   python Agents/alert_messages.py --prewarm [--languages hi mr] [--force]
+#
+# The advice for "wheat rust" is the same whichever farmer asks, so it is
+# generated once, kept on disk and refreshed in the background when it ages.
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__:
+    from .response_cache import DATA_DIR, normalize_crop, normalize_text
+    from .gateway import priority, BATCH
+else:  # run as a script from inside Agents/
+    from response_cache import DATA_DIR, normalize_crop, normalize_text
+    from gateway import priority, BATCH
+
+MESSAGES_PATH = os.getenv("AGRIBOT_ALERT_MESSAGES_PATH", os.path.join(DATA_DIR, "alert_messages.json"))
+
+# Regenerated after a week so advice on treatments does not go stale
+MESSAGE_TTL = 7 * 24 * 60 * 60
+
+# Pairs farmers report most, generated ahead of time by --prewarm
+TOP_CROP_DISEASES = [
+    ("wheat", "rust"), ("wheat", "loose smut"), ("wheat", "karnal bunt"),
+    ("rice", "blast"), ("rice", "false smut"), ("rice", "bacterial leaf blight"), ("rice", "brown plant hopper"),
+    ("maize", "fall armyworm"), ("maize", "leaf blight"),
+    ("cotton", "pink bollworm"), ("cotton", "whitefly"), ("cotton", "leaf curl virus"),
+    ("tomato", "early blight"), ("tomato", "late blight"), ("tomato", "leaf curl virus"),
+    ("potato", "late blight"), ("potato", "early blight"),
+    ("chickpea", "wilt"), ("chickpea", "pod borer"),
+    ("mustard", "aphid"), ("mustard", "white rust"),
+    ("sugarcane", "red rot"), ("soybean", "yellow mosaic"), ("groundnut", "tikka leaf spot"),
+    ("onion", "purple blotch"), ("chilli", "thrips"), ("banana", "panama wilt"),
+]
+
+
+class AlertMessageCache:
+    """JSON-backed message store; misses and stale entries are generated in the background.
+
+    generator(crop, disease, alerted, language) returns the message text and is
+    normally alert_agent.generate_alert_message.
+    """
+
+    def __init__(self, path=MESSAGES_PATH, ttl=MESSAGE_TTL, generator=None):
+        self.path = path
+        self.ttl = ttl
+        self.generator = generator
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'generated': 0, 'failures': 0}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="alert-messages")
+        self._refresher = None
+        self.load()
+
+    @staticmethod
+    def key(crop, disease, alerted, language):
+        return "|".join([normalize_crop(crop), normalize_text(disease), "alert" if alerted else "clear", language])
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def save(self):
+        """Write atomically so a crash never leaves a half-written file"""
+        with self._lock:
+            snapshot = dict(self._entries)
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    def peek(self, crop, disease, alerted, language):
+        """Fresh cached message or None; never schedules a generation.
+
+        For callers that generate the message themselves on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(self.key(crop, disease, alerted, language))
+        if entry is None or entry["created_at"] + self.ttl < time.time():
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry["message"]
+
+    def get(self, crop, disease, alerted, language):
+        """Cached message or None; never blocks on the model.
+
+        A miss or an expired entry queues a background generation, and an
+        expired entry is still returned until its replacement is ready.
+        """
+        key = self.key(crop, disease, alerted, language)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            self.schedule(crop, disease, alerted, language)
+            return None
+        if entry["created_at"] + self.ttl < time.time():
+            self.stats['stale_hits'] += 1
+            self.schedule(crop, disease, alerted, language)
+        else:
+            self.stats['hits'] += 1
+        return entry["message"]
+
+    def put(self, crop, disease, alerted, language, message):
+        with self._lock:
+            self._entries[self.key(crop, disease, alerted, language)] = {"message": message, "created_at": time.time()}
+
+    def generate(self, crop, disease, alerted, language, save=True):
+        """Generate and store one message now; returns it"""
+        message = self.generator(crop, disease, alerted, language)
+        self.put(crop, disease, alerted, language, message)
+        self.stats['generated'] += 1
+        if save:
+            self.save()
+        return message
+
+    def _generate_pending(self, key, crop, disease, alerted, language):
+        try:
+            # Background refreshes give way to farmers waiting for an answer
+            with priority(BATCH):
+                self.generate(crop, disease, alerted, language)
+        except Exception as e:
+            self.stats['failures'] += 1
+            print("❌ Alert message generation error:", e)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def schedule(self, crop, disease, alerted, language):
+        """Queue a background generation unless one is already queued for the key"""
+        if self.generator is None:
+            return
+        key = self.key(crop, disease, alerted, language)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._generate_pending, key, crop, disease, alerted, language)
+
+    def is_fresh(self, crop, disease, alerted, language):
+        with self._lock:
+            entry = self._entries.get(self.key(crop, disease, alerted, language))
+        return entry is not None and entry["created_at"] + self.ttl >= time.time()
+
+    def prewarm(self, pairs=TOP_CROP_DISEASES, languages=("hi",), force=False):
+        """Generate alert messages for every pair and language that is missing or expired"""
+        generated = 0
+        for crop, disease in pairs:
+            for language in languages:
+                if not force and self.is_fresh(crop, disease, True, language):
+                    continue
+                try:
+                    with priority(BATCH):
+                        self.generate(crop, disease, True, language, save=False)
+                    generated += 1
+                except Exception as e:
+                    self.stats['failures'] += 1
+                    print(f"❌ Could not generate {crop} / {disease} ({language}):", e)
+        self.save()
+        return generated
+
+    def expiring(self, margin=0.9):
+        """(crop, disease, alerted, language) for entries past margin of their TTL"""
+        cutoff = time.time() - self.ttl * margin
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry["created_at"] < cutoff]
+        result = []
+        for key in keys:
+            crop, disease, alerted, language = key.split("|")
+            result.append((crop, disease, alerted == "alert", language))
+        return result
+
+    def start_refresh(self, interval=60 * 60):
+        """Daemon thread that regenerates entries shortly before they expire"""
+        if self._refresher is not None:
+            return
+
+        def refresh_loop():
+            while True:
+                time.sleep(interval)
+                for crop, disease, alerted, language in self.expiring():
+                    self.schedule(crop, disease, alerted, language)
+
+        self._refresher = threading.Thread(target=refresh_loop, name="alert-message-refresh", daemon=True)
+        self._refresher.start()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_message_cache(generator=None):
+    """Shared cache at AGRIBOT_ALERT_MESSAGES_PATH; the first caller supplies the generator"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AlertMessageCache(generator=generator)
+                _cache.start_refresh()
+    if _cache.generator is None and generator is not None:
+        _cache.generator = generator
+    return _cache
+
+
+def set_message_cache(cache):
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate disease alert messages")
+    parser.add_argument("--prewarm", action="store_true", help="generate messages for the top crop-disease pairs")
+    parser.add_argument("--languages", nargs="+", default=["hi"], help="second language codes, e.g. hi mr")
+    parser.add_argument("--force", action="store_true", help="regenerate messages that are still fresh")
+    args = parser.parse_args()
+
+    if __package__:
+        from .alert_agent import generate_alert_message
+    else:
+        from alert_agent import generate_alert_message
+
+    cache = AlertMessageCache(generator=generate_alert_message)
+    if args.prewarm:
+        count = cache.prewarm(languages=args.languages, force=args.force)
+        print(f"✅ Generated {count} messages, {len(cache)} stored in {cache.path}")
+    else:
+        print(f"📦 {len(cache)} messages stored in {cache.path}")
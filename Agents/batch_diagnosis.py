@@ -0,0 +1,219 @@
+# batch_diagnosis.py - Diagnose whole folders of leaf photos from field surveys
+#
+#   python Agents/batch_diagnosis.py survey_photos/ -o survey.jsonl [--rate 60] [--concurrency 4]
+#
+# Photos are preprocessed in worker processes and diagnosed concurrently under
+# a requests-per-minute limit. Each result is appended to the output (JSONL,
+# or CSV when the name ends in .csv) as soon as it is ready, and a rerun with
+# the same output skips photos that already have a diagnosis.
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+if __package__:
+    from .image_preprocess import preprocess_image
+    from .crop_disease_detector import diagnose, image_request
+    from .gateway import priority, BATCH
+else:  # run as a script from inside Agents/
+    from image_preprocess import preprocess_image
+    from crop_disease_detector import diagnose, image_request
+    from gateway import priority, BATCH
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+RESULT_FIELDS = ["path", "status", "diagnosis", "bytes_in", "bytes_out", "elapsed_s"]
+
+
+class RateLimiter:
+    """Spaces calls evenly so at most rate_per_minute start in any minute"""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def find_images(inputs):
+    """Image paths from files and directories (searched recursively), in a stable order"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                paths += [os.path.join(root, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            paths.append(item)
+    return sorted(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def completed_paths(output_path):
+    """Photos already diagnosed in an earlier run; failed ones are tried again"""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, encoding="utf-8", newline="") as f:
+        if output_path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+    return {row["path"] for row in rows if row.get("status") == "ok"}
+
+
+class ResultWriter:
+    """Appends one row per photo and flushes it, so an interrupted run loses nothing"""
+
+    def __init__(self, output_path):
+        self.is_csv = output_path.endswith(".csv")
+        write_header = self.is_csv and (not os.path.exists(output_path) or os.path.getsize(output_path) == 0)
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        self._file = open(output_path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS) if self.is_csv else None
+        if write_header:
+            self._csv.writeheader()
+        self._lock = threading.Lock()
+
+    def write(self, row):
+        with self._lock:
+            if self._csv is not None:
+                self._csv.writerow(row)
+            else:
+                self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def prepare_image(path):
+    """Read and preprocess one photo; runs in a worker process"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        raise ValueError("empty file")
+    processed, stats = preprocess_image(data)
+    return processed, stats
+
+
+def diagnose_images(inputs, output_path, workers=None, concurrency=4, rate_per_minute=60, resume=True):
+    """Diagnose every photo in inputs, writing results to output_path as they finish.
+
+    Yields each result row as well, so callers can show progress. Only a few
+    photos are prepared and diagnosed ahead of the caller, so stopping early
+    (or Ctrl-C) cancels the rest instead of paying for calls nobody reads.
+    """
+    paths = find_images(inputs)
+    if resume:
+        done = completed_paths(output_path)
+        paths = [path for path in paths if path not in done]
+
+    limiter = RateLimiter(rate_per_minute)
+    writer = ResultWriter(output_path)
+    workers = workers or os.cpu_count() or 1
+    # Photos in flight per stage; enough to keep both pools busy
+    max_prepared = workers * 2
+    max_diagnosed = concurrency * 2
+
+    def vision(path, start, processed, stats):
+        row = {"path": path, "bytes_in": stats["bytes_in"], "bytes_out": stats["bytes_out"]}
+        try:
+            # Survey photos can wait, chat users cannot
+            with priority(BATCH):
+                # Duplicates and local classifier answers do not count against the rate
+                diagnosis = diagnose(image_request(processed), before_model=limiter.acquire)
+            row.update(status="error" if diagnosis.startswith("❌") else "ok", diagnosis=diagnosis)
+        except Exception as e:
+            row.update(status="error", diagnosis=f"❌ Error: {e}")
+        row["elapsed_s"] = round(time.perf_counter() - start, 3)
+        return row
+
+    preprocess_pool = ProcessPoolExecutor(max_workers=workers)
+    vision_pool = ThreadPoolExecutor(max_workers=concurrency)
+    pending_paths = iter(paths)
+    starts = {}
+    prepared = {}  # preprocessing future -> path
+    ready = deque()  # (path, processed, stats) waiting for a vision slot
+    diagnosed = set()
+    try:
+        while True:
+            while len(diagnosed) < max_diagnosed and ready:
+                path, processed, stats = ready.popleft()
+                diagnosed.add(vision_pool.submit(vision, path, starts.pop(path), processed, stats))
+            while len(prepared) + len(ready) < max_prepared:
+                path = next(pending_paths, None)
+                if path is None:
+                    break
+                starts[path] = time.perf_counter()
+                prepared[preprocess_pool.submit(prepare_image, path)] = path
+            if not prepared and not diagnosed:
+                break
+
+            finished, _ = wait(list(prepared) + list(diagnosed), return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in diagnosed:
+                    diagnosed.discard(future)
+                    row = future.result()
+                    writer.write(row)
+                    yield row
+                    continue
+                path = prepared.pop(future)
+                try:
+                    processed, stats = future.result()
+                except Exception as e:
+                    row = {"path": path, "status": "error", "diagnosis": f"❌ Error: {e}",
+                           "bytes_in": None, "bytes_out": None,
+                           "elapsed_s": round(time.perf_counter() - starts.pop(path), 3)}
+                    writer.write(row)
+                    yield row
+                    continue
+                ready.append((path, processed, stats))
+    finally:
+        # Queued work is dropped, calls already running finish in the background.
+        # (Same as shutdown(cancel_futures=True), which needs Python 3.9.)
+        for future in list(prepared) + list(diagnosed):
+            future.cancel()
+        preprocess_pool.shutdown(wait=False)
+        vision_pool.shutdown(wait=False)
+        writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diagnose a folder or list of crop photos")
+    parser.add_argument("inputs", nargs="+", help="image files and/or directories")
+    parser.add_argument("-o", "--output", default="diagnoses.jsonl", help="results file, .jsonl or .csv")
+    parser.add_argument("--workers", type=int, default=None, help="preprocessing processes (default: CPU count)")
+    parser.add_argument("--concurrency", type=int, default=4, help="vision requests in flight")
+    parser.add_argument("--rate", type=float, default=60, help="vision requests per minute, 0 for no limit")
+    parser.add_argument("--no-resume", action="store_true", help="diagnose photos already in the output again")
+    args = parser.parse_args()
+
+    print("🌿 Batch crop diagnosis")
+    counts = {"ok": 0, "error": 0}
+    start = time.perf_counter()
+    for row in diagnose_images(args.inputs, args.output, args.workers, args.concurrency, args.rate,
+                               resume=not args.no_resume):
+        counts[row["status"]] += 1
+        marker = "✅" if row["status"] == "ok" else "❌"
+        print(f"{marker} {row['path']} ({row['elapsed_s']} s)")
+    print(f"\n📋 {counts['ok']} diagnosed, {counts['error']} failed in "
+          f"{time.perf_counter() - start:.1f} s -> {args.output}")
+    sys.exit(1 if counts["error"] else 0)
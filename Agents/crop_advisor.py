@@ -1,56 +1,56 @@
 # crop_advisor.py
 
-import os
-import requests
-import google.generativeai as genai
-from dotenv import load_dotenv
+import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__:
+    from .model_registry import get_model, load_environment, stream_text
+    from .response_cache import get_cache, normalize_location
+    from .weather_client import get_weather_client
+    from .gateway import priority, BATCH
+else:  # run as a script from inside Agents/
+    from model_registry import get_model, load_environment, stream_text
+    from response_cache import get_cache, normalize_location
+    from weather_client import get_weather_client
+    from gateway import priority, BATCH
 
 # Load environment variables
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+load_environment()
+
+def format_weather(city, data):
+    """Turn a WeatherAPI forecast response into the text used in prompts"""
+    forecast = data["forecast"]["forecastday"][0]
+    date = forecast["date"]
+    day = forecast["day"]
+    condition = day["condition"]["text"]
+    max_temp = day["maxtemp_c"]
+    min_temp = day["mintemp_c"]
+    rain_chance = day.get("daily_chance_of_rain", "N/A")
+    rain_expected = day.get("daily_will_it_rain", "N/A")
 
-# Load Gemini model
-model = genai.GenerativeModel("gemini-1.5-flash")
+    return f"Date: {date}, {condition},Max Temp: {max_temp}°C, Min Temp: {min_temp}°C,Rain Chance: {rain_chance}%, Rain Expected: {rain_expected}%, condition: {condition}"
 
 # Get weather info from WeatherAPI.com
 def get_weather(city):
-    url = f"http://api.weatherapi.com/v1/forecast.json"
-    params = {
-        "key": WEATHER_API_KEY,
-        "q": city,
-        "days": 1,
-        "aqi": "no",
-        "alerts": "no"
-    }
-
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        forecast = data["forecast"]["forecastday"][0]
-        date = forecast["date"]
-        day = forecast["day"]
-        condition = day["condition"]["text"]
-        max_temp = day["maxtemp_c"]
-        min_temp = day["mintemp_c"]
-        rain_chance = day.get("daily_chance_of_rain", "N/A")
-        rain_expected = day.get("daily_will_it_rain", "N/A")
-
-        print(f"Weather in {city} on {date}: {condition}, Max Temp: {max_temp}°C, Min Temp: {min_temp}°C, Rain Chance: {rain_chance}%, Rain Expected: {rain_expected}%")
+        return format_weather(city, get_weather_client().forecast(city))
 
+    except Exception as e:
+        print("❌ Weather API error:", e)
+        return "Unknown weather"
 
-        return f"Date: {date}, {condition},Max Temp: {max_temp}°C, Min Temp: {min_temp}°C,Rain Chance: {rain_chance}%, Rain Expected: {rain_expected}%, condition: {condition}"
+async def aget_weather(city):
+    """Async version of get_weather"""
+    try:
+        return format_weather(city, await get_weather_client().aforecast(city))
 
     except Exception as e:
         print("❌ Weather API error:", e)
         return "Unknown weather"
 
-# Generate crop advice using Gemini
-def get_crop_advice(soil_type, location):
-    weather = get_weather(location)
-
-    prompt = f"""
+def build_crop_prompt(soil_type, weather, location):
+    return f"""
 You are an Agriculture expert.
 
 Soil Type: {soil_type}
@@ -84,9 +84,166 @@ and Bold the crop names , and headings like Crop Name: and Reason: in the respon
 and rest of the text should be in normal font.
     """
 
-    response = model.generate_content(prompt)
+# Generate crop advice using Gemini
+def get_crop_advice(soil_type, location, weather=None):
+    """weather can be passed in when it was already fetched, e.g. by a batch run"""
+    cache = get_cache('crop_advisor')
+    key = cache.make_key(soil_type=soil_type, location=location)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    if weather is None:
+        weather = get_weather(location)
+    response = get_model().generate_content(build_crop_prompt(soil_type, weather, location))
+    # Advice built without a forecast is not worth keeping for hours
+    if weather != "Unknown weather":
+        cache.set(key, [response.text, weather])
+    return response.text , weather
+
+def stream_crop_advice(soil_type, location, weather=None):
+    """Returns (chunks, weather) where chunks yields the advice as it is generated.
+
+    The weather is fetched up front, so it is known before the first chunk.
+    """
+    cache = get_cache('crop_advisor')
+    key = cache.make_key(soil_type=soil_type, location=location)
+    cached = cache.get(key)
+    if cached is not None:
+        advice, weather = cached
+        return iter([advice]), weather
+
+    if weather is None:
+        weather = get_weather(location)
+
+    def chunks():
+        parts = []
+        response = get_model().generate_content(build_crop_prompt(soil_type, weather, location), stream=True)
+        for text in stream_text(response):
+            parts.append(text)
+            yield text
+        # Only complete answers are cached, an abandoned stream never gets here
+        if weather != "Unknown weather":
+            cache.set(key, ["".join(parts), weather])
+
+    return chunks(), weather
+
+async def aget_crop_advice(soil_type, location, weather=None):
+    """Async version of get_crop_advice"""
+    cache = get_cache('crop_advisor')
+    key = cache.make_key(soil_type=soil_type, location=location)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    if weather is None:
+        weather = await aget_weather(location)
+    response = await get_model().generate_content_async(build_crop_prompt(soil_type, weather, location))
+    # Advice built without a forecast is not worth keeping for hours
+    if weather != "Unknown weather":
+        cache.set(key, [response.text, weather])
     return response.text , weather
 
+def _group_by_location(pairs):
+    """Split pairs into cached results and uncached indexes grouped by location"""
+    cache = get_cache('crop_advisor')
+    groups = {}
+    cached = []
+    for index, (soil_type, location) in enumerate(pairs):
+        hit = cache.get(cache.make_key(soil_type=soil_type, location=location))
+        if hit is not None:
+            cached.append((index, soil_type, location, hit[0], hit[1]))
+        else:
+            groups.setdefault(normalize_location(location), []).append(index)
+    return groups, cached
+
+def get_crop_advice_batch(pairs, max_concurrency=8):
+    """Crop advice for many (soil_type, location) pairs.
+
+    Each distinct location is fetched once, with at most max_concurrency weather
+    and model calls in flight. Yields (index, soil_type, location, advice, weather)
+    as each pair completes, so results arrive out of input order.
+    """
+    pairs = list(pairs)
+    groups, cached = _group_by_location(pairs)
+    yield from cached
+
+    results = queue.Queue()
+    weather_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-weather")
+    model_pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-advice")
+
+    def advise(index, weather):
+        soil_type, location = pairs[index]
+        try:
+            # Interactive chat requests get the model first
+            with priority(BATCH):
+                advice, weather = get_crop_advice(soil_type, location, weather=weather)
+        except Exception as e:
+            advice = f"❌ Error: {e}"
+        results.put((index, soil_type, location, advice, weather))
+
+    submitted = []
+
+    def weather_ready(future, indexes):
+        # Advice for a location starts as soon as its forecast is in
+        if future.cancelled():
+            return
+        for index in indexes:
+            try:
+                submitted.append(model_pool.submit(advise, index, future.result()))
+            except RuntimeError:  # the consumer stopped early and the pool is shut down
+                return
+
+    try:
+        for indexes in groups.values():
+            future = weather_pool.submit(get_weather, pairs[indexes[0]][1])
+            submitted.append(future)
+            future.add_done_callback(lambda f, indexes=indexes: weather_ready(f, indexes))
+        for _ in range(len(pairs) - len(cached)):
+            yield results.get()
+    finally:
+        # A consumer that stops early should not pay for the rest: queued calls are
+        # cancelled, the ones already running finish in the background.
+        # (Same as shutdown(cancel_futures=True), which needs Python 3.9.)
+        weather_pool.shutdown(wait=False)
+        model_pool.shutdown(wait=False)
+        for future in list(submitted):
+            future.cancel()
+
+async def aget_crop_advice_batch(pairs, max_concurrency=8):
+    """Async version of get_crop_advice_batch"""
+    pairs = list(pairs)
+    groups, cached = _group_by_location(pairs)
+    for item in cached:
+        yield item
+
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(location):
+        async with limit:
+            return await aget_weather(location)
+
+    forecasts = {name: asyncio.ensure_future(fetch(pairs[indexes[0]][1])) for name, indexes in groups.items()}
+
+    async def advise(index):
+        soil_type, location = pairs[index]
+        weather = await forecasts[normalize_location(location)]
+        async with limit:
+            try:
+                with priority(BATCH):
+                    advice, weather = await aget_crop_advice(soil_type, location, weather=weather)
+            except Exception as e:
+                advice = f"❌ Error: {e}"
+        return index, soil_type, location, advice, weather
+
+    tasks = [asyncio.ensure_future(advise(index)) for indexes in groups.values() for index in indexes]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks + list(forecasts.values()):
+            task.cancel()
+
 # Command-line interface
 if __name__ == "__main__":
     print("🌾 Crop Advisor with WeatherAPI.com is Ready!")
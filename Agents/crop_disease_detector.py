@@ -1,28 +1,25 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
 import os
+import asyncio
+import mimetypes
 
-# Load environment variables
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Gemini Vision model comes from the shared registry
+if __package__:
+    from .model_registry import get_model
+    from .image_preprocess import preprocess_image
+    from .leaf_classifier import ModelUnavailable, get_leaf_classifier
+    from .image_dedup import IMAGE_DEDUP, dhash, get_image_index, is_distinctive
+    from .telemetry import count, span
+else:  # run as a script from inside Agents/
+    from model_registry import get_model
+    from image_preprocess import preprocess_image
+    from leaf_classifier import ModelUnavailable, get_leaf_classifier
+    from image_dedup import IMAGE_DEDUP, dhash, get_image_index, is_distinctive
+    from telemetry import count, span
 
-# Configure Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
+# Answer clear-cut photos with the local classifier before calling Gemini Vision
+LEAF_TRIAGE = os.getenv("AGRIBOT_LEAF_TRIAGE", "1") != "0"
 
-# Load Gemini Vision model
-model = genai.GenerativeModel("gemini-1.5-flash")
-
-# Analyze crop image
-def analyze_crop_image(uploaded_file):
-    try:
-        # Read bytes from UploadedFile
-        image_data = uploaded_file.getvalue()
-
-        # Check if data is empty
-        if not image_data:
-            return "❌ Error: Uploaded image data is empty. Please upload a valid image."
-
-        prompt = """
+DIAGNOSIS_PROMPT = """
         This is a crop leaf image taken by a farmer.
         Please analyze if there are any visible signs of plant disease or pest.
         If yes:
@@ -38,15 +35,151 @@ def analyze_crop_image(uploaded_file):
         explain in hindi and english both.
         """
 
+EMPTY_IMAGE_ERROR = "❌ Error: Uploaded image data is empty. Please upload a valid image."
+
+class LocalImageFile:
+    """An image on disk with the getvalue()/type/name interface of a Streamlit UploadedFile"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.type = mimetypes.guess_type(path)[0] or "image/jpeg"
+
+    def getvalue(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+def image_request(image_data, mime_type="image/jpeg"):
+    """Prompt plus inline image for Gemini"""
+    return [
+        DIAGNOSIS_PROMPT,
+        {
+            "mime_type": mime_type,
+            "data": image_data
+        }
+    ]
+
+def build_image_request(uploaded_file):
+    """Prompt plus inline image for Gemini, or None when the upload is empty"""
+    # Read bytes from UploadedFile
+    image_data = uploaded_file.getvalue()
+
+    # Check if data is empty
+    if not image_data:
+        return None
+
+    # Upload a downscaled JPEG instead of the full-resolution phone photo
+    mime_type = uploaded_file.type  # e.g., "image/jpeg"
+    try:
+        with span("image.preprocess"):
+            image_data, stats = preprocess_image(image_data)
+        mime_type = "image/jpeg"
+        print(f"🖼️ Image {stats['size_in']} -> {stats['size_out']}, "
+              f"{stats['bytes_in'] // 1024} KB -> {stats['bytes_out'] // 1024} KB in {stats['elapsed_ms']} ms")
+    except Exception as e:
+        # Let Gemini judge images Pillow cannot read
+        print("❌ Image preprocessing error:", e)
+
+    return image_request(image_data, mime_type)
+
+def local_diagnosis(image_data):
+    """Templated answer from the local classifier, or None to ask Gemini"""
+    global LEAF_TRIAGE
+    if not LEAF_TRIAGE:
+        return None
+    try:
+        with span("leaf.triage") as triage_span:
+            result = get_leaf_classifier().triage([image_data])[0]
+            triage_span.set(decision=result['decision'])
+    except ModelUnavailable as e:
+        # Missing transformers/torch or model download failure: no point trying again
+        print(f"⚠️ Local leaf check disabled: {e}")
+        LEAF_TRIAGE = False
+        return None
+    except Exception as e:
+        # This photo only, e.g. one Pillow cannot read; Gemini gets to judge it
+        print(f"⚠️ Local leaf check failed for this image: {e}")
+        return None
+    return result['message']
+
+def cached_diagnosis(image_data):
+    """Returns (diagnosis of a near-identical earlier photo or None, image hash)"""
+    if not IMAGE_DEDUP:
+        return None, None
+    try:
+        image_hash = dhash(image_data)
+    except Exception as e:
+        print("❌ Image hash error:", e)
+        return None, None
+    if not is_distinctive(image_hash):
+        return None, None
+    diagnosis, _ = get_image_index().lookup(image_hash)
+    return diagnosis, image_hash
+
+def remember_diagnosis(image_hash, diagnosis):
+    if image_hash is not None and not diagnosis.startswith("❌"):
+        get_image_index().store(image_hash, diagnosis)
+
+def diagnose(contents, before_model=None):
+    """Diagnosis for a prepared image request: earlier duplicate, local classifier, then Gemini.
+
+    before_model() is called right before a Gemini request, e.g. to rate-limit
+    only the photos that really need the model.
+    """
+    image_data = contents[1]["data"]
+    diagnosis, image_hash = cached_diagnosis(image_data)
+    if diagnosis is not None:
+        count("agribot_diagnoses_total", source="dedup")
+        return diagnosis
+
+    diagnosis = local_diagnosis(image_data)
+    if diagnosis is None:
         # Send to Gemini
-        response = model.generate_content([
-            prompt,
-            {
-                "mime_type": uploaded_file.type,  # e.g., "image/jpeg"
-                "data": image_data
-            }
-        ])
-        return response.text
+        if before_model is not None:
+            before_model()
+        diagnosis = get_model().generate_content(contents).text
+        count("agribot_diagnoses_total", source="gemini")
+    else:
+        count("agribot_diagnoses_total", source="local")
+    remember_diagnosis(image_hash, diagnosis)
+    return diagnosis
+
+# Analyze crop image
+def analyze_crop_image(uploaded_file):
+    try:
+        contents = build_image_request(uploaded_file)
+        if contents is None:
+            return EMPTY_IMAGE_ERROR
+
+        return diagnose(contents)
+
+    except Exception as e:
+        return f"❌ Error: {e}"
+
+async def aanalyze_crop_image(uploaded_file):
+    """Async version of analyze_crop_image"""
+    try:
+        # Decoding, resizing, hashing and the classifier are CPU-bound, keep them off the event loop
+        loop = asyncio.get_running_loop()
+        contents = await loop.run_in_executor(None, build_image_request, uploaded_file)
+        if contents is None:
+            return EMPTY_IMAGE_ERROR
+
+        image_data = contents[1]["data"]
+        diagnosis, image_hash = await loop.run_in_executor(None, cached_diagnosis, image_data)
+        if diagnosis is not None:
+            count("agribot_diagnoses_total", source="dedup")
+            return diagnosis
+
+        diagnosis = await loop.run_in_executor(None, local_diagnosis, image_data)
+        if diagnosis is None:
+            response = await get_model().generate_content_async(contents)
+            diagnosis = response.text
+            count("agribot_diagnoses_total", source="gemini")
+        else:
+            count("agribot_diagnoses_total", source="local")
+        remember_diagnosis(image_hash, diagnosis)
+        return diagnosis
 
     except Exception as e:
         return f"❌ Error: {e}"
@@ -59,6 +192,6 @@ if __name__ == "__main__":
     image_path = input("Enter the path of image : ").strip().strip('"')
 
 
-    result = analyze_crop_image(image_path)
+    result = analyze_crop_image(LocalImageFile(image_path))
     print("\n📋 Diagnosis Result:\n")
     print(result)
@@ -0,0 +1,449 @@
+# gateway.py - Shared gate in front of every Gemini call
+#
+# Three parts, all per process:
+#   * identical prompts already in flight share one upstream call (singleflight),
+#     so a burst of farmers asking the same alert question costs one request;
+#     interactive callers never wait on a call started by a batch job
+#   * a token bucket per model keeps calls under the quota, interactive callers
+#     are served before batch jobs (batch_diagnosis, alert message refreshes)
+#   * quota errors (429 / ResourceExhausted) pause the model with exponential
+#     backoff and halve its rate, which then creeps back up with each success
+#
+# Rates come from AGRIBOT_MODEL_RPM, e.g. "15" for every model or
+# "15,gemini-1.5-pro=2" with per-model overrides; 0 means no limit.
+# Set it to the project's quota: the default leaves the rate to the API and
+# relies on the quota backoff alone, since a free-tier limit would make a
+# shared service on a paid project queue almost at once.
+import os
+import time
+import random
+import asyncio
+import hashlib
+import weakref
+import threading
+import contextvars
+from contextlib import contextmanager
+
+if __package__:
+    from .telemetry import count, observe
+else:  # run as a script from inside Agents/
+    from telemetry import count, observe
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Calls per minute, e.g. "15" for the gemini-1.5-flash free tier; 0 means no limit
+MODEL_RPM = os.getenv("AGRIBOT_MODEL_RPM", "0")
+# Calls that may start back to back after an idle spell
+MODEL_BURST = int(os.getenv("AGRIBOT_MODEL_BURST", "5"))
+GATEWAY = os.getenv("AGRIBOT_GATEWAY", "1") != "0"
+
+# Seconds a call may wait for its turn; an answer is of little use to a chat
+# user after half a minute, a batch job can wait
+QUEUE_TIMEOUTS = {INTERACTIVE: 30, BATCH: 600}
+# Seconds a caller waits on an identical call already in flight before making
+# its own; covers the leader's turn in the queue plus a slow model answer
+FLIGHT_TIMEOUT = float(os.getenv("AGRIBOT_FLIGHT_TIMEOUT", "90"))
+MAX_RETRIES = 2
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# A throttled model never drops below this share of its configured rate
+MIN_RATE_SHARE = 0.1
+# Share of the configured rate won back per successful call after a quota error
+RATE_RECOVERY = 0.05
+
+_priority = contextvars.ContextVar("agribot_priority", default=INTERACTIVE)
+
+
+class RateLimited(Exception):
+    """No slot for the call within its queue timeout"""
+
+
+@contextmanager
+def priority(level):
+    """Model calls made inside the block use the given lane, e.g. with priority(BATCH):"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_rpm(spec):
+    """"15,gemini-1.5-pro=2" -> {None: 15.0, 'gemini-1.5-pro': 2.0}"""
+    limits = {None: 0.0}
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, value = part.rpartition("=")
+        limits[name.strip() or None] = float(value)
+    return limits
+
+
+def is_quota_error(error):
+    """429s from the API: google.api_core's ResourceExhausted or anything that reads like it"""
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or getattr(error, "code", None) == 429:
+        return True
+    text = str(error).lower()
+    return "429" in text or "quota" in text or "rate limit" in text
+
+
+def _feed(digest, value):
+    if isinstance(value, bytes):
+        digest.update(b"b%d:" % len(value))
+        digest.update(value)
+    elif isinstance(value, str):
+        encoded = value.encode("utf-8")
+        digest.update(b"s%d:" % len(encoded))
+        digest.update(encoded)
+    elif isinstance(value, dict):
+        digest.update(b"d")
+        for key in sorted(value, key=str):
+            _feed(digest, str(key))
+            _feed(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"l%d:" % len(value))
+        for item in value:
+            _feed(digest, item)
+    else:
+        _feed(digest, repr(value))
+
+
+def request_key(*parts):
+    """Digest of a model request; inline image bytes are hashed, not copied"""
+    digest = hashlib.sha256()
+    for part in parts:
+        _feed(digest, part)
+    return digest.hexdigest()
+
+
+class TokenBucket:
+    """Call slots for one model, refilled at its rate, interactive callers first"""
+
+    def __init__(self, rate_per_minute, burst=MODEL_BURST):
+        self.max_rate = rate_per_minute / 60.0
+        self.rate = self.max_rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.backoff = 0.0
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._cond = threading.Condition()
+
+    def _take(self, level, now):
+        """0 when a slot was taken, otherwise seconds until it is worth trying again"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if level == BATCH and self._waiting[INTERACTIVE]:
+            return 1.0 / self.rate
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, level=INTERACTIVE, timeout=None):
+        """Block until a call may start; returns the seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[level] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._take(level, now)
+                    if wait <= 0:
+                        return now - start
+                    if timeout is not None and now + wait > start + timeout:
+                        raise RateLimited(f"no model slot within {timeout} s")
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[level] -= 1
+                self._cond.notify_all()
+
+    async def aacquire(self, level=INTERACTIVE, timeout=None):
+        """Async version of acquire, waits without holding a thread"""
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[level] += 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._take(level, now)
+                if wait <= 0:
+                    return now - start
+                if timeout is not None and now + wait > start + timeout:
+                    raise RateLimited(f"no model slot within {timeout} s")
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting[level] -= 1
+                self._cond.notify_all()
+
+    def penalize(self):
+        """After a quota error: pause with growing, jittered backoff and halve the rate; returns the pause"""
+        with self._cond:
+            self.backoff = min(BACKOFF_MAX, self.backoff * 2 if self.backoff else BACKOFF_BASE)
+            delay = self.backoff * random.uniform(0.5, 1.0)
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + delay)
+            self.rate = max(self.max_rate * MIN_RATE_SHARE, self.rate / 2)
+            self.tokens = 0.0
+            self.updated = now
+            return delay
+
+    def reward(self):
+        """After a successful call: reset the backoff and win back some rate"""
+        with self._cond:
+            self.backoff = 0.0
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY)
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Gateway:
+    """Coalescing, rate limits and quota backoff for all models of the process"""
+
+    def __init__(self, rpm=MODEL_RPM, burst=MODEL_BURST, max_retries=MAX_RETRIES, timeouts=None,
+                 flight_timeout=FLIGHT_TIMEOUT):
+        self.limits = parse_rpm(rpm)
+        self.burst = burst
+        self.max_retries = max_retries
+        self.timeouts = {**QUEUE_TIMEOUTS, **(timeouts or {})}
+        self.flight_timeout = flight_timeout
+        self._buckets = {}
+        self._flights = {}
+        # event loop -> its flights; an awaitable belongs to the loop it was made on
+        self._async_flights = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = {'upstream_calls': 0, 'coalesced': 0, 'throttled': 0, 'wait_seconds': 0.0,
+                      'quota_errors': 0, 'retries': 0, 'rejected': 0, 'flight_timeouts': 0}
+
+    def bucket(self, model_name):
+        bucket = self._buckets.get(model_name)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(model_name)
+                if bucket is None:
+                    rpm = self.limits.get(model_name, self.limits[None])
+                    bucket = self._buckets[model_name] = TokenBucket(rpm, self.burst)
+        return bucket
+
+    def _add(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _waited(self, model_name, level, waited):
+        if waited > 0.001:
+            self._add(throttled=1, wait_seconds=waited)
+        observe("agribot_gateway_wait_seconds", waited, model=model_name, priority=level)
+
+    def _quota_error(self, model_name, bucket, attempt, error):
+        """Back off after a quota error; returns True when the call should be retried"""
+        delay = bucket.penalize()
+        self._add(quota_errors=1)
+        count("agribot_gateway_quota_errors_total", model=model_name)
+        if attempt >= self.max_retries:
+            return False
+        self._add(retries=1)
+        print(f"⏳ {model_name} quota exceeded, retrying in {delay:.1f} s: {error}")
+        return True
+
+    def _rejected(self, model_name, level):
+        self._add(rejected=1)
+        count("agribot_gateway_rejected_total", model=model_name, priority=level)
+
+    @staticmethod
+    def _join(flights, level, key):
+        """Flight the caller can share: its own lane's, or for a batch caller an interactive one.
+
+        An interactive caller never joins a batch flight, which may still be
+        queued behind every other interactive call.
+        """
+        flight = flights.get((level, key))
+        if flight is None and level == BATCH:
+            flight = flights.get((INTERACTIVE, key))
+        return flight
+
+    def call(self, model_name, fn, key=None):
+        """fn() under the model's limits; callers with the same key while it runs get its result"""
+        if key is None:
+            return self._upstream(model_name, fn)
+        level = _priority.get()
+        with self._lock:
+            flight = self._join(self._flights, level, key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[(level, key)] = _Flight()
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            count("agribot_gateway_coalesced_total", model=model_name)
+            if not flight.event.wait(self.flight_timeout):
+                # The leader is stuck (a hung connection); don't hang with it
+                self._add(flight_timeouts=1)
+                count("agribot_gateway_flight_timeouts_total", model=model_name)
+                return self._upstream(model_name, fn)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._upstream(model_name, fn)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[(level, key)]
+            flight.event.set()
+
+    def _upstream(self, model_name, fn):
+        level = _priority.get()
+        bucket = self.bucket(model_name)
+        attempt = 0
+        while True:
+            try:
+                self._waited(model_name, level, bucket.acquire(level, self.timeouts.get(level)))
+            except RateLimited:
+                self._rejected(model_name, level)
+                raise
+            self._add(upstream_calls=1)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_quota_error(e) or not self._quota_error(model_name, bucket, attempt, e):
+                    raise
+                attempt += 1
+                continue
+            bucket.reward()
+            return result
+
+    async def acall(self, model_name, fn, key=None):
+        """Async version of call; fn() returns an awaitable. Coalesces within one event loop"""
+        if key is None:
+            return await self._aupstream(model_name, fn)
+        level = _priority.get()
+        with self._lock:
+            flights = self._async_flights.setdefault(asyncio.get_running_loop(), {})
+        flight = self._join(flights, level, key)
+        if flight is not None:
+            self._add(coalesced=1)
+            count("agribot_gateway_coalesced_total", model=model_name)
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), self.flight_timeout)
+            except asyncio.TimeoutError:
+                self._add(flight_timeouts=1)
+                count("agribot_gateway_flight_timeouts_total", model=model_name)
+                return await self._aupstream(model_name, fn)
+        # The upstream call is a task of its own, so a cancelled leader leaves it
+        # running for the followers instead of cancelling them too
+        flight = flights[(level, key)] = asyncio.ensure_future(self._aupstream(model_name, fn))
+
+        def landed(task):
+            if flights.get((level, key)) is task:
+                del flights[(level, key)]
+            # Nobody may be waiting any more; keep the event loop's "never retrieved" log quiet
+            if not task.cancelled():
+                task.exception()
+
+        flight.add_done_callback(landed)
+        return await asyncio.shield(flight)
+
+    async def _aupstream(self, model_name, fn):
+        level = _priority.get()
+        bucket = self.bucket(model_name)
+        attempt = 0
+        while True:
+            try:
+                self._waited(model_name, level, await bucket.aacquire(level, self.timeouts.get(level)))
+            except RateLimited:
+                self._rejected(model_name, level)
+                raise
+            self._add(upstream_calls=1)
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_quota_error(e) or not self._quota_error(model_name, bucket, attempt, e):
+                    raise
+                attempt += 1
+                continue
+            bucket.reward()
+            return result
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        return stats
+
+    def rates(self):
+        """Current calls per minute of each model, lower than configured after quota errors"""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {name: round(bucket.rate * 60, 2) for name, bucket in buckets.items()}
+
+
+class GatewayModel:
+    """Wraps a model so its generate calls go through the gateway; other attributes pass through"""
+
+    def __init__(self, model, model_name, config_key=''):
+        self.model = model
+        self.model_name = model_name
+        self.config_key = config_key
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def key(self, contents, args, kwargs):
+        # A stream is read by one caller, so it is only rate limited
+        if kwargs.get("stream"):
+            return None
+        return request_key(self.model_name, self.config_key, contents, args, kwargs)
+
+    def generate_content(self, contents, *args, **kwargs):
+        def call():
+            return self.model.generate_content(contents, *args, **kwargs)
+
+        return get_gateway().call(self.model_name, call, self.key(contents, args, kwargs))
+
+    async def generate_content_async(self, contents, *args, **kwargs):
+        def call():
+            return self.model.generate_content_async(contents, *args, **kwargs)
+
+        return await get_gateway().acall(self.model_name, call, self.key(contents, args, kwargs))
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Shared gateway with the AGRIBOT_MODEL_RPM limits, created on first use"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = Gateway()
+    return _gateway
+
+
+def set_gateway(gateway):
+    """Replace the shared gateway, e.g. with Gateway(rpm=0) in benchmarks"""
+    global _gateway
+    with _gateway_lock:
+        _gateway = gateway
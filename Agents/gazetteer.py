@@ -0,0 +1,110 @@
+# gazetteer.py - Offline place coordinates and a grid index for radius queries
+import os
+import csv
+import math
+import threading
+from collections import namedtuple
+
+if __package__:
+    from .response_cache import normalize_location
+else:  # run as a script from inside Agents/
+    from response_cache import normalize_location
+
+PLACES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "india_places.csv")
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+Place = namedtuple("Place", ["name", "state", "kind", "lat", "lon"])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+    """Indian states, districts and towns from the bundled CSV, looked up by name"""
+
+    def __init__(self, path=PLACES_PATH):
+        self.places = {}
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                name = normalize_location(row["name"])
+                self.places[name] = Place(name, row["state"], row["kind"], float(row["lat"]), float(row["lon"]))
+
+    def resolve(self, location):
+        """Best Place for free text like "Baramati, Pune district", or None.
+
+        Tries the whole string, then each comma-separated part, then runs of
+        one to three words, so the most specific known name wins.
+        """
+        name = normalize_location(location)
+        if not name:
+            return None
+        if name in self.places:
+            return self.places[name]
+        for part in str(location).split(","):
+            place = self.places.get(normalize_location(part))
+            if place is not None:
+                return place
+        words = name.split()
+        for size in (3, 2, 1):
+            for start in range(len(words) - size + 1):
+                place = self.places.get(" ".join(words[start:start + size]))
+                if place is not None:
+                    return place
+        return None
+
+
+class ProximityIndex:
+    """Points bucketed into a fixed lat/lon grid; a radius query only visits nearby cells"""
+
+    def __init__(self, cell_degrees=0.5):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def add(self, lat, lon, item):
+        with self._lock:
+            self._cells.setdefault(self._cell(lat, lon), []).append((lat, lon, item))
+
+    def within(self, lat, lon, radius_km):
+        """(distance_km, item) pairs within radius_km of the point, nearest first"""
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        row_min, col_min = self._cell(lat - lat_span, lon - lon_span)
+        row_max, col_max = self._cell(lat + lat_span, lon + lon_span)
+
+        found = []
+        with self._lock:
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    for point_lat, point_lon, item in self._cells.get((row, col), ()):
+                        distance = haversine_km(lat, lon, point_lat, point_lon)
+                        if distance <= radius_km:
+                            found.append((distance, item))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self):
+        return sum(len(points) for points in self._cells.values())
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Shared gazetteer, loaded from PLACES_PATH on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
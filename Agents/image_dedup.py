@@ -0,0 +1,175 @@
+# image_dedup.py - Reuse diagnoses for re-uploaded and near-duplicate photos
+import io
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+IMAGE_DEDUP = os.getenv("AGRIBOT_IMAGE_DEDUP", "1") != "0"
+# dHash bits that may differ for two photos to count as the same picture (at most 7).
+# Recompressed WhatsApp forwards land within 2-4 bits; different leaves are 20+ apart.
+MAX_DISTANCE = min(7, int(os.getenv("AGRIBOT_IMAGE_DEDUP_DISTANCE", "6")))
+
+HASH_SIZE = 8
+# 64-bit hashes split into 4 bands of 16 bits. Two hashes within 7 bits of each
+# other differ by at most 1 bit in some band, so probing each band and its
+# 16 one-bit neighbours finds every match without a full scan.
+BANDS = 4
+BAND_BITS = HASH_SIZE * HASH_SIZE // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# Flat, featureless photos hash to nearly all 0s or 1s and would match each other
+MIN_HASH_BITS = 6
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """64-bit difference hash: does brightness rise or fall between neighbouring pixels"""
+    if isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+        image.draft("L", (hash_size * 8, hash_size * 8))
+    grey = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(grey.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _bands(value):
+    return [(band, (value >> (band * BAND_BITS)) & BAND_MASK) for band in range(BANDS)]
+
+
+def _probes(value):
+    """Every bucket a hash within 7 bits of value can be filed under"""
+    for band, band_value in _bands(value):
+        yield band, band_value
+        for bit in range(BAND_BITS):
+            yield band, band_value ^ (1 << bit)
+
+
+def is_distinctive(image_hash):
+    """Whether a hash has enough structure to be matched against others"""
+    ones = bin(image_hash).count("1")
+    return MIN_HASH_BITS <= ones <= HASH_SIZE * HASH_SIZE - MIN_HASH_BITS
+
+
+class ImageHashIndex:
+    """LRU of recent diagnoses looked up by dHash within MAX_DISTANCE bits.
+
+    Each hash is filed under its 4 bands, so a lookup only compares against
+    entries in nearby buckets instead of scanning everything.
+    """
+
+    def __init__(self, max_entries=4096, ttl=24 * 60 * 60, max_distance=MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'lookups': 0, 'lookup_ms': 0.0}
+        # entry id -> (hash, diagnosis, created_at), oldest first
+        self._entries = OrderedDict()
+        # (band, band value) -> entry ids
+        self._buckets = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, entry_id):
+        value, _, _ = self._entries.pop(entry_id)
+        for band in _bands(value):
+            ids = self._buckets.get(band)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._buckets[band]
+
+    def lookup(self, image_hash):
+        """Returns (diagnosis or None, distance)"""
+        start = time.perf_counter()
+        with self._lock:
+            candidates = set()
+            for bucket in _probes(image_hash):
+                ids = self._buckets.get(bucket)
+                if ids:
+                    candidates |= ids
+
+            best_id, best_distance = None, self.max_distance + 1
+            now = time.time()
+            for entry_id in candidates:
+                value, _, created_at = self._entries[entry_id]
+                if created_at + self.ttl < now:
+                    self._remove(entry_id)
+                    continue
+                distance = hamming(image_hash, value)
+                if distance < best_distance:
+                    best_id, best_distance = entry_id, distance
+
+            if best_id is None:
+                self.stats['misses'] += 1
+                diagnosis = None
+            else:
+                self._entries.move_to_end(best_id)
+                self.stats['hits'] += 1
+                diagnosis = self._entries[best_id][1]
+            self.stats['lookups'] += 1
+            self.stats['lookup_ms'] += (time.perf_counter() - start) * 1000
+        return diagnosis, best_distance if best_id is not None else None
+
+    def store(self, image_hash, diagnosis):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (image_hash, diagnosis, time.time())
+            for band in _bands(image_hash):
+                self._buckets.setdefault(band, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def hit_ratio(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def metrics(self):
+        """Counters plus hit ratio and mean lookup latency"""
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+        lookups = stats.pop('lookups')
+        lookup_ms = stats.pop('lookup_ms')
+        return {
+            **stats,
+            'entries': size,
+            'hit_ratio': round(self.hit_ratio(), 3),
+            'avg_lookup_ms': round(lookup_ms / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_image_index():
+    """Shared index, created on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ImageHashIndex()
+    return _index
+
+
+def set_image_index(index):
+    """Replace the shared index, e.g. with an empty one between benchmark runs"""
+    global _index
+    with _index_lock:
+        _index = index
@@ -0,0 +1,117 @@
+# image_preprocess.py - Shrink crop photos before they are uploaded for diagnosis
+import io
+import os
+import time
+import threading
+
+from PIL import Image, ImageChops, ImageOps
+
+# Gemini Vision reads leaf symptoms fine at this size; phone photos are 3000-4000 px
+MAX_EDGE = int(os.getenv("AGRIBOT_IMAGE_MAX_EDGE", "1024"))
+JPEG_QUALITY = int(os.getenv("AGRIBOT_IMAGE_QUALITY", "85"))
+# none, center or leaf
+CROP_MODE = os.getenv("AGRIBOT_IMAGE_CROP", "none")
+
+CENTER_CROP_FRACTION = 0.8
+# A leaf crop is only used when the green area covers at least this share of the photo
+MIN_LEAF_FRACTION = 0.05
+LEAF_CROP_PADDING = 0.05
+
+_totals = {'images': 0, 'bytes_in': 0, 'bytes_out': 0, 'elapsed_ms': 0.0}
+_totals_lock = threading.Lock()
+
+
+def center_crop(image, fraction=CENTER_CROP_FRACTION):
+    """Keep the middle of the frame, where farmers put the leaf"""
+    width, height = image.size
+    crop_width, crop_height = int(width * fraction), int(height * fraction)
+    left, top = (width - crop_width) // 2, (height - crop_height) // 2
+    return image.crop((left, top, left + crop_width, top + crop_height))
+
+
+def leaf_box(image):
+    """Bounding box of plant-coloured pixels, or None when too little of the photo is plant.
+
+    Works on a 128 px thumbnail in HSV: green through yellow-brown hues with
+    enough saturation, which also keeps lesions on the leaf inside the box.
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((128, 128))
+    hue, saturation, value = thumbnail.convert("HSV").split()
+    # Pillow hues run 0-255; 20-120 covers yellow-brown to green
+    hue_mask = hue.point(lambda h: 255 if 20 <= h <= 120 else 0)
+    saturation_mask = saturation.point(lambda s: 255 if s >= 50 else 0)
+    value_mask = value.point(lambda v: 255 if v >= 40 else 0)
+    mask = ImageChops.multiply(ImageChops.multiply(hue_mask, saturation_mask), value_mask)
+
+    box = mask.getbbox()
+    covered = mask.histogram()[255] / (mask.size[0] * mask.size[1])
+    if box is None or covered < MIN_LEAF_FRACTION:
+        return None
+
+    scale_x, scale_y = image.size[0] / thumbnail.size[0], image.size[1] / thumbnail.size[1]
+    pad_x, pad_y = image.size[0] * LEAF_CROP_PADDING, image.size[1] * LEAF_CROP_PADDING
+    left, top, right, bottom = box
+    return (
+        max(0, int(left * scale_x - pad_x)),
+        max(0, int(top * scale_y - pad_y)),
+        min(image.size[0], int(right * scale_x + pad_x)),
+        min(image.size[1], int(bottom * scale_y + pad_y)),
+    )
+
+
+def preprocess_image(data, max_edge=MAX_EDGE, quality=JPEG_QUALITY, crop=CROP_MODE):
+    """Orient, optionally crop, downscale and re-encode image bytes as a metadata-free JPEG.
+
+    Returns (jpeg_bytes, stats) where stats has the byte counts before and
+    after, the pixel sizes and the time taken in milliseconds.
+    """
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    # JPEGs can be decoded straight at a reduced scale, much cheaper than a full decode
+    image.draft("RGB", (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if crop == "center":
+        image = center_crop(image)
+    elif crop == "leaf":
+        box = leaf_box(image)
+        if box is not None:
+            image = image.crop(box)
+
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    # No exif/icc arguments, so GPS and camera metadata are dropped
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    processed = output.getvalue()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    stats = {
+        'bytes_in': len(data),
+        'bytes_out': len(processed),
+        'bytes_saved': len(data) - len(processed),
+        'size_in': original_size,
+        'size_out': image.size,
+        'elapsed_ms': round(elapsed_ms, 2),
+    }
+    with _totals_lock:
+        _totals['images'] += 1
+        _totals['bytes_in'] += len(data)
+        _totals['bytes_out'] += len(processed)
+        _totals['elapsed_ms'] += elapsed_ms
+    return processed, stats
+
+
+def preprocess_stats():
+    """Totals across every image preprocessed in this process"""
+    with _totals_lock:
+        totals = dict(_totals)
+    totals['bytes_saved'] = totals['bytes_in'] - totals['bytes_out']
+    totals['avg_ms'] = round(totals['elapsed_ms'] / totals['images'], 2) if totals['images'] else 0.0
+    totals['elapsed_ms'] = round(totals['elapsed_ms'], 2)
+    return totals
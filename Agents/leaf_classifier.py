@@ -0,0 +1,149 @@
+# leaf_classifier.py - Local first look at leaf photos before Gemini Vision
+#
+# A small PlantVillage-style classifier and a sharpness check run on CPU.
+# Blurry photos, confidently healthy leaves and confidently recognised
+# diseases are answered from templates; everything else goes to Gemini.
+import io
+import os
+import threading
+
+from PIL import Image, ImageFilter, ImageStat
+
+LEAF_MODEL = os.getenv("AGRIBOT_LEAF_MODEL", "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification")
+# Below this top-1 score the image is escalated to Gemini
+CONFIDENCE_THRESHOLD = float(os.getenv("AGRIBOT_LEAF_THRESHOLD", "0.9"))
+# Variance of the Laplacian on a 512 px grey copy; sharp phone photos score in the hundreds
+BLUR_THRESHOLD = float(os.getenv("AGRIBOT_BLUR_THRESHOLD", "60"))
+# Mean brightness (0-255) below which a photo is too dark to judge
+MIN_BRIGHTNESS = 35
+
+LAPLACIAN = ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128)
+
+BLURRY_MESSAGE = """📷 The photo is too blurry or dark to check the leaf. Please take a clearer picture in daylight, holding the phone steady about 20-30 cm from one affected leaf.
+
+📷 फ़ोटो बहुत धुंधली या अंधेरी है, इसलिए पत्ती की जाँच नहीं हो सकी। कृपया दिन की रोशनी में, फ़ोन को स्थिर रखकर, प्रभावित पत्ती से लगभग 20-30 सेमी दूर से साफ़ फ़ोटो लें।"""
+
+HEALTHY_MESSAGE = """✅ Your {crop}leaf looks healthy - no signs of disease or pests are visible. Keep monitoring the field every few days, especially after rain.
+
+✅ आपकी {crop}पत्ती स्वस्थ दिख रही है - कोई रोग या कीट के लक्षण नहीं दिख रहे। हर कुछ दिनों में खेत की निगरानी करते रहें, ख़ासकर बारिश के बाद।"""
+
+DISEASE_MESSAGE = """🔬 This looks like **{disease}** on {crop} (confidence {confidence:.0%}). Remove badly affected leaves, avoid overhead watering and ask your nearest Krishi Vigyan Kendra which spray to use before treating the field.
+
+🔬 यह {crop} में **{disease}** जैसा दिख रहा है (विश्वास {confidence:.0%})। बुरी तरह प्रभावित पत्तियाँ हटा दें, ऊपर से पानी देने से बचें और छिड़काव से पहले नज़दीकी कृषि विज्ञान केंद्र से सही दवा की सलाह लें।"""
+
+
+def image_quality(image):
+    """(sharpness, brightness) of a PIL image"""
+    grey = image.convert("L")
+    grey.thumbnail((512, 512))
+    sharpness = ImageStat.Stat(grey.filter(LAPLACIAN)).var[0]
+    brightness = ImageStat.Stat(grey).mean[0]
+    return sharpness, brightness
+
+
+def parse_label(label):
+    """(crop, disease or None) from labels like 'Tomato___Early_blight' or 'Healthy Tomato'"""
+    if "___" in label:
+        crop, disease = (" ".join(part.replace("_", " ").split()) for part in label.split("___", 1))
+        return crop, None if disease.lower() == "healthy" else disease
+    words = " ".join(label.replace("_", " ").split())
+    lower = words.lower()
+    if "healthy" in lower:
+        crop = " ".join(word for word in words.split() if word.lower() != "healthy")
+        return crop, None
+    if " with " in lower:
+        crop, disease = words.split(" with ", 1)
+        return crop, disease
+    crop, _, disease = words.partition(" ")
+    return crop, disease or words
+
+
+class ModelUnavailable(Exception):
+    """The classifier model could not be loaded: transformers/torch missing or the download failed"""
+
+
+class LeafClassifier:
+    """transformers image-classification pipeline on CPU, loaded on first use"""
+
+    def __init__(self, model_name=LEAF_MODEL, threshold=CONFIDENCE_THRESHOLD,
+                 blur_threshold=BLUR_THRESHOLD, batch_size=8):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.blur_threshold = blur_threshold
+        self.batch_size = batch_size
+        self.stats = {'blurry': 0, 'healthy': 0, 'disease': 0, 'escalate': 0}
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._pipeline is None:
+                try:
+                    from transformers import pipeline
+
+                    self._pipeline = pipeline("image-classification", model=self.model_name, device=-1)
+                except Exception as e:
+                    raise ModelUnavailable(f"{self.model_name}: {e}") from e
+        return self._pipeline
+
+    def classify(self, images):
+        """Top (label, score) per PIL image, run in batches"""
+        classifier = self._pipeline or self._load()
+        predictions = classifier(images, top_k=1, batch_size=self.batch_size)
+        return [(prediction[0]["label"], prediction[0]["score"]) for prediction in predictions]
+
+    def triage(self, images):
+        """Decision per image: a dict with decision (blurry, healthy, disease or escalate),
+        label, score, sharpness and, unless escalated, the templated message.
+
+        images are PIL images or encoded bytes. Blurry and dark photos are
+        answered without running the model.
+        """
+        images = [Image.open(io.BytesIO(image)) if isinstance(image, bytes) else image for image in images]
+        images = [image.convert("RGB") for image in images]
+        results = [None] * len(images)
+        to_classify = []
+        for index, image in enumerate(images):
+            sharpness, brightness = image_quality(image)
+            if sharpness < self.blur_threshold or brightness < MIN_BRIGHTNESS:
+                results[index] = {'decision': 'blurry', 'label': None, 'score': None,
+                                  'sharpness': round(sharpness, 1), 'message': BLURRY_MESSAGE}
+            else:
+                to_classify.append((index, sharpness))
+
+        if to_classify:
+            predictions = self.classify([images[index] for index, _ in to_classify])
+            for (index, sharpness), (label, score) in zip(to_classify, predictions):
+                result = {'decision': 'escalate', 'label': label, 'score': round(score, 4),
+                          'sharpness': round(sharpness, 1), 'message': None}
+                if score >= self.threshold:
+                    crop, disease = parse_label(label)
+                    crop_prefix = f"{crop.lower()} " if crop else ""
+                    if disease is None:
+                        result.update(decision='healthy', message=HEALTHY_MESSAGE.format(crop=crop_prefix))
+                    else:
+                        result.update(decision='disease', message=DISEASE_MESSAGE.format(
+                            crop=crop.lower() or "the crop", disease=disease, confidence=score))
+                results[index] = result
+
+        for result in results:
+            self.stats[result['decision']] += 1
+        return results
+
+    def escalation_rate(self):
+        total = sum(self.stats.values())
+        return self.stats['escalate'] / total if total else 0.0
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_leaf_classifier():
+    """Shared classifier, created on first use"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = LeafClassifier()
+    return _classifier
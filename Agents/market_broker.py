@@ -1,16 +1,12 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
+if __package__:
+    from .model_registry import get_model, stream_text
+    from .response_cache import get_cache
+else:  # run as a script from inside Agents/
+    from model_registry import get_model, stream_text
+    from response_cache import get_cache
 
-# Load API Key
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-# Initialize Gemini Model
-model = genai.GenerativeModel("gemini-1.5-flash")
-
-def get_market_broker_response(crop, location, quantity=None):
-    prompt = f"""
+def build_market_prompt(crop, location, quantity=None):
+    return f"""
     You are a smart agriculture marketing agent.
 
     A farmer has the following details:
@@ -30,9 +26,44 @@ def get_market_broker_response(crop, location, quantity=None):
     Be confident in your suggestions, simulate useful examples, and do not refuse to answer due to lack of data. Respond clearly and briefly.
     """
 
-    response = model.generate_content(prompt)
+def get_market_broker_response(crop, location, quantity=None):
+    cache = get_cache('market_broker')
+    key = cache.make_key(crop=crop, location=location, quantity=quantity)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = get_model().generate_content(build_market_prompt(crop, location, quantity))
+    cache.set(key, response.text)
     return response.text
 
+async def aget_market_broker_response(crop, location, quantity=None):
+    """Async version of get_market_broker_response"""
+    cache = get_cache('market_broker')
+    key = cache.make_key(crop=crop, location=location, quantity=quantity)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await get_model().generate_content_async(build_market_prompt(crop, location, quantity))
+    cache.set(key, response.text)
+    return response.text
+
+def stream_market_broker_response(crop, location, quantity=None):
+    """Yields the suggestions in chunks as they are generated, cached once complete"""
+    cache = get_cache('market_broker')
+    key = cache.make_key(crop=crop, location=location, quantity=quantity)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    for text in stream_text(get_model().generate_content(build_market_prompt(crop, location, quantity), stream=True)):
+        parts.append(text)
+        yield text
+    cache.set(key, "".join(parts))
+
 if __name__ == "__main__":
     print("🤝 Market Broker Agent Ready!")
     crop = input("🌾 Enter Crop Name: ")
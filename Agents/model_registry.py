@@ -0,0 +1,157 @@
+# model_registry.py - One shared place to build Gemini models
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+if __package__:
+    from .telemetry import get_telemetry, record_usage
+    from .gateway import GatewayModel, GATEWAY
+else:  # run as a script from inside Agents/
+    from telemetry import get_telemetry, record_usage
+    from gateway import GatewayModel, GATEWAY
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+_lock = threading.Lock()
+_environment_loaded = False
+_configured = False
+_models = {}
+_factory = None
+
+
+def load_environment():
+    """Load .env once per process"""
+    global _environment_loaded
+    if not _environment_loaded:
+        load_dotenv()
+        _environment_loaded = True
+
+
+def _config_key(generation_config):
+    if not generation_config:
+        return ''
+    return repr(sorted(dict(generation_config).items()))
+
+
+def _build_gemini(model_name, generation_config):
+    global _configured
+    import google.generativeai as genai
+
+    if not _configured:
+        load_environment()
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _configured = True
+    return genai.GenerativeModel(model_name, generation_config=generation_config)
+
+
+class InstrumentedModel:
+    """Wraps a model so each generate call is traced with its latency and token usage.
+
+    Everything else is passed through to the wrapped model; with telemetry
+    off the only cost is one attribute check per call.
+    """
+
+    def __init__(self, model, model_name):
+        self.model = model
+        self.model_name = model_name
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def generate_content(self, *args, **kwargs):
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return self.model.generate_content(*args, **kwargs)
+        if kwargs.get("stream"):
+            return self._stream(telemetry, self.model.generate_content(*args, **kwargs))
+        with telemetry.span("model.generate", model=self.model_name):
+            try:
+                response = self.model.generate_content(*args, **kwargs)
+            except Exception:
+                telemetry.count("agribot_model_errors_total", model=self.model_name)
+                raise
+        telemetry.count("agribot_model_calls_total", model=self.model_name)
+        record_usage(response, self.model_name)
+        return response
+
+    async def generate_content_async(self, *args, **kwargs):
+        telemetry = get_telemetry()
+        if not telemetry.enabled:
+            return await self.model.generate_content_async(*args, **kwargs)
+        with telemetry.span("model.generate", model=self.model_name):
+            try:
+                response = await self.model.generate_content_async(*args, **kwargs)
+            except Exception:
+                telemetry.count("agribot_model_errors_total", model=self.model_name)
+                raise
+        telemetry.count("agribot_model_calls_total", model=self.model_name)
+        record_usage(response, self.model_name)
+        return response
+
+    def _stream(self, telemetry, response):
+        # Timed by hand: a span held open across yields would adopt the caller's spans
+        start = time.perf_counter()
+        chunk = None
+        for chunk_number, chunk in enumerate(response):
+            if chunk_number == 0:
+                telemetry.observe("agribot_model_first_chunk_seconds", time.perf_counter() - start,
+                                  model=self.model_name)
+            yield chunk
+        telemetry.observe("agribot_model_stream_seconds", time.perf_counter() - start, model=self.model_name)
+        telemetry.count("agribot_model_calls_total", model=self.model_name)
+        # The last chunk carries the usage of the whole answer
+        record_usage(chunk, self.model_name)
+
+
+def get_model(model_name=None, generation_config=None):
+    """Cached model for (name, generation config), built on first use.
+
+    Calls go through the shared gateway (coalescing, rate limits, quota
+    backoff) unless AGRIBOT_GATEWAY=0; only the calls that reach the API are
+    traced as model calls.
+    """
+    model_name = model_name or DEFAULT_MODEL
+    key = (model_name, _config_key(generation_config))
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _models:
+            factory = _factory or _build_gemini
+            model = InstrumentedModel(factory(model_name, generation_config), model_name)
+            if GATEWAY:
+                model = GatewayModel(model, model_name, key[1])
+            _models[key] = model
+        return _models[key]
+
+
+def stream_text(response):
+    """Text of each chunk of a generate_content(..., stream=True) response, as it arrives"""
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts, e.g. the final one carrying only a finish reason
+            continue
+        if text:
+            yield text
+
+
+def set_model_factory(factory):
+    """Build models with factory(model_name, generation_config) instead of Gemini.
+
+    Used by tests and benchmarks to inject local fakes; pass None to go back
+    to the real client.
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _models.clear()
+
+
+def reset():
+    """Drop every cached model"""
+    with _lock:
+        _models.clear()
@@ -0,0 +1,178 @@
+# outbreak.py - Flag disease spikes from stored farmer reports
+import os
+import threading
+from datetime import date, timedelta
+
+if __package__:
+    from .report_store import get_report_store
+    from .response_cache import normalize_crop, normalize_location, normalize_text
+    from .gazetteer import ProximityIndex, get_gazetteer
+else:  # run as a script from inside Agents/
+    from report_store import get_report_store
+    from response_cache import normalize_crop, normalize_location, normalize_text
+    from gazetteer import ProximityIndex, get_gazetteer
+
+# Reports in the last WINDOW_DAYS are compared with the BASELINE_DAYS before them
+WINDOW_DAYS = 7
+BASELINE_DAYS = 28
+# A spike needs at least MIN_REPORTS recent reports and SPIKE_RATIO times the baseline rate
+MIN_REPORTS = 3
+SPIKE_RATIO = 2.0
+# Reports from places within this distance count towards a farmer's alert
+ALERT_RADIUS_KM = float(os.getenv("AGRIBOT_ALERT_RADIUS_KM", "30"))
+
+
+class OutbreakDetector:
+    """Daily report counts per (crop, disease, location), updated as reports arrive.
+
+    Loads the last window + baseline days from the store once; after that
+    observe() keeps the counts current, so checking a crop and location only
+    sums a few dozen day buckets. Reported places are kept in a proximity
+    index so reports from neighbouring villages count too.
+    """
+
+    def __init__(self, store=None, window_days=WINDOW_DAYS, baseline_days=BASELINE_DAYS,
+                 min_reports=MIN_REPORTS, spike_ratio=SPIKE_RATIO, radius_km=ALERT_RADIUS_KM):
+        self.store = store
+        self.window_days = window_days
+        self.baseline_days = baseline_days
+        self.min_reports = min_reports
+        self.spike_ratio = spike_ratio
+        self.radius_km = radius_km
+        # (crop, location) -> disease -> {report_date: count}
+        self._counts = {}
+        # location -> (lat, lon) for every reported place with coordinates
+        self._places = {}
+        self._index = ProximityIndex()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        store = self.store or get_report_store()
+        for crop, disease, location, report_date, count, lat, lon in store.daily_counts(self.window_days + self.baseline_days):
+            self._add(crop, disease, location, report_date, count, lat, lon)
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+
+    def _add(self, crop, disease, location, report_date, count=1, lat=None, lon=None):
+        days = self._counts.setdefault((crop, location), {}).setdefault(disease, {})
+        days[report_date] = days.get(report_date, 0) + count
+        if lat is not None and lon is not None and location not in self._places:
+            self._places[location] = (lat, lon)
+            self._index.add(lat, lon, location)
+
+    def observe(self, crop, disease, location, report_date=None, lat=None, lon=None):
+        """Count one new report; call after it has been written to the store"""
+        if not self._loaded:
+            # The first load reads the store, which already has this report
+            self._ensure_loaded()
+            return
+        if isinstance(report_date, date):
+            report_date = report_date.isoformat()
+        if lat is None or lon is None:
+            place = get_gazetteer().resolve(location)
+            lat, lon = (place.lat, place.lon) if place else (None, None)
+        with self._lock:
+            self._add(normalize_crop(crop), normalize_text(disease), normalize_location(location),
+                      report_date or date.today().isoformat(), 1, lat, lon)
+
+    def _prune(self, days, oldest):
+        for report_date in [d for d in days if d < oldest]:
+            del days[report_date]
+
+    def nearby_places(self, location, radius_km=None):
+        """Reported places within radius_km of a location, the location itself first.
+
+        A state name covers every reported place in that state.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._nearby_places(location, radius_km)
+
+    def _nearby_places(self, location, radius_km):
+        # Caller holds the lock: observe() adds places from other threads
+        name = normalize_location(location)
+        radius_km = self.radius_km if radius_km is None else radius_km
+        gazetteer = get_gazetteer()
+        place = gazetteer.resolve(location)
+        if place is not None and place.kind == "state":
+            return [name] + [other for other in self._places
+                             if other != name and getattr(gazetteer.resolve(other), "state", None) == place.state]
+        if place is not None:
+            point = (place.lat, place.lon)
+        else:
+            point = self._places.get(name)
+        if point is None or not radius_km:
+            return [name]
+        return [name] + [other for _, other in self._index.within(point[0], point[1], radius_km) if other != name]
+
+    def check(self, crop, location, today=None, radius_km=None):
+        """Fired outbreaks for a crop around a location, largest spike first.
+
+        Counts from every reported place within radius_km (ALERT_RADIUS_KM by
+        default, 0 for the exact place only) are added together. Each outbreak
+        is a dict with the disease, the places it was reported from, recent and
+        baseline counts and their ratio (None when there is no baseline).
+        """
+        self._ensure_loaded()
+        today = today or date.today()
+        window_start = (today - timedelta(days=self.window_days)).isoformat()
+        baseline_start = (today - timedelta(days=self.window_days + self.baseline_days)).isoformat()
+        crop = normalize_crop(crop)
+
+        outbreaks = []
+        with self._lock:
+            places = self._nearby_places(location, radius_km)
+            # disease -> {report_date: count} summed over the nearby places
+            merged = {}
+            sources = {}
+            for place in places:
+                for disease, days in self._counts.get((crop, place), {}).items():
+                    self._prune(days, baseline_start)
+                    if not days:
+                        continue
+                    totals = merged.setdefault(disease, {})
+                    for report_date, count in days.items():
+                        totals[report_date] = totals.get(report_date, 0) + count
+                    sources.setdefault(disease, []).append(place)
+
+            for disease, days in merged.items():
+                recent = sum(count for d, count in days.items() if d >= window_start)
+                if recent < self.min_reports:
+                    continue
+                baseline = sum(count for d, count in days.items() if d < window_start)
+                expected = baseline * self.window_days / self.baseline_days
+                ratio = recent / expected if expected else None
+                if ratio is None or ratio >= self.spike_ratio:
+                    outbreaks.append({
+                        "crop": crop, "disease": disease, "location": places[0], "places": sources[disease],
+                        "recent": recent, "baseline": baseline,
+                        "ratio": round(ratio, 2) if ratio is not None else None,
+                    })
+        outbreaks.sort(key=lambda o: o["recent"], reverse=True)
+        return outbreaks
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_outbreak_detector():
+    """Shared detector over the shared report store"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = OutbreakDetector()
+    return _detector
+
+
+def set_outbreak_detector(detector):
+    global _detector
+    with _detector_lock:
+        _detector = detector
@@ -0,0 +1,176 @@
+# report_store.py - Persistent, indexed store of farmer disease reports
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+if __package__:
+    from .response_cache import DATA_DIR, normalize_crop, normalize_location, normalize_text
+    from .gazetteer import get_gazetteer
+else:  # run as a script from inside Agents/
+    from response_cache import DATA_DIR, normalize_crop, normalize_location, normalize_text
+    from gazetteer import get_gazetteer
+
+REPORTS_PATH = os.getenv("AGRIBOT_REPORTS_PATH", os.path.join(DATA_DIR, "reports.db"))
+
+REPORT_COLUMNS = ("crop", "disease", "location", "report_date", "lat", "lon")
+
+
+class ReportStore:
+    """Disease reports in SQLite, indexed for crop + location + date range lookups"""
+
+    def __init__(self, path=REPORTS_PATH):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "id INTEGER PRIMARY KEY, crop TEXT NOT NULL, disease TEXT NOT NULL, "
+                "location TEXT NOT NULL, report_date TEXT NOT NULL, lat REAL, lon REAL)"
+            )
+            # Stores created before coordinates were recorded
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+            for column in ("lat", "lon"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE reports ADD COLUMN {column} REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS reports_crop_location_date ON reports (crop, location, report_date)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reports_date ON reports (report_date)")
+
+    @staticmethod
+    def _row(crop, disease, location, report_date=None, lat=None, lon=None):
+        if isinstance(report_date, date):
+            report_date = report_date.isoformat()
+        if lat is None or lon is None:
+            # Coordinates come from the gazetteer unless the reporter sent a GPS fix
+            place = get_gazetteer().resolve(location)
+            lat, lon = (place.lat, place.lon) if place else (None, None)
+        return (
+            normalize_crop(crop),
+            normalize_text(disease),
+            normalize_location(location),
+            report_date or date.today().isoformat(),
+            lat,
+            lon,
+        )
+
+    def add(self, crop, disease, location, report_date=None, lat=None, lon=None):
+        """Store one report, returns its id"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO reports (crop, disease, location, report_date, lat, lon) VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(crop, disease, location, report_date, lat, lon),
+            )
+            return cursor.lastrowid
+
+    def add_many(self, reports, chunk_size=10000):
+        """Bulk ingest dicts with crop, disease, location and optional report_date, lat, lon;
+        returns the count"""
+        count = 0
+        chunk = []
+        for report in reports:
+            chunk.append(self._row(report["crop"], report["disease"], report["location"],
+                                   report.get("report_date"), report.get("lat"), report.get("lon")))
+            if len(chunk) >= chunk_size:
+                count += self._insert(chunk)
+                chunk = []
+        if chunk:
+            count += self._insert(chunk)
+        return count
+
+    def _insert(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO reports (crop, disease, location, report_date, lat, lon) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    @staticmethod
+    def _where(crop=None, location=None, days=None, disease=None):
+        clauses = []
+        params = []
+        if crop:
+            clauses.append("crop = ?")
+            params.append(normalize_crop(crop))
+        if isinstance(location, (list, tuple, set)):
+            # Several places, e.g. everything the proximity index found near a farmer
+            names = sorted({normalize_location(name) for name in location})
+            clauses.append(f"location IN ({', '.join('?' * len(names))})")
+            params.extend(names)
+        elif location:
+            clauses.append("location = ?")
+            params.append(normalize_location(location))
+        if days is not None:
+            clauses.append("report_date >= ?")
+            params.append((date.today() - timedelta(days=days)).isoformat())
+        if disease:
+            clauses.append("disease = ?")
+            params.append(normalize_text(disease))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, crop=None, location=None, days=None, disease=None, limit=None):
+        """Reports matching the given filters, newest first.
+
+        location is one place or a list of places. days counts back from today,
+        so days=7 covers the last week. With a crop and location the lookup is
+        a range scan on the composite index.
+        """
+        where, params = self._where(crop, location, days, disease)
+        sql = "SELECT crop, disease, location, report_date, lat, lon FROM reports" + where + " ORDER BY report_date DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def count(self, crop=None, location=None, days=None, disease=None):
+        where, params = self._where(crop, location, days, disease)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports" + where, params).fetchone()[0]
+
+    def daily_counts(self, days):
+        """(crop, disease, location, report_date, count, lat, lon) rows for the last days,
+        aggregated in SQL"""
+        where, params = self._where(days=days)
+        sql = ("SELECT crop, disease, location, report_date, COUNT(*), MAX(lat), MAX(lon) FROM reports" + where +
+               " GROUP BY crop, disease, location, report_date")
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(sql, params)]
+
+    def seed(self, reports):
+        """Load reports into an empty store; a no-op once anything is stored"""
+        with self._lock:
+            empty = self._conn.execute("SELECT 1 FROM reports LIMIT 1").fetchone() is None
+        if empty:
+            self.add_many(reports)
+
+    def __len__(self):
+        return self.count()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_report_store():
+    """Shared store at AGRIBOT_REPORTS_PATH, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReportStore()
+    return _store
+
+
+def set_report_store(store):
+    """Replace the shared store, e.g. with ReportStore(':memory:') in benchmarks"""
+    global _store
+    with _store_lock:
+        _store = store
@@ -0,0 +1,277 @@
+# response_cache.py - Cache agent answers keyed on normalized parameters
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+CACHE_ENABLED = os.getenv("AGRIBOT_CACHE", "1") != "0"
+CACHE_BACKEND = os.getenv("AGRIBOT_CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("AGRIBOT_CACHE_PATH", os.path.join(DATA_DIR, "agent_cache.db"))
+
+# Seconds an answer stays valid; market prices move fast, crop advice slowly
+AGENT_CACHE_TTLS = {
+    'market_broker': 30 * 60,
+    'crop_advisor': 6 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+# Local and regional names farmers use, mapped to one canonical name
+CROP_SYNONYMS = {
+    'paddy': 'rice', 'dhan': 'rice', 'chawal': 'rice',
+    'gehun': 'wheat', 'gehu': 'wheat', 'kanak': 'wheat',
+    'makka': 'maize', 'makki': 'maize', 'corn': 'maize',
+    'bajra': 'pearl millet', 'jowar': 'sorghum', 'ragi': 'finger millet',
+    'chana': 'chickpea', 'gram': 'chickpea', 'arhar': 'pigeon pea', 'tur': 'pigeon pea',
+    'sarson': 'mustard', 'rai': 'mustard', 'kapas': 'cotton', 'ganna': 'sugarcane',
+    'aloo': 'potato', 'pyaz': 'onion', 'tamatar': 'tomato',
+    'moongphali': 'groundnut', 'peanut': 'groundnut', 'soyabean': 'soybean', 'soya': 'soybean',
+}
+
+LOCATION_SYNONYMS = {
+    'bombay': 'mumbai', 'calcutta': 'kolkata', 'madras': 'chennai', 'bangalore': 'bengaluru',
+    'poona': 'pune', 'gurgaon': 'gurugram', 'baroda': 'vadodara', 'mysore': 'mysuru',
+    'trivandrum': 'thiruvananthapuram', 'allahabad': 'prayagraj', 'benares': 'varanasi',
+    'banaras': 'varanasi', 'orissa': 'odisha', 'pondicherry': 'puducherry',
+    'ahemdabad': 'ahmedabad', 'ahmadabad': 'ahmedabad',
+}
+
+SOIL_SYNONYMS = {
+    'regur': 'black', 'black cotton': 'black', 'alluvium': 'alluvial',
+    'sand': 'sandy', 'clay': 'clayey', 'loam': 'loamy',
+}
+
+
+def normalize_text(value):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    if value is None:
+        return ''
+    value = re.sub(r"[^\w\s]", " ", str(value).lower())
+    return " ".join(value.split())
+
+
+def normalize_crop(crop):
+    crop = normalize_text(crop)
+    if crop in CROP_SYNONYMS:
+        return CROP_SYNONYMS[crop]
+    # Plural forms: tomatoes -> tomato, chillies -> chilli, onions -> onion
+    if crop.endswith('oes'):
+        crop = crop[:-2]
+    elif crop.endswith('ies') and len(crop) > 4:
+        crop = crop[:-2]
+    elif crop.endswith('s') and not crop.endswith('ss') and len(crop) > 3:
+        crop = crop[:-1]
+    return CROP_SYNONYMS.get(crop, crop)
+
+
+def normalize_location(location):
+    location = normalize_text(location)
+    location = re.sub(r"\b(india|district|dist|city|village)\b", " ", location)
+    location = " ".join(location.split())
+    return " ".join(LOCATION_SYNONYMS.get(word, word) for word in location.split())
+
+
+def normalize_soil(soil_type):
+    soil_type = " ".join(word for word in normalize_text(soil_type).split() if word != 'soil')
+    return SOIL_SYNONYMS.get(soil_type, soil_type)
+
+
+def normalize_quantity(quantity):
+    quantity = normalize_text(quantity)
+    # "50 quintals" and "50 quintal" are the same order size
+    return re.sub(r"\b([a-z]{2,})s\b", r"\1", quantity)
+
+
+NORMALIZERS = {
+    'crop': normalize_crop,
+    'location': normalize_location,
+    'soil_type': normalize_soil,
+    'quantity': normalize_quantity,
+}
+
+
+class MemoryBackend:
+    """In-process LRU bounded by entry count and total value size"""
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, value)
+            self._bytes += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk cache shared across restarts, LRU by last access time"""
+
+    def __init__(self, path=CACHE_PATH, max_entries=50000):
+        self.max_entries = max_entries
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            # Counting is a full scan, so the size bound is enforced every 64 writes
+            self._writes += 1
+            if self._writes % 64:
+                return
+            count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Per-agent view on a backend with its own TTL and hit/miss counters"""
+
+    def __init__(self, namespace, backend, ttl=DEFAULT_TTL, enabled=True):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def make_key(self, **parts):
+        """Cache key from parameters, normalized per field name"""
+        normalized = [f"{name}={NORMALIZERS.get(name, normalize_text)(value)}" for name, value in sorted(parts.items())]
+        return f"{self.namespace}|" + "|".join(normalized)
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        if self.enabled:
+            self.backend.set(key, json.dumps(value), self.ttl)
+
+    def hit_ratio(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+
+_backend = None
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def make_backend(kind=None):
+    """Build the backend named by AGRIBOT_CACHE_BACKEND (memory or sqlite)"""
+    kind = kind or CACHE_BACKEND
+    if kind == 'sqlite':
+        return SQLiteBackend(CACHE_PATH)
+    if kind == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+def get_cache(agent_name):
+    """Shared cache for one agent, created on first use"""
+    global _backend
+    cache = _caches.get(agent_name)
+    if cache is not None:
+        return cache
+    with _caches_lock:
+        if agent_name not in _caches:
+            if _backend is None:
+                _backend = make_backend()
+            _caches[agent_name] = ResponseCache(
+                agent_name, _backend, AGENT_CACHE_TTLS.get(agent_name, DEFAULT_TTL), CACHE_ENABLED
+            )
+        return _caches[agent_name]
+
+
+def set_backend(backend):
+    """Swap the shared backend, e.g. for a fresh MemoryBackend in benchmarks"""
+    global _backend
+    with _caches_lock:
+        _backend = backend
+        for cache in _caches.values():
+            cache.backend = backend
+
+
+def cache_stats():
+    """Hit/miss counters per agent"""
+    return {
+        name: {**cache.stats, 'hit_ratio': round(cache.hit_ratio(), 3)}
+        for name, cache in _caches.items()
+    }
@@ -0,0 +1,347 @@
+# telemetry.py - Request tracing and metrics: spans, counters and histograms
+#
+# Off unless AGRIBOT_TELEMETRY=1. When on, every finished request is written as
+# one JSON line (its spans with timings) to AGRIBOT_TELEMETRY_LOG ("-" for
+# stdout) and metrics are served in Prometheus text format on
+# http://localhost:AGRIBOT_METRICS_PORT/metrics. When off, span() hands back a
+# shared no-op and count()/observe() return straight away.
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import itertools
+import threading
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TELEMETRY = os.getenv("AGRIBOT_TELEMETRY", "0") == "1"
+TELEMETRY_LOG = os.getenv("AGRIBOT_TELEMETRY_LOG", "")
+METRICS_PORT = int(os.getenv("AGRIBOT_METRICS_PORT", "0"))
+
+# Seconds; model calls sit between 0.5 and 10, cache hits well under 0.01
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+# Innermost open span of the current thread or task
+_current_span = contextvars.ContextVar("agribot_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """Counts per upper bound, in Prometheus' cumulative-bucket layout when exported"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def exclude(self, seconds):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed stage; spans opened inside it (also in copied contexts) become its children"""
+
+    __slots__ = ("telemetry", "name", "attributes", "id", "parent", "trace", "started_at", "start", "duration",
+                 "_token")
+
+    def __init__(self, telemetry, name, attributes):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.id = next(_span_ids)
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def exclude(self, seconds):
+        """Leave seconds out of the duration, e.g. the time a stream waited for its reader"""
+        self.start += seconds
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.trace = self.parent.trace if self.parent is not None else \
+            {"trace_id": uuid.uuid4().hex[:16], "spans": []}
+        self._token = _current_span.set(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Closed from another context, e.g. a generator finished by a different thread
+            _current_span.set(self.parent)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.telemetry.finish(self)
+        return False
+
+
+class Telemetry:
+    """Holds the metrics of one process and writes finished traces to the JSON log"""
+
+    def __init__(self, enabled=TELEMETRY, log_path=TELEMETRY_LOG):
+        self.enabled = enabled
+        self.log_path = log_path
+        # (name, label key) -> value / Histogram
+        self._counters = {}
+        self._histograms = {}
+        # Functions returning [(name, labels dict, value)], read at export time
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._log_file = None
+        self._log_lock = threading.Lock()
+        self.server = None
+
+    def span(self, name, **attributes):
+        """Context manager timing one stage, e.g. with telemetry.span("agent", agent=name):"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        """Register collector() -> [(name, labels, value)], exported as gauges.
+
+        Used for components that already keep their own counters, so the hot
+        path is not instrumented twice.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def finish(self, span):
+        self.observe("agribot_span_seconds", span.duration, span=span.name)
+        span.trace["spans"].append({
+            "id": span.id,
+            "parent": span.parent.id if span.parent is not None else None,
+            "name": span.name,
+            "start": round(span.started_at, 6),
+            "ms": round(span.duration * 1000, 3),
+            **span.attributes,
+        })
+        if span.parent is None:
+            self.write_trace(span)
+
+    def write_trace(self, root):
+        if not self.log_path:
+            return
+        line = json.dumps({
+            "trace_id": root.trace["trace_id"],
+            "name": root.name,
+            "ms": round(root.duration * 1000, 3),
+            "spans": root.trace["spans"],
+        }, ensure_ascii=False, default=str)
+        with self._log_lock:
+            if self.log_path == "-":
+                sys.stdout.write(line + "\n")
+                return
+            if self._log_file is None:
+                if os.path.dirname(self.log_path):
+                    os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                self._log_file = open(self.log_path, "a", encoding="utf-8")
+            self._log_file.write(line + "\n")
+            self._log_file.flush()
+
+    def _collected(self):
+        gauges = []
+        for collector in list(self._collectors):
+            try:
+                gauges += [(name, _label_key(labels), value) for name, labels, value in collector()]
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        return gauges
+
+    def snapshot(self):
+        """Metrics as a JSON-friendly dict"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (histogram.count, histogram.sum) for key, histogram in self._histograms.items()}
+
+        def name_of(name, label_key):
+            return name + _format_labels(label_key)
+
+        return {
+            "counters": {name_of(*key): value for key, value in counters.items()},
+            "histograms": {name_of(*key): {"count": count, "sum": round(total, 6)}
+                           for key, (count, total) in histograms.items()},
+            "gauges": {name_of(name, label_key): value for name, label_key, value in self._collected()},
+        }
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                                for key, histogram in self._histograms.items())
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, label_key), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(label_key)} {value}")
+
+        for (name, label_key), counts, total, count, buckets in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(label_key, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(label_key)} {total}")
+            lines.append(f"{name}_count{_format_labels(label_key)} {count}")
+
+        for name, label_key, value in sorted(self._collected(), key=lambda gauge: gauge[:2]):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            declare(name, "gauge")
+            lines.append(f"{name}{_format_labels(label_key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=METRICS_PORT, host="0.0.0.0"):
+        """Serve /metrics from a daemon thread; returns the HTTP server"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"📈 Metrics on http://localhost:{self.server.server_address[1]}/metrics")
+        return self.server
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """Shared telemetry, created on first use; starts the metrics endpoint when configured"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                telemetry = Telemetry()
+                if telemetry.enabled and METRICS_PORT:
+                    try:
+                        telemetry.serve(METRICS_PORT)
+                    except OSError as e:
+                        # Another process (e.g. a second Streamlit session) already serves it
+                        print(f"⚠️ Metrics endpoint not started: {e}")
+                _telemetry = telemetry
+    return _telemetry
+
+
+def set_telemetry(telemetry):
+    """Replace the shared telemetry, e.g. with Telemetry(enabled=True) in benchmarks"""
+    global _telemetry
+    with _telemetry_lock:
+        _telemetry = telemetry
+
+
+def span(name, **attributes):
+    return get_telemetry().span(name, **attributes)
+
+
+def count(name, value=1, **labels):
+    get_telemetry().count(name, value, **labels)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    get_telemetry().observe(name, value, buckets, **labels)
+
+
+def record_usage(response, model_name):
+    """Token counts of a finished model response, when the API reports them"""
+    telemetry = get_telemetry()
+    usage = getattr(response, "usage_metadata", None)
+    if not telemetry.enabled or usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+        tokens = getattr(usage, field, None)
+        if tokens:
+            telemetry.count("agribot_model_tokens_total", tokens, model=model_name, kind=kind)
+            telemetry.observe("agribot_model_tokens", tokens, TOKEN_BUCKETS, model=model_name, kind=kind)
+
+
+def stats_metrics(prefix, stats, **labels):
+    """(name, labels, value) gauges from a component's stats dict"""
+    return [(f"{prefix}_{key}", labels, value) for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)]
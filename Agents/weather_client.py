@@ -0,0 +1,244 @@
+# weather_client.py - Pooled WeatherAPI.com client with a per-city forecast cache
+import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if __package__:
+    from .model_registry import load_environment
+    from .response_cache import normalize_location
+    from .telemetry import span
+else:  # run as a script from inside Agents/
+    from model_registry import load_environment
+    from response_cache import normalize_location
+    from telemetry import span
+
+WEATHER_URL = "http://api.weatherapi.com/v1/forecast.json"
+
+# Retried upstream statuses: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class WeatherError(Exception):
+    pass
+
+
+class ForecastCache:
+    """Forecasts per (city, date); fresh for ttl, then served stale while refreshed"""
+
+    def __init__(self, ttl=30 * 60, stale_ttl=3 * 60 * 60, max_entries=5000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.stats = {'fresh_hits': 0, 'stale_hits': 0, 'misses': 0}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(city):
+        return (normalize_location(city), date.today().isoformat())
+
+    def get(self, key):
+        """Returns (data, is_stale) or (None, False)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.time() - entry[0]
+                if age < self.ttl:
+                    self.stats['fresh_hits'] += 1
+                    return entry[1], False
+                if age < self.stale_ttl:
+                    self.stats['stale_hits'] += 1
+                    return entry[1], True
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None, False
+
+    def set(self, key, data):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), data)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+
+class WeatherClient:
+    """WeatherAPI client with keep-alive pooling, timeouts, bounded retry and caching"""
+
+    def __init__(self, api_key=None, base_url=WEATHER_URL, connect_timeout=3.05, read_timeout=10,
+                 retries=3, backoff=0.5, pool_size=20, cache=None):
+        load_environment()
+        self.api_key = api_key or os.getenv("WEATHER_API_KEY")
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.cache = cache or ForecastCache()
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset(["GET"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # httpx clients are bound to the event loop they were created on
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+
+    def _params(self, city):
+        return {"key": self.api_key, "q": city, "days": 1, "aqi": "no", "alerts": "no"}
+
+    def fetch(self, city):
+        """Uncached forecast request"""
+        with span("weather.fetch", city=city):
+            response = self.session.get(self.base_url, params=self._params(city), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+            client = self._async_clients[loop] = httpx.AsyncClient(timeout=timeout, limits=limits)
+        return client
+
+    async def afetch(self, city):
+        """Async uncached forecast request with the same retry policy"""
+        client = self._async_client()
+        with span("weather.fetch", city=city) as fetch_span:
+            for attempt in range(self.retries + 1):
+                fetch_span.set(attempts=attempt + 1)
+                try:
+                    response = await client.get(self.base_url, params=self._params(city))
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        response.raise_for_status()
+                        return response.json()
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        raise
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    def _refresh(self, key, city):
+        try:
+            self.cache.set(key, self.fetch(city))
+        except Exception as e:
+            print("❌ Weather refresh error:", e)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key, city):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._refresher.submit(self._refresh, key, city)
+
+    def forecast(self, city):
+        """Today's forecast for a city, from cache when possible"""
+        key = self.cache.key(city)
+        data, is_stale = self.cache.get(key)
+        if data is not None:
+            if is_stale:
+                self._schedule_refresh(key, city)
+            return data
+        data = self.fetch(city)
+        self.cache.set(key, data)
+        return data
+
+    async def aforecast(self, city):
+        """Async version of forecast; stale entries are refreshed in a worker thread"""
+        key = self.cache.key(city)
+        data, is_stale = self.cache.get(key)
+        if data is not None:
+            if is_stale:
+                self._schedule_refresh(key, city)
+            return data
+        data = await self.afetch(city)
+        self.cache.set(key, data)
+        return data
+
+
+class FixtureWeatherClient:
+    """Offline stand-in that serves recorded WeatherAPI responses.
+
+    fixtures is either a dict of city -> response JSON or a directory of
+    <city>.json files; cities without a fixture get default (if given).
+    latency is seconds per call, or a function returning them, e.g. to draw
+    from a distribution in benchmarks.
+    """
+
+    def __init__(self, fixtures, default=None, latency=0.0):
+        if isinstance(fixtures, str):
+            fixtures = self._load_directory(fixtures)
+        self.fixtures = {normalize_location(city): data for city, data in fixtures.items()}
+        self.default = default
+        self.latency = latency
+        self.calls = 0
+
+    @staticmethod
+    def _load_directory(path):
+        fixtures = {}
+        for name in os.listdir(path):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name), encoding="utf-8") as f:
+                    fixtures[os.path.splitext(name)[0]] = json.load(f)
+        return fixtures
+
+    def _lookup(self, city):
+        self.calls += 1
+        data = self.fixtures.get(normalize_location(city), self.default)
+        if data is None:
+            raise WeatherError(f"No weather fixture for {city}")
+        return data
+
+    def _delay(self):
+        return self.latency() if callable(self.latency) else self.latency
+
+    def forecast(self, city):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._lookup(city)
+
+    async def aforecast(self, city):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._lookup(city)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_weather_client():
+    """Shared client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WeatherClient()
+    return _client
+
+
+def set_weather_client(client):
+    """Replace the shared client, e.g. with a FixtureWeatherClient in tests"""
+    global _client
+    with _client_lock:
+        _client = client
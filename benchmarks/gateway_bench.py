@@ -0,0 +1,169 @@
+# gateway_bench.py - Outbreak-spike benchmark of the Gemini gateway against a fake quota
+#
+#   python benchmarks/gateway_bench.py [--quota-rpm 600] [--clients 40] [--batch-clients 8] [--seconds 8]
+#   python benchmarks/gateway_bench.py --gateway-rpm 1200     # rate set too high: backoff has to find the quota
+#
+# A fake model answers after a log-normal delay and raises a ResourceExhausted
+# error once more calls start within a second than its quota allows. Interactive
+# clients mostly ask the same few alert questions (the spike), batch clients
+# send distinct prompts. The same load runs once straight against the model and
+# once through the gateway, configured with the quota as its rate.
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import threading
+from collections import deque
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Agents.gateway import Gateway, GatewayModel, set_gateway, priority, BATCH
+
+SPIKE_PROMPTS = [f"Any disease alerts for {crop} in Nashik?" for crop in ("onion", "grapes", "tomato")]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class ResourceExhausted(Exception):
+    """Named like google.api_core's 429 error"""
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class QuotaModel:
+    """Fake Gemini that enforces quota_rpm over a sliding one-second window"""
+
+    def __init__(self, quota_rpm, median_ms, sigma, seed):
+        self.per_second = quota_rpm / 60.0
+        self.mu = math.log(median_ms / 1000)
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._starts = deque()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.quota_errors = 0
+
+    def generate_content(self, contents, **kwargs):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            while self._starts and self._starts[0] <= now - 1.0:
+                self._starts.popleft()
+            if len(self._starts) >= self.per_second:
+                self.quota_errors += 1
+                raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+            self._starts.append(now)
+            delay = self._random.lognormvariate(self.mu, self.sigma)
+        time.sleep(delay)
+        return FakeResponse(f"answer to {contents}")
+
+
+def run_load(model, seconds, clients, batch_clients, spike_share, think_ms, seed):
+    """Closed-loop clients for the given time; returns latencies and error counts per lane"""
+    deadline = time.monotonic() + seconds
+    results = {"interactive": [], "batch": []}
+    errors = {"interactive": 0, "batch": 0}
+    lock = threading.Lock()
+    unique = iter(range(10 ** 9))
+
+    def client(lane, client_seed):
+        rng = random.Random(client_seed)
+        while time.monotonic() < deadline:
+            if lane == "interactive" and rng.random() < spike_share:
+                prompt = rng.choice(SPIKE_PROMPTS)
+            else:
+                with lock:
+                    prompt = f"{lane} question {next(unique)}"
+            start = time.perf_counter()
+            try:
+                if lane == "batch":
+                    with priority(BATCH):
+                        model.generate_content(prompt)
+                else:
+                    model.generate_content(prompt)
+                with lock:
+                    results[lane].append((time.perf_counter() - start) * 1000)
+            except Exception:
+                # Where synthesize_response would give up and send its fallback text
+                with lock:
+                    errors[lane] += 1
+            time.sleep(think_ms / 1000)
+
+    threads = [threading.Thread(target=client, args=("interactive", seed + i)) for i in range(clients)]
+    threads += [threading.Thread(target=client, args=("batch", seed + 1000 + i)) for i in range(batch_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors, time.perf_counter() - start
+
+
+def summarize(upstream, results, errors, elapsed, gateway=None):
+    answered = len(results["interactive"]) + len(results["batch"])
+    summary = {
+        "answered_rps": round(answered / elapsed, 2),
+        "failed_share": round(sum(errors.values()) / max(answered + sum(errors.values()), 1), 3),
+        "upstream_rps": round(upstream.calls / elapsed, 2),
+        "upstream_quota_errors": upstream.quota_errors,
+        "interactive_p50_ms": round(percentile(results["interactive"], 50), 1),
+        "interactive_p95_ms": round(percentile(results["interactive"], 95), 1),
+        "batch_p95_ms": round(percentile(results["batch"], 95), 1),
+        "batch_answered": len(results["batch"]),
+    }
+    if gateway is not None:
+        stats = gateway.metrics()
+        summary.update(coalesced=stats['coalesced'], retries=stats['retries'], rejected=stats['rejected'])
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gemini gateway under an outbreak spike, against a fake quota")
+    parser.add_argument("--quota-rpm", type=float, default=600, help="fake model quota, calls per minute")
+    parser.add_argument("--model-ms", type=float, default=80, help="median fake model latency")
+    parser.add_argument("--sigma", type=float, default=0.35, help="log-normal spread of the latency")
+    parser.add_argument("--clients", type=int, default=40, help="interactive clients")
+    parser.add_argument("--batch-clients", type=int, default=8)
+    parser.add_argument("--spike-share", type=float, default=0.7, help="interactive prompts that are the same alert question")
+    parser.add_argument("--think-ms", type=float, default=50, help="pause between a client's requests")
+    parser.add_argument("--gateway-rpm", type=float, help="rate the gateway is configured with (default: the quota)")
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    load = (args.seconds, args.clients, args.batch_clients, args.spike_share, args.think_ms, args.seed)
+    print(f"🧪 Gateway benchmark: quota {args.quota_rpm:g} rpm, {args.clients} interactive and "
+          f"{args.batch_clients} batch clients for {args.seconds:g} s")
+
+    direct = QuotaModel(args.quota_rpm, args.model_ms, args.sigma, args.seed)
+    results, errors, elapsed = run_load(direct, *load)
+    runs = {"direct": summarize(direct, results, errors, elapsed)}
+
+    upstream = QuotaModel(args.quota_rpm, args.model_ms, args.sigma, args.seed)
+    # Burst 1: the fake quota counts over one second, not a minute
+    gateway = Gateway(rpm=args.gateway_rpm or args.quota_rpm, burst=1)
+    set_gateway(gateway)
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w", encoding="utf-8")
+    try:
+        results, errors, elapsed = run_load(GatewayModel(upstream, "fake-gemini"), *load)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    runs["gateway"] = summarize(upstream, results, errors, elapsed, gateway)
+
+    ceiling = args.quota_rpm / 60
+    for name, summary in runs.items():
+        print(f"\n  {name} (quota ceiling {ceiling:.1f} upstream calls/s)")
+        for key, value in summary.items():
+            print(f"    {key}: {value}")
@@ -0,0 +1,82 @@
+# leaf_classifier_bench.py - Latency and escalation rate of the local leaf check
+#
+#   python benchmarks/leaf_classifier_bench.py --images path/to/leaf/photos [--batch-sizes 1 8] [--threshold 0.9]
+#
+# Every image is preprocessed the way the disease detector does it, then
+# triaged at each batch size. Escalated images are the ones that would still
+# be sent to Gemini Vision.
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Agents.image_preprocess import preprocess_image
+from Agents.leaf_classifier import LeafClassifier, CONFIDENCE_THRESHOLD, BLUR_THRESHOLD
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def load_images(directory):
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths += [os.path.join(root, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+    images = []
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            images.append(preprocess_image(f.read())[0])
+    return images
+
+
+def run(images, batch_size, threshold, blur_threshold):
+    classifier = LeafClassifier(threshold=threshold, blur_threshold=blur_threshold, batch_size=batch_size)
+    # Load the model before timing anything
+    classifier.triage(images[:1])
+    classifier.stats = dict.fromkeys(classifier.stats, 0)
+
+    per_image_ms = []
+    start = time.perf_counter()
+    for offset in range(0, len(images), batch_size):
+        batch = images[offset:offset + batch_size]
+        batch_start = time.perf_counter()
+        classifier.triage(batch)
+        per_image_ms += [(time.perf_counter() - batch_start) * 1000 / len(batch)] * len(batch)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "batch_size": batch_size,
+        "images": len(images),
+        "ms_per_image_p50": round(percentile(per_image_ms, 50), 1),
+        "ms_per_image_p99": round(percentile(per_image_ms, 99), 1),
+        "images_per_s": round(len(images) / elapsed, 1) if elapsed else 0.0,
+        "escalation_rate": round(classifier.escalation_rate(), 3),
+        **classifier.stats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local leaf classifier latency and escalation rate")
+    parser.add_argument("--images", required=True, help="directory of leaf photos (searched recursively)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--blur-threshold", type=float, default=BLUR_THRESHOLD)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"No images found in {args.images}")
+
+    print("🧪 Leaf classifier benchmark")
+    for batch_size in args.batch_sizes:
+        print(f"\n  batch size {batch_size}")
+        for key, value in run(images, batch_size, args.threshold, args.blur_threshold).items():
+            print(f"    {key}: {value}")
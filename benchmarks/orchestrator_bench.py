@@ -0,0 +1,463 @@
+# orchestrator_bench.py - Offline end-to-end benchmark with a fake Gemini and WeatherAPI
+#
+#   python benchmarks/orchestrator_bench.py [--queries benchmarks/data/query_log.jsonl] [--model-ms 30]
+#   python benchmarks/orchestrator_bench.py --save-baseline
+#
+# Gemini and WeatherAPI are swapped for local fakes with canned answers and
+# latencies drawn from seeded log-normal distributions, so runs need no keys or
+# network and repeat closely. Every query is replayed through process_request
+# and through the matching agent entry point. With a stored baseline the run
+# exits 1 when upstream calls per request, peak memory or our own CPU time
+# regress, and always when a query naming two tasks does not run both agents
+# at once.
+#
+# Wall-clock latency is reported but not gated, it depends on the machine. The
+# CPU time is gated instead: every scenario is replayed once more with instant
+# fakes, and its p95 is divided by a fixed control workload timed in the same
+# run, right before it, so a slower or busier machine scales both alike.
+import io
+import os
+import re
+import sys
+import json
+import math
+import asyncio
+import time
+import random
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+from Agents import model_registry
+from Agents import crop_disease_detector
+from Agents.response_cache import MemoryBackend, set_backend
+from Agents.weather_client import FixtureWeatherClient, set_weather_client
+from Agents.report_store import ReportStore, set_report_store
+from Agents.outbreak import set_outbreak_detector
+from Agents.alert_messages import AlertMessageCache, set_message_cache
+from Agents.image_dedup import ImageHashIndex, set_image_index
+from Agents.gateway import Gateway, set_gateway
+from Agents.crop_advisor import get_crop_advice
+from Agents.market_broker import get_market_broker_response
+from Agents.alert_agent import check_disease_alert, generate_alert_message
+from history_store import HistoryStore
+from orchestrator import SimpleAgenticOrchestrator
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "data", "query_log.jsonl")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "data", "orchestrator_baseline.json")
+
+TASK_AGENTS = {
+    'crop_selection': 'crop_advisor',
+    'market_info': 'market_broker',
+    'disease_detection': 'disease_detector',
+    'alert_check': 'alert_system',
+}
+
+# A realistic length for the bilingual answers, about 350 output tokens
+CANNED_ANSWER = ("1. **Soybean** - suits the soil and the coming rain, sow in the first fortnight.\n"
+                 "2. **Cotton** - good prices this season, needs 2-3 irrigations.\n"
+                 "3. **Pigeon pea** - hardy if the monsoon is weak.\n\n"
+                 "1. **सोयाबीन** - मिट्टी और आने वाली बारिश के लिए सही, पहले पखवाड़े में बुवाई करें।\n"
+                 "2. **कपास** - इस मौसम में अच्छे दाम, 2-3 सिंचाई चाहिए।\n"
+                 "3. **अरहर** - कमज़ोर मानसून में भी टिकाऊ।\n") * 3
+
+FORECAST = {"forecast": {"forecastday": [{"date": "2024-07-01", "day": {
+    "condition": {"text": "Patchy rain possible"}, "maxtemp_c": 31.2, "mintemp_c": 24.8,
+    "daily_chance_of_rain": 70, "daily_will_it_rain": 1}}]}}
+
+# Compared against the baseline; relative tolerances for CPU time and memory,
+# any increase for upstream calls since those are deterministic
+LATENCY_METRICS = ('cpu_p95_units',)
+CALL_METRICS = ('model_calls_per_request', 'weather_calls_per_request')
+MEMORY_METRICS = ('peak_kib',)
+# Changes below these are noise, e.g. on cached sub-millisecond paths
+MIN_DELTA = {'cpu_p95_units': 0.1, 'peak_kib': 64.0}
+# CPU time is the fastest of a few runs: anything slower was the machine, not the code
+CONTROL_RUNS = 7
+CPU_PASSES = 3
+
+# Market and crop questions in one message, both agents wait on the fake model
+FAN_OUT_QUERY = "sell my onion at the best mandi price in Nashik, also recommend a crop"
+# Run one after the other the agents take the sum of their times, at once about the slower one's
+FAN_OUT_MAX_SHARE = 0.9
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class LatencyDistribution:
+    """Seconds per call from a seeded log-normal around median_ms"""
+
+    def __init__(self, median_ms, sigma, seed):
+        self.mu = math.log(max(median_ms, 0.001) / 1000)
+        self.sigma = sigma
+        self.enabled = median_ms > 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            return self._random.lognormvariate(self.mu, self.sigma)
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens=0):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt_tokens, len(text) // 4)
+
+
+class FakeModel:
+    """Stand-in for genai.GenerativeModel answering from the query corpus.
+
+    Structured analysis and parameter calls get the labels recorded in the
+    corpus, everything else the canned bilingual answer.
+    """
+
+    def __init__(self, model_name, generation_config, bench):
+        self.model_name = model_name
+        schema = (generation_config or {}).get("response_schema")
+        self.schema = getattr(schema, "__name__", None)
+        self.bench = bench
+
+    def _answer(self, contents):
+        if isinstance(contents, list):
+            return CANNED_ANSWER
+        record = self.bench.record_for(contents)
+        if self.schema == 'RequestParameters':
+            return json.dumps(self.bench.parameters(record))
+        if self.schema == 'RequestAnalysis':
+            task = record.get('primary_task', 'general') if record else 'general'
+            return json.dumps({
+                "intent": task.replace('_', ' '), "agents_needed": [TASK_AGENTS.get(task, 'crop_advisor')],
+                "primary_task": task, "parameters": self.bench.parameters(record),
+                "confidence": 0.9, "reasoning": "fake model",
+            })
+        return CANNED_ANSWER
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self.bench.count('model')
+        text = self._answer(contents)
+        prompt_tokens = len(str(contents)) // 4
+        delay = self.bench.model_latency()
+        if stream:
+            return self._stream(text, prompt_tokens, delay)
+        time.sleep(delay)
+        return FakeResponse(text, prompt_tokens)
+
+    def _stream(self, text, prompt_tokens, delay, chunks=12):
+        # Most of the wait is before the first chunk, like the real API
+        time.sleep(delay * 0.4)
+        size = -(-len(text) // chunks)
+        for offset in range(0, len(text), size):
+            if offset:
+                time.sleep(delay * 0.6 / chunks)
+            yield FakeResponse(text[offset:offset + size], prompt_tokens)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        self.bench.count('model')
+        text = self._answer(contents)
+        await asyncio.sleep(self.bench.model_latency())
+        return FakeResponse(text, len(str(contents)) // 4)
+
+
+class UploadedImage:
+    """Minimal stand-in for Streamlit's UploadedFile"""
+
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+        self.type = "image/jpeg"
+
+    def getvalue(self):
+        return self.data
+
+
+def leaf_photo(seed, size=(1600, 1200)):
+    """Phone-sized JPEG with a different pattern per seed, so dedup sees distinct photos"""
+    rng = random.Random(seed)
+    small = Image.new("RGB", (16, 12))
+    small.putdata([(rng.randrange(40, 120), rng.randrange(90, 200), rng.randrange(20, 90)) for _ in range(16 * 12)])
+    output = io.BytesIO()
+    small.resize(size, Image.BICUBIC).save(output, format="JPEG", quality=92)
+    return output.getvalue()
+
+
+class Bench:
+    """Fakes, fresh state per scenario and the upstream call counters"""
+
+    def __init__(self, records, model_ms, weather_ms, sigma, seed):
+        self.records = records
+        self.by_query = {record['query']: record for record in records}
+        self.model_ms, self.weather_ms, self.sigma, self.seed = model_ms, weather_ms, sigma, seed
+        self.images = {query: UploadedImage(leaf_photo(query), "leaf.jpg") for query, record in self.by_query.items()
+                       if record.get('primary_task') == 'disease_detection'}
+        self.tmpdir = tempfile.mkdtemp(prefix="agribot-bench-")
+        self.calls = {'model': 0}
+        self._calls_lock = threading.Lock()
+        self.weather = None
+        self.runs = 0
+        model_registry.set_model_factory(lambda name, config: FakeModel(name, config, self))
+        # Coalescing stays on; the fakes have no quota to protect
+        set_gateway(Gateway(rpm=0))
+        # The local classifier needs transformers and would dominate CPU time
+        crop_disease_detector.LEAF_TRIAGE = False
+
+    def count(self, kind):
+        with self._calls_lock:
+            self.calls[kind] += 1
+
+    def record_for(self, prompt):
+        for query, record in self.by_query.items():
+            if f'"{query}"' in prompt:
+                return record
+        return None
+
+    @staticmethod
+    def parameters(record):
+        record = record or {}
+        soil = re.search(r"(\w+) soil", record.get('query', ''), re.IGNORECASE)
+        return {"crop": record.get('crop'), "location": record.get('location'),
+                "soil_type": soil.group(1).lower() if soil else None, "quantity": None}
+
+    def reset(self, latency=True):
+        """Empty caches, stores and counters, with latencies replayed from the same seed.
+
+        Without latency the fakes answer at once, leaving only our own CPU time.
+        """
+        self.runs += 1
+        model_ms, weather_ms = (self.model_ms, self.weather_ms) if latency else (0, 0)
+        self.model_latency = LatencyDistribution(model_ms, self.sigma, self.seed)
+        self.weather = FixtureWeatherClient({}, default=FORECAST,
+                                            latency=LatencyDistribution(weather_ms, self.sigma, self.seed + 1))
+        set_weather_client(self.weather)
+        set_backend(MemoryBackend())
+        set_report_store(ReportStore(os.path.join(self.tmpdir, f"reports-{self.runs}.db")))
+        set_outbreak_detector(None)
+        set_message_cache(AlertMessageCache(os.path.join(self.tmpdir, f"messages-{self.runs}.json"),
+                                            generator=generate_alert_message))
+        set_image_index(ImageHashIndex())
+        with self._calls_lock:
+            self.calls = {'model': 0}
+
+
+def scenarios(bench, orchestrator):
+    """(name, records, call) for process_request and each agent entry point"""
+    def by_task(task):
+        return [record for record in bench.records if record.get('primary_task') == task]
+
+    def soil(record):
+        return bench.parameters(record)['soil_type'] or 'mixed'
+
+    return [
+        ('process_request', bench.records,
+         lambda r: orchestrator.process_request(r['query'], image_file=bench.images.get(r['query']))),
+        ('crop_advisor', by_task('crop_selection'),
+         lambda r: get_crop_advice(soil(r), r.get('location') or 'India')),
+        ('market_broker', by_task('market_info'),
+         lambda r: get_market_broker_response(r.get('crop') or 'wheat', r.get('location') or 'India')),
+        ('alert_system', by_task('alert_check'),
+         lambda r: check_disease_alert(r.get('crop') or 'wheat', r.get('location') or 'India')),
+        ('disease_detector', by_task('disease_detection'),
+         lambda r: crop_disease_detector.analyze_crop_image(bench.images[r['query']])),
+    ]
+
+
+def control_workload(data):
+    """Fixed CPU work none of the code under test runs: a JPEG decode, resize and encode and a Python loop"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    image.resize((1024, 768), Image.BILINEAR).save(io.BytesIO(), format="JPEG", quality=85)
+    total = 0
+    for i in range(100000):
+        total += i * i % 7
+    return total
+
+
+def control_ms(data):
+    """Fastest milliseconds of the control workload on this machine, right now"""
+    timings = []
+    for _ in range(CONTROL_RUNS):
+        start = time.perf_counter()
+        control_workload(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def replay(records, call):
+    """Milliseconds per request, in order"""
+    latencies = []
+    for record in records:
+        request_start = time.perf_counter()
+        call(record)
+        latencies.append((time.perf_counter() - request_start) * 1000)
+    return latencies
+
+
+def run_scenario(bench, records, call, control_data):
+    bench.reset()
+    start = time.perf_counter()
+    latencies = replay(records, call)
+    elapsed = time.perf_counter() - start
+    model_calls, weather_calls = bench.calls['model'], bench.weather.calls
+
+    # Same requests with instant fakes: only our CPU time, against the control timed alongside
+    controls = []
+    passes = []
+    for _ in range(CPU_PASSES):
+        controls.append(control_ms(control_data))
+        bench.reset(latency=False)
+        passes.append(replay(records, call))
+    control = min(controls)
+    cpu_p95 = percentile([min(timings) for timings in zip(*passes)], 95)
+
+    # Second pass for memory, tracemalloc slows everything down too much to time
+    bench.reset()
+    tracemalloc.start()
+    for record in records:
+        call(record)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(records) or 1
+    return {
+        "requests": len(records),
+        "throughput_rps": round(len(records) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "cpu_p95_ms": round(cpu_p95, 2),
+        "control_ms": round(control, 2),
+        "cpu_p95_units": round(cpu_p95 / control, 3),
+        "model_calls_per_request": round(model_calls / count, 3),
+        "weather_calls_per_request": round(weather_calls / count, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "retained_kib_per_request": round(retained / 1024 / count, 2),
+    }
+
+
+def fan_out_check(bench, orchestrator):
+    """Runs FAN_OUT_QUERY; returns (metrics, problems)"""
+    bench.reset()
+    orchestrator.process_request(FAN_OUT_QUERY)
+    turn = orchestrator.conversation_history[-1]
+    agent_seconds = sum(turn.timings.get(f"agent.{agent}", 0.0) for agent in turn.agents_called)
+    metrics = {
+        "agents": turn.agents_called,
+        "agents_ms": round(turn.timings.get('agents', 0.0) * 1000, 2),
+        "sum_of_agents_ms": round(agent_seconds * 1000, 2),
+        "synthesis_policy": turn.timings.get('synthesis_policy'),
+        "synthesis_saved_est": turn.timings.get('synthesis_saved_est'),
+    }
+    problems = []
+    if len(turn.agents_called) < 2:
+        problems.append(f"fan_out: {FAN_OUT_QUERY!r} ran {turn.agents_called}, expected two agents")
+    elif turn.timings.get('synthesis_policy') != 'template':
+        problems.append(f"fan_out: two answers were combined by {turn.timings.get('synthesis_policy')}, "
+                        "expected the template merge")
+    elif turn.timings['agents'] > agent_seconds * FAN_OUT_MAX_SHARE:
+        problems.append(f"fan_out: agents took {metrics['agents_ms']} ms of {metrics['sum_of_agents_ms']} ms, "
+                        "they did not run concurrently")
+    return metrics, problems
+
+
+def compare(results, baseline, memory_tolerance, cpu_tolerance):
+    """Regressions of results against baseline, as readable lines"""
+    regressions = []
+    for name, metrics in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        for metric in LATENCY_METRICS + MEMORY_METRICS:
+            if metric not in expected:
+                continue
+            tolerance = cpu_tolerance if metric in LATENCY_METRICS else memory_tolerance
+            limit = max(expected[metric] * (1 + tolerance), expected[metric] + MIN_DELTA[metric])
+            if metrics[metric] > limit:
+                regressions.append(f"{name}.{metric}: {metrics[metric]} > {expected[metric]} (+{tolerance:.0%})")
+        for metric in CALL_METRICS:
+            if metric in expected and metrics[metric] > expected[metric] + 1e-9:
+                regressions.append(f"{name}.{metric}: {metrics[metric]} > {expected[metric]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline orchestrator and agent benchmark with fake upstreams")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSONL corpus with query and primary_task")
+    parser.add_argument("--model-ms", type=float, default=30, help="median fake Gemini latency")
+    parser.add_argument("--weather-ms", type=float, default=10, help="median fake WeatherAPI latency")
+    parser.add_argument("--sigma", type=float, default=0.35, help="log-normal spread of both latencies")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed memory growth")
+    parser.add_argument("--cpu-tolerance", type=float, default=0.5,
+                        help="allowed CPU time growth, wider since the control only evens out part of the noise")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    bench = Bench(records, args.model_ms, args.weather_ms, args.sigma, args.seed)
+    orchestrator = SimpleAgenticOrchestrator(semantic_cache=False,
+                                             history_store=HistoryStore(os.path.join(bench.tmpdir, "history.db")))
+
+    # The agents and orchestrator print a lot per request; keep the report readable
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w", encoding="utf-8")
+    try:
+        control_data = leaf_photo("control")
+        results = {name: run_scenario(bench, scenario_records, call, control_data)
+                   for name, scenario_records, call in scenarios(bench, orchestrator) if scenario_records}
+        fan_out, problems = fan_out_check(bench, orchestrator)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print("🧪 Orchestrator benchmark (fake Gemini and WeatherAPI)")
+    for name, metrics in results.items():
+        print(f"\n  {name}")
+        for key, value in metrics.items():
+            print(f"    {key}: {value}")
+
+    print("\n  fan_out")
+    for key, value in fan_out.items():
+        print(f"    {key}: {value}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(dict(results, fan_out=fan_out), f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Baseline saved to {args.baseline}")
+    regressions = list(problems)
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions += compare(results, json.load(f), args.tolerance, args.cpu_tolerance)
+    if regressions:
+        print("\n❌ Regressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    if not args.save_baseline:
+        print("\n✅ No regressions against the baseline")
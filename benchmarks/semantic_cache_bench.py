@@ -0,0 +1,74 @@
+# semantic_cache_bench.py - Replay a query log through the semantic cache
+#
+#   python benchmarks/semantic_cache_bench.py [--log benchmarks/data/query_log.jsonl] [--threshold 0.88]
+#
+# Each log line has the query, its scope (primary_task, crop, location) and
+# the end-to-end latency the request took upstream. A hit saves that latency
+# minus the time spent embedding and searching.
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from semantic_cache import SemanticCache, SIMILARITY_THRESHOLD, cache_scope
+
+DEFAULT_LOG = os.path.join(os.path.dirname(__file__), "data", "query_log.jsonl")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def replay(log_path, threshold, max_entries):
+    cache = SemanticCache(threshold=threshold, max_entries=max_entries)
+    with open(log_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    # Load the embedding model before timing anything
+    cache.embed("warm up")
+
+    lookup_ms = []
+    saved_ms = []
+    for record in records:
+        scope = cache_scope(record["primary_task"], record)
+        start = time.perf_counter()
+        response, _, vector = cache.lookup(record["query"], scope)
+        elapsed = (time.perf_counter() - start) * 1000
+        lookup_ms.append(elapsed)
+        if response is not None:
+            saved_ms.append(record["latency_ms"] - elapsed)
+        else:
+            saved_ms.append(0.0)
+            cache.store(record["query"], scope, f"answer for {record['query']}", vector)
+
+    hits = cache.stats["hits"]
+    return {
+        "queries": len(records),
+        "hits": hits,
+        "hit_rate": round(hits / len(records), 3) if records else 0.0,
+        "lookup_ms_p50": round(percentile(lookup_ms, 50), 2),
+        "lookup_ms_p99": round(percentile(lookup_ms, 99), 2),
+        "saved_ms_p50": round(percentile(saved_ms, 50), 1),
+        "saved_ms_p99": round(percentile(saved_ms, 99), 1),
+        "saved_ms_total": round(sum(saved_ms), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semantic cache hit rate and latency saved on a query log")
+    parser.add_argument("--log", default=DEFAULT_LOG)
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD)
+    parser.add_argument("--max-entries", type=int, default=2048)
+    args = parser.parse_args()
+
+    results = replay(args.log, args.threshold, args.max_entries)
+    print("🧪 Semantic cache benchmark")
+    for key, value in results.items():
+        print(f"  {key}: {value}")
@@ -0,0 +1,180 @@
+# service_load.py - Load test for the HTTP service
+#
+#   python benchmarks/service_load.py [--clients 32] [--requests 400] [--sessions 40] [--workers 8] [--queue 32]
+#   python benchmarks/service_load.py --clients 64 --queue 8     # more clients than capacity: expect 503s
+#   python benchmarks/service_load.py --url http://localhost:8080
+#
+# Replays the query corpus against POST /chat from many client threads, each
+# request in one of --sessions conversations. A conversation starts without a
+# session_id and goes on with the one the service answers with; like a farmer
+# in a chat, it sends its next message once the last one is answered. Without --url an in-process
+# service is started with the fake Gemini and WeatherAPI of orchestrator_bench,
+# so runs need no keys or network. Reports latency of answered requests and
+# how many were turned away with 503 by the service's backpressure.
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator_bench import Bench, DEFAULT_QUERIES, percentile
+from service import SERVICE_WORKERS, SERVICE_QUEUE
+
+
+def start_local_service(bench, workers, queue_size):
+    """Service on a free local port, backed by the bench fakes; returns (url, service, server)"""
+    from history_store import HistoryStore, set_history_store
+    from orchestrator import AgentPool, set_agent_pool
+    from service import AgriBotService, make_server
+
+    set_history_store(HistoryStore(os.path.join(tempfile.mkdtemp(prefix="agribot-load-"), "history.db")))
+    set_agent_pool(AgentPool(semantic_cache=False))
+    bench.reset()
+    service = AgriBotService(workers, queue_size)
+    server = make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, name="service", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", service, server
+
+
+def request_bodies(bench):
+    """JSON body per corpus query, without a session_id"""
+    bodies = []
+    for record in bench.records:
+        body = {"message": record['query']}
+        image = bench.images.get(record['query'])
+        if image is not None:
+            body["image"] = base64.b64encode(image.getvalue()).decode("ascii")
+        bodies.append(body)
+    return bodies
+
+
+class Conversation:
+    __slots__ = ('lock', 'session_id')
+
+    def __init__(self):
+        # Held while a message is answered, so a conversation never has two in flight
+        self.lock = threading.Lock()
+        self.session_id = None
+
+
+def run_load(url, bodies, clients, total, sessions):
+    """Send total requests from clients threads, each on its own keep-alive connection"""
+    target = urlsplit(url)
+    results = []
+    results_lock = threading.Lock()
+    next_index = iter(range(total))
+    index_lock = threading.Lock()
+    conversations = [Conversation() for _ in range(sessions)]
+
+    def client():
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=300)
+        while True:
+            with index_lock:
+                index = next(next_index, None)
+            if index is None:
+                break
+            conversation = conversations[index % sessions]
+            with conversation.lock:
+                body = dict(bodies[index % len(bodies)])
+                if conversation.session_id is not None:
+                    body["session_id"] = conversation.session_id
+                start = time.perf_counter()
+                try:
+                    connection.request("POST", "/chat", json.dumps(body).encode("utf-8"),
+                                       {"Content-Type": "application/json"})
+                    response = connection.getresponse()
+                    payload = response.read()
+                    status = response.status
+                    if response.will_close:
+                        connection.close()
+                except (OSError, http.client.HTTPException):
+                    status = 0
+                    connection.close()
+                if status == 200:
+                    conversation.session_id = json.loads(payload)["session_id"]
+                elif status == 404:
+                    # Expired on the service; the next message starts a new conversation
+                    conversation.session_id = None
+            with results_lock:
+                results.append((status, (time.perf_counter() - start) * 1000))
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    answered = [ms for status, ms in results if status == 200]
+    rejected = [ms for status, ms in results if status == 503]
+    return {
+        "requests": len(results),
+        "statuses": statuses,
+        "answered_rps": round(len(answered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(answered, 50), 2),
+        "p95_ms": round(percentile(answered, 95), 2),
+        "p99_ms": round(percentile(answered, 99), 2),
+        "rejected_share": round(len(rejected) / len(results), 3) if results else 0.0,
+        "rejected_p95_ms": round(percentile(rejected, 95), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test of the AgriBot HTTP service")
+    parser.add_argument("--url", help="running service to test; default starts one in-process with fakes")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSONL corpus with query and primary_task")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--requests", type=int, default=400, help="requests to send in total")
+    parser.add_argument("--sessions", type=int, default=40, help="conversations the requests are spread over")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="in-process service only")
+    parser.add_argument("--queue", type=int, default=SERVICE_QUEUE, help="in-process service only")
+    parser.add_argument("--model-ms", type=float, default=30, help="median fake Gemini latency")
+    parser.add_argument("--weather-ms", type=float, default=10, help="median fake WeatherAPI latency")
+    parser.add_argument("--sigma", type=float, default=0.35, help="log-normal spread of both latencies")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    bench = Bench(records, args.model_ms, args.weather_ms, args.sigma, args.seed)
+
+    service = None
+    url = args.url
+    # The agents and orchestrator print a lot per request; keep the report readable
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w", encoding="utf-8")
+    try:
+        if url is None:
+            url, service, server = start_local_service(bench, args.workers, args.queue)
+        results, elapsed = run_load(url, request_bodies(bench), args.clients, args.requests, args.sessions)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    summary = summarize(results, elapsed)
+    print(f"🧪 Service load test: {args.clients} clients, {args.sessions} sessions against {url}")
+    for key, value in summary.items():
+        print(f"    {key}: {value}")
+    if service is not None:
+        summary["service"] = dict(service.workers.stats, sessions=len(service.sessions),
+                                  model_calls=bench.calls['model'])
+        print(f"    service: {summary['service']}")
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
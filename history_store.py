@@ -0,0 +1,227 @@
+# history_store.py - Bounded conversation history and per-user profiles on disk
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+
+from Agents.response_cache import DATA_DIR
+
+HISTORY_PATH = os.getenv("AGRIBOT_HISTORY_PATH", os.path.join(DATA_DIR, "history.db"))
+# Turns kept per session; older ones stay on disk only
+HISTORY_LIMIT = int(os.getenv("AGRIBOT_HISTORY_LIMIT", "50"))
+# Newest turns whose response text stays in memory, the rest is read back on demand
+RESIDENT_RESPONSES = int(os.getenv("AGRIBOT_HISTORY_RESIDENT", "5"))
+# Turns kept on disk per user
+DISK_LIMIT = int(os.getenv("AGRIBOT_HISTORY_DISK_LIMIT", "500"))
+# Seconds the turns of sessions without a user ID are kept on disk
+SESSION_TTL = 24 * 60 * 60
+SESSION_PREFIX = "session:"
+
+TURN_FIELDS = ('timestamp', 'user_input', 'intent', 'primary_task', 'agents_called', 'agents_timed_out',
+               'had_image', 'timings')
+
+
+class HistoryStore:
+    """Turn bodies and user profiles in SQLite"""
+
+    def __init__(self, path=HISTORY_PATH, disk_limit=DISK_LIMIT):
+        self.path = path
+        self.disk_limit = disk_limit
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, created_at REAL NOT NULL, "
+                "meta TEXT NOT NULL, response TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS turns_user ON turns (user_id, id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (user_id TEXT PRIMARY KEY, context TEXT NOT NULL)"
+            )
+
+    def add_turn(self, user_id, meta, response):
+        """Store one turn, returns its id"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO turns (user_id, created_at, meta, response) VALUES (?, ?, ?, ?)",
+                (user_id, time.time(), json.dumps(meta, ensure_ascii=False, default=str), response),
+            )
+            self._writes += 1
+            # Trimming every write would cost a scan per turn
+            if self._writes % 50 == 0:
+                self._conn.execute(
+                    "DELETE FROM turns WHERE user_id = ? AND id <= "
+                    "(SELECT id FROM turns WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (user_id, user_id, self.disk_limit),
+                )
+                # Anonymous sessions cannot come back, so their turns only need to outlive the session
+                self._conn.execute(
+                    "DELETE FROM turns WHERE user_id LIKE ? AND created_at < ?",
+                    (SESSION_PREFIX + "%", time.time() - SESSION_TTL),
+                )
+            return cursor.lastrowid
+
+    def response(self, turn_id):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM turns WHERE id = ?", (turn_id,)).fetchone()
+        return row[0] if row else None
+
+    def recent_turns(self, user_id, limit):
+        """(id, meta) of the newest turns, oldest first and without their responses"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, meta FROM turns WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [(turn_id, json.loads(meta)) for turn_id, meta in reversed(rows)]
+
+    def load_profile(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT context FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_profile(self, user_id, context):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO profiles (user_id, context) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET context = excluded.context",
+                (user_id, json.dumps(context, ensure_ascii=False)),
+            )
+
+    def clear(self, user_id):
+        """Forget a user's turns and profile"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
+
+
+class Turn:
+    """One question and answer. Reads like the dicts history used to hold
+    (turn['response'], turn.get('intent')), but the response text can live on disk.
+    """
+
+    __slots__ = ('id', 'timestamp', 'user_input', 'intent', 'primary_task', 'agents_called', 'agents_timed_out',
+                 'had_image', 'timings', '_response', '_store')
+
+    def __init__(self, timestamp, user_input, intent=None, primary_task=None, agents_called=(),
+                 agents_timed_out=(), had_image=False, timings=None, response=None, turn_id=None, store=None):
+        self.id = turn_id
+        self.timestamp = timestamp
+        self.user_input = user_input
+        self.intent = intent
+        self.primary_task = primary_task
+        self.agents_called = list(agents_called or ())
+        self.agents_timed_out = list(agents_timed_out or ())
+        self.had_image = had_image
+        self.timings = timings or {}
+        self._response = response
+        self._store = store
+
+    @property
+    def response(self):
+        if self._response is not None:
+            return self._response
+        if self._store is not None and self.id is not None:
+            return self._store.response(self.id) or ""
+        return ""
+
+    def spill(self):
+        """Drop the response text from memory once it is safely on disk"""
+        if self._store is not None and self.id is not None:
+            self._response = None
+
+    def meta(self):
+        return {field: getattr(self, field) for field in TURN_FIELDS}
+
+    def __getitem__(self, key):
+        if key not in TURN_FIELDS and key != 'response':
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class ConversationHistory:
+    """Ring buffer of the newest turns for one user.
+
+    Only the last `resident` responses are held in memory, so a long session
+    uses the same memory after its first `limit` turns as after a thousand.
+    """
+
+    def __init__(self, user_id=None, store=None, limit=HISTORY_LIMIT, resident=RESIDENT_RESPONSES):
+        # Without a user ID the turns are filed under a one-off session ID
+        self.user_id = user_id or SESSION_PREFIX + uuid.uuid4().hex
+        self.store = store
+        self.resident = resident
+        self._turns = deque(maxlen=limit)
+
+    def restore(self):
+        """Load the user's latest turns from the store, responses stay on disk"""
+        if self.store is None:
+            return
+        self._turns.clear()
+        for turn_id, meta in self.store.recent_turns(self.user_id, self._turns.maxlen):
+            self._turns.append(Turn(turn_id=turn_id, store=self.store,
+                                    **{field: meta.get(field) for field in TURN_FIELDS}))
+
+    def append(self, entry):
+        """Add a turn, given as a Turn or a dict with the TURN_FIELDS and response"""
+        if not isinstance(entry, Turn):
+            entry = Turn(response=entry.get('response', ''), **{field: entry.get(field) for field in TURN_FIELDS})
+        if self.store is not None:
+            try:
+                entry.id = self.store.add_turn(self.user_id, entry.meta(), entry.response)
+                entry._store = self.store
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not save conversation turn: {e}")
+        self._turns.append(entry)
+        if len(self._turns) > self.resident:
+            self._turns[-self.resident - 1].spill()
+        return entry
+
+    def clear(self):
+        self._turns.clear()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._turns)[index]
+        return self._turns[index]
+
+    def __iter__(self):
+        return iter(list(self._turns))
+
+    def __len__(self):
+        return len(self._turns)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Shared store at AGRIBOT_HISTORY_PATH, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+    return _store
+
+
+def set_history_store(store):
+    """Replace the shared store, e.g. with HistoryStore(':memory:') in benchmarks"""
+    global _store
+    with _store_lock:
+        _store = store
@@ -0,0 +1,147 @@
+# intent_router.py - Local keyword router for the orchestrator
+import os
+import re
+import threading
+
+# Keyword stems for each agent. A stem also matches its longer forms
+# ("sell" -> "selling", "seller"), and multi-word phrases count double.
+AGENT_KEYWORDS = {
+    'disease_detector': [
+        'disease', 'pest', 'sick', 'dying', 'spot', 'leaf', 'leaves', 'problem', 'analyze',
+        'diagnose', 'health', 'infect', 'fungus', 'fungal', 'blight', 'rust', 'wilt',
+        'yellowing', 'insect', 'check photo', 'analyze image'
+    ],
+    'crop_advisor': [
+        'grow', 'plant', 'sow', 'cultivat', 'suggest crop', 'which crop', 'best crop',
+        'suitable crop', 'recommend', 'what to grow', 'soil'
+    ],
+    'market_broker': [
+        'sell', 'buy', 'buyer', 'market', 'price', 'purchase', 'mandi', 'rate', 'where to sell'
+    ],
+    'alert_system': [
+        'alert', 'warning', 'outbreak', 'recent', 'nearby', 'near me', 'in my area',
+        'disease alert', 'any disease'
+    ],
+}
+
+# Words a keyword prefix would otherwise match, e.g. 'pest' in "pesticide":
+# buying pesticide is a market question, not a sick crop
+EXCLUDED_WORDS = ['pesticide', 'insecticide']
+
+# Order used to break ties, mirrors the old validate_agent_selection priority
+AGENT_PRIORITY = ['disease_detector', 'crop_advisor', 'market_broker', 'alert_system']
+
+PRIMARY_TASKS = {
+    'disease_detector': 'disease_detection',
+    'crop_advisor': 'crop_selection',
+    'market_broker': 'market_info',
+    'alert_system': 'alert_check',
+}
+
+DEFAULT_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.6"))
+
+
+def _compile(keywords, excluded=EXCLUDED_WORDS):
+    """Build one regex over every keyword, longest first so phrases win, skipping excluded words"""
+    lookup = {}
+    for agent, words in keywords.items():
+        for word in words:
+            lookup[word] = (agent, len(word.split()))
+    alternation = '|'.join(re.escape(word) for word in sorted(lookup, key=len, reverse=True))
+    exclusion = '|'.join(re.escape(word) for word in excluded)
+    guard = rf"(?!(?:{exclusion}))" if exclusion else ""
+    return re.compile(rf"\b{guard}({alternation})\w*", re.IGNORECASE), lookup
+
+
+class IntentRouter:
+    """Deterministic keyword router that scores every agent in one regex pass"""
+
+    def __init__(self, threshold=None, keywords=None):
+        self.threshold = DEFAULT_THRESHOLD if threshold is None else threshold
+        self.pattern, self.lookup = _compile(keywords or AGENT_KEYWORDS)
+        self.stats = {'local_hits': 0, 'llm_fallbacks': 0}
+        self._lock = threading.Lock()
+
+    def score(self, user_input, has_image=False):
+        """Return (scores, confidence, best_agent) for a query"""
+        scores = {}
+        for match in self.pattern.finditer(user_input):
+            agent, weight = self.lookup[match.group(1).lower()]
+            scores[agent] = scores.get(agent, 0) + weight
+
+        if has_image:
+            return scores, 1.0, 'disease_detector'
+        if not scores:
+            return scores, 0.0, None
+
+        best = max(AGENT_PRIORITY, key=lambda agent: (scores.get(agent, 0), -AGENT_PRIORITY.index(agent)))
+        share = scores[best] / sum(scores.values())
+        confidence = share * self.strength(scores[best])
+        return scores, round(confidence, 3), best
+
+    @staticmethod
+    def strength(hits):
+        """One keyword hit scores 0.75, two or more score 1.0"""
+        return min(1.0, 0.5 + 0.25 * hits) if hits else 0.0
+
+    def agents_for(self, scores, best):
+        """The best agent and every other agent scoring at least the threshold, in AGENT_PRIORITY order"""
+        return [agent for agent in AGENT_PRIORITY
+                if agent == best or self.strength(scores.get(agent, 0)) >= self.threshold]
+
+    def route(self, user_input, has_image=False):
+        """Classify locally; returns an intent dict or None when the LLM should decide.
+
+        A query whose best agent is clear also gets every other task it names,
+        e.g. a market and an alert question in one message.
+        """
+        scores, confidence, best = self.score(user_input, has_image)
+
+        with self._lock:
+            if best is None or confidence < self.threshold:
+                self.stats['llm_fallbacks'] += 1
+                return None
+            self.stats['local_hits'] += 1
+
+        agents = ['disease_detector'] if has_image else self.agents_for(scores, best)
+        return {
+            "intent": f"{PRIMARY_TASKS[best].replace('_', ' ')} request",
+            "agents_needed": agents,
+            "primary_task": PRIMARY_TASKS[best],
+            "parameters": {"crop": None, "location": None, "soil_type": None, "has_image": has_image},
+            "confidence": confidence,
+            "reasoning": f"local keyword router (scores: {scores})",
+            "source": "local",
+        }
+
+    def hit_ratio(self):
+        """Share of requests answered without the LLM classifier"""
+        total = self.stats['local_hits'] + self.stats['llm_fallbacks']
+        return self.stats['local_hits'] / total if total else 0.0
+
+
+# (query, agents the router should pick, or None when the LLM should decide)
+ROUTER_CASES = [
+    ("Which crop is best for black soil in Maharashtra", ['crop_advisor']),
+    ("where to sell wheat in punjab", ['market_broker']),
+    ("yellow spots on wheat leaves", ['disease_detector']),
+    ("sell my wheat, and any disease alerts nearby?", ['market_broker', 'alert_system']),
+    ("best price for onion in Nashik mandi, and any outbreak warning nearby?", ['market_broker', 'alert_system']),
+    ("tomato plant leaves have brown patches", None),
+    ("where to buy pesticide for cotton", ['market_broker']),
+    ("who will buy my soybean", ['market_broker']),
+    ("pests eating my cotton bolls", ['disease_detector']),
+]
+
+
+if __name__ == "__main__":
+    router = IntentRouter()
+    failures = 0
+    for query, expected in ROUTER_CASES:
+        intent = router.route(query)
+        agents = intent['agents_needed'] if intent else None
+        if agents != expected:
+            failures += 1
+            print(f"❌ {query!r}: {agents}, expected {expected} (scores: {router.score(query)[0]})")
+    print(f"{'✅' if not failures else '❌'} {len(ROUTER_CASES) - failures}/{len(ROUTER_CASES)} router cases")
+    raise SystemExit(1 if failures else 0)
@@ -3,19 +3,13 @@ import os
 import sys
 import json
 from datetime import datetime
-import google.generativeai as genai
-from dotenv import load_dotenv
 from PIL import Image
 import io
-
-# Load environment
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel("gemini-1.5-flash")
+import itertools
 
 # Import your orchestrator (adjust path as needed)
 try:
-    from orchestrator import SimpleAgenticOrchestrator
+    from orchestrator import SimpleAgenticOrchestrator, PERSIST_HISTORY
 except ImportError:
     st.error("Could not import SimpleAgenticOrchestrator. Please ensure the file is in the same directory.")
     st.stop()
@@ -319,15 +313,19 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def signed_in_email():
+    """Email of the viewer when the app runs behind Streamlit's login (st.login), else None"""
+    user = getattr(st, "user", None)
+    if user is None or not getattr(user, "is_logged_in", False):
+        return None
+    return getattr(user, "email", None)
+
 # Initialize session state
 if 'orchestrator' not in st.session_state:
     st.session_state.orchestrator = SimpleAgenticOrchestrator()
-    
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
-    
-if 'user_context' not in st.session_state:
-    st.session_state.user_context = {}
+
+# The orchestrator keeps the (bounded) history and profile; the page only reads them
+orchestrator = st.session_state.orchestrator
 
 # Sidebar
 with st.sidebar:
@@ -354,8 +352,17 @@ with st.sidebar:
     
     # User context display
     st.markdown("### 📋 Your Profile")
-    if st.session_state.user_context:
-        for key, value in st.session_state.user_context.items():
+    # Saved profiles are only reopened for a login checked by Streamlit, never for a typed-in name
+    farmer_id = signed_in_email() if PERSIST_HISTORY else None
+    if farmer_id and farmer_id != orchestrator.user_id:
+        orchestrator.set_user(farmer_id)
+    if orchestrator.user_id:
+        st.caption(f"👤 Signed in as {orchestrator.user_id}, your profile is remembered next time")
+    else:
+        st.caption("👤 Your profile is kept for this session only")
+    
+    if orchestrator.user_context:
+        for key, value in orchestrator.user_context.items():
             if key == 'interests':
                 st.write("*Interests:*")
                 for interest, count in value.items():
@@ -369,17 +376,16 @@ with st.sidebar:
     
     # Statistics
     st.markdown("### 📊 Session Stats")
-    total_queries = len(st.session_state.chat_history)
+    total_queries = len(orchestrator.conversation_history)
     st.metric("Total Queries", total_queries)
     
-    if st.session_state.chat_history:
-        with_images = sum(1 for chat in st.session_state.chat_history if chat.get('had_image'))
+    if orchestrator.conversation_history:
+        with_images = sum(1 for chat in orchestrator.conversation_history if chat.get('had_image'))
         st.metric("Image Analyses", with_images)
     
     # Clear chat button
     if st.button("🗑 Clear Chat History", type="secondary"):
-        st.session_state.chat_history = []
-        st.session_state.user_context = {}
+        orchestrator.clear_history()
         st.rerun()
 
 # Main content
@@ -387,7 +393,7 @@ st.markdown('<h1 class="main-header">🌾 AgriBot AI</h1>', unsafe_allow_html=Tr
 st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Your intelligent farming companion powered by multiple AI agents</p>', unsafe_allow_html=True)
 
 # Feature overview (show only if no chat history)
-if not st.session_state.chat_history:
+if not orchestrator.conversation_history:
     st.markdown("## 🚀 What I Can Help You With")
     
     col1, col2 = st.columns(2)
@@ -432,7 +438,7 @@ st.markdown("## 💬 Chat with AI Assistant")
 # Display chat history
 chat_container = st.container()
 with chat_container:
-    for i, chat in enumerate(st.session_state.chat_history):
+    for i, chat in enumerate(orchestrator.conversation_history):
         # User message
         st.markdown(f"""
         <div class="chat-message user-message">
@@ -508,47 +514,29 @@ if send_button:
         # Clear the example query immediately to prevent reprocessing
         st.session_state.example_query = ""
             
-        with st.spinner("🧠 AI agents are analyzing your query..."):
-            try:
-                # Process the request
-                response = st.session_state.orchestrator.process_request(
-                    user_input, 
-                    image_file=uploaded_file
-                )
-                
-                # Add to chat history
-                chat_entry = {
-                    "timestamp": datetime.now().isoformat(),
-                    "user_input": user_input,
-                    "response": response,
-                    "had_image": uploaded_file is not None
-                }
-                
-                # Get additional info from orchestrator's history
-                if st.session_state.orchestrator.conversation_history:
-                    last_conversation = st.session_state.orchestrator.conversation_history[-1]
-                    chat_entry.update({
-                        "intent": last_conversation.get("intent"),
-                        "agents_called": last_conversation.get("agents_called", []),
-                        "primary_task": last_conversation.get("primary_task")
-                    })
-                
-                st.session_state.chat_history.append(chat_entry)
-                
-                # Update user context
-                st.session_state.user_context = st.session_state.orchestrator.user_context
-                
-                # Show success message
-                st.success("✅ Response generated successfully!")
-                
-                # Rerun to show the new chat
-                st.rerun()
-                
-            except Exception as e:
-                st.error(f"❌ Error processing your request: {str(e)}")
-                st.error("Please check if all agents are properly loaded and try again.")
-                # Clear states on error
-                st.session_state.example_query = ""
+        try:
+            # Stream the answer onto the page as it is generated; the spinner
+            # covers routing and the agents until the first chunk arrives
+            chunks = orchestrator.process_request_stream(
+                user_input, 
+                image_file=uploaded_file
+            )
+            with st.spinner("🧠 AI agents are analyzing your query..."):
+                first_chunk = next(chunks, "")
+            # The finished turn is recorded in the orchestrator's history
+            st.write_stream(itertools.chain([first_chunk], chunks))
+            
+            # Show success message
+            st.success("✅ Response generated successfully!")
+            
+            # Rerun to show the new chat
+            st.rerun()
+            
+        except Exception as e:
+            st.error(f"❌ Error processing your request: {str(e)}")
+            st.error("Please check if all agents are properly loaded and try again.")
+            # Clear states on error
+            st.session_state.example_query = ""
                 
     else:
         st.warning("Please enter a question or upload an image!")
@@ -565,5 +553,5 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Auto-refresh for real-time updates (optional)
-if st.session_state.chat_history:
+if orchestrator.conversation_history:
     st.markdown(f"Last updated: {datetime.now().strftime('%H:%M:%S')}")
\ No newline at end of file
@@ -1,72 +1,320 @@
 # simple_orchestrator.py - Works with your current structure
 import os
 import sys
+import re
 import json
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import List, TypedDict
+import importlib
+import sqlite3
+import threading
+from intent_router import IntentRouter, AGENT_PRIORITY
+from semantic_cache import SemanticCache, cache_scope
+from slot_filling import SlotFiller
+from history_store import ConversationHistory, get_history_store
+from Agents.model_registry import get_model, load_environment, stream_text
+from Agents.response_cache import cache_stats
+from Agents.telemetry import get_telemetry, span, count, observe, stats_metrics
 
 # Load environment
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel("gemini-1.5-flash")
+load_environment()
 
-# Simple import strategy - adjust paths as needed
+PARAMETER_KEYS = ('crop', 'location', 'soil_type', 'quantity')
+PRIMARY_TASKS = ('disease_detection', 'crop_selection', 'market_info', 'alert_check', 'general')
+
+# Schemas for Gemini structured output
+class RequestParameters(TypedDict):
+    crop: str
+    location: str
+    soil_type: str
+    quantity: str
+
+class RequestAnalysis(TypedDict):
+    intent: str
+    agents_needed: List[str]
+    primary_task: str
+    parameters: RequestParameters
+    confidence: float
+    reasoning: str
+
+# How agent outputs become the final answer: 'auto' passes single results
+# through and merges several with a template, 'llm' always re-synthesizes
+SYNTHESIS_MODE = os.getenv("AGRIBOT_SYNTHESIS_MODE", "auto")
+# Seconds an LLM synthesis takes until real calls have been measured, about
+# 350 output tokens from gemini-1.5-flash; used for timings['synthesis_saved_est']
+SYNTHESIS_ESTIMATE = float(os.getenv("AGRIBOT_SYNTHESIS_ESTIMATE", "3.0"))
+
+AGENT_TITLES = {
+    'crop_advisor': '🌱 Crop Advisor',
+    'market_broker': '🤝 Market Broker',
+    'disease_detector': '🔬 Disease Detector',
+    'alert_system': '⚠️ Alert System'
+}
+
+# Reuse final answers for paraphrased questions (needs transformers + torch)
+SEMANTIC_CACHE = os.getenv("AGRIBOT_SEMANTIC_CACHE", "1") != "0"
+
+# Keep history bodies and user profiles on disk (data/history.db). Off unless
+# asked for: anyone who can name a user ID gets that user's history, so only
+# turn it on where the front end hands over a verified identity
+PERSIST_HISTORY = os.getenv("AGRIBOT_HISTORY", "0") == "1"
+
+# Run the agents of one request in parallel threads instead of one by one
+CONCURRENT_AGENTS = os.getenv("AGRIBOT_CONCURRENT_AGENTS", "1") != "0"
+
+# Seconds each agent may take before its answer is dropped from the response
+AGENT_TIMEOUTS = {
+    'crop_advisor': 30,
+    'market_broker': 20,
+    'disease_detector': 45,
+    'alert_system': 15
+}
+
+# Threads shared by every orchestrator of the process for agent calls; one
+# request uses at most one per agent
+AGENT_THREADS = int(os.getenv("AGRIBOT_AGENT_THREADS", str(len(AGENT_TIMEOUTS) * 4)))
+
+# Prefixes call_agent and the agents use when they could not answer
+AGENT_ERROR_PREFIXES = ("Error calling", "Agent ", "⚠️ Gemini Error", "❌ Error")
+
+TIMEOUT_NOTE = "⏳ This part took too long to answer, please ask again in a moment."
+
+# Start of the alert agent's fixed all-clear message; anything else is a fired outbreak
+ALERT_CLEAR_PREFIX = "✅ No recent disease outbreaks"
+
+ANALYSIS_CONFIG = {"response_mime_type": "application/json", "response_schema": RequestAnalysis}
+PARAMETERS_CONFIG = {"response_mime_type": "application/json", "response_schema": RequestParameters}
+
+def parse_json_response(text):
+    """Parse model JSON, tolerating ```json fences around it"""
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+    return json.loads(match.group(1) if match else text.strip())
+
+def validate_parameters(data):
+    """Coerce extracted parameters to the schema, empty values become None"""
+    if not isinstance(data, dict):
+        data = {}
+    parameters = {}
+    for key in PARAMETER_KEYS:
+        value = data.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str) or value.strip().lower() in ('', 'null', 'none', 'n/a', 'unknown'):
+            value = None
+        parameters[key] = value.strip() if value else None
+    return parameters
+
+def validate_analysis(data, has_image=False):
+    """Check a structured analysis result and fill in safe defaults"""
+    if not isinstance(data, dict):
+        raise ValueError(f"analysis is not an object: {data!r}")
+    agents = data.get('agents_needed')
+    if isinstance(agents, str):
+        agents = [agents]
+    if has_image and not agents:
+        agents = ['disease_detector']
+    primary_task = data.get('primary_task')
+    try:
+        confidence = float(data.get('confidence', 0.5))
+    except (TypeError, ValueError):
+        confidence = 0.5
+    return {
+        "intent": str(data.get('intent') or 'general agricultural query'),
+        "agents_needed": [agent for agent in agents or [] if agent in AGENT_PRIORITY],
+        "primary_task": primary_task if primary_task in PRIMARY_TASKS else 'general',
+        "parameters": validate_parameters(data.get('parameters')),
+        "confidence": confidence,
+        "reasoning": str(data.get('reasoning') or ''),
+        "source": "llm",
+    }
+
+# (key, module in Agents/, sync function, async function, display name)
+AGENT_MODULES = [
+    ('crop_advisor', 'crop_advisor', 'get_crop_advice', 'aget_crop_advice', 'Crop Advisor'),
+    ('market_broker', 'market_broker', 'get_market_broker_response', 'aget_market_broker_response', 'Market Broker'),
+    ('disease_detector', 'crop_disease_detector', 'analyze_crop_image', 'aanalyze_crop_image', 'Disease Detector'),
+    ('alert_system', 'alert_agent', 'check_disease_alert', 'acheck_disease_alert', 'Alert System'),
+]
+
+# Agents that can hand back their answer in chunks: key -> (module in Agents/, streaming function)
+STREAMING_AGENTS = {
+    'crop_advisor': ('crop_advisor', 'stream_crop_advice'),
+    'market_broker': ('market_broker', 'stream_market_broker_response'),
+}
+
+# Simple import strategy - agents are imported from the Agents package
 def import_agents():
     """Dynamically import agents with error handling"""
     agents = {}
     
-    try:
-        # Try to import from current directory structure
-        if os.path.exists("Agents"):
-            sys.path.append("Agents")
-            
-        # Import individual agents
+    for agent_name, module_name, function_name, _, display_name in AGENT_MODULES:
         try:
-            from crop_advisor import get_crop_advice
-            agents['crop_advisor'] = get_crop_advice
-            print("✅ Crop Advisor loaded")
-        except ImportError as e:
-            print(f"⚠️ Could not load Crop Advisor: {e}")
-            
-        try:
-            from market_broker import get_market_broker_response
-            agents['market_broker'] = get_market_broker_response
-            print("✅ Market Broker loaded")
-        except ImportError as e:
-            print(f"⚠️ Could not load Market Broker: {e}")
-            
-        try:
-            from crop_disease_detector import analyze_crop_image
-            agents['disease_detector'] = analyze_crop_image
-            print("✅ Disease Detector loaded")
-        except ImportError as e:
-            print(f"⚠️ Could not load Disease Detector: {e}")
-            
-        try:
-            from alert_agent import check_disease_alert
-            agents['alert_system'] = check_disease_alert
-            print("✅ Alert System loaded")
-        except ImportError as e:
-            print(f"⚠️ Could not load Alert System: {e}")
-            
-    except Exception as e:
-        print(f"❌ Error loading agents: {e}")
+            module = importlib.import_module(f"Agents.{module_name}")
+            agents[agent_name] = getattr(module, function_name)
+            print(f"✅ {display_name} loaded")
+        except (ImportError, AttributeError) as e:
+            print(f"⚠️ Could not load {display_name}: {e}")
     
     return agents
 
+def import_async_agents():
+    """Async variants of the agents, keyed like import_agents"""
+    async_agents = {}
+    for agent_name, module_name, _, function_name, _ in AGENT_MODULES:
+        try:
+            module = importlib.import_module(f"Agents.{module_name}")
+            async_agents[agent_name] = getattr(module, function_name)
+        except (ImportError, AttributeError):
+            pass
+    return async_agents
+
+def import_streaming_agents():
+    """Streaming variants of the agents that have one, keyed like import_agents"""
+    streaming_agents = {}
+    for agent_name, (module_name, function_name) in STREAMING_AGENTS.items():
+        try:
+            module = importlib.import_module(f"Agents.{module_name}")
+            streaming_agents[agent_name] = getattr(module, function_name)
+        except (ImportError, AttributeError):
+            pass
+    return streaming_agents
+
+class AgentPool:
+    """Agent functions, the threads they run on and the semantic cache.
+
+    Loaded once per process and shared by all orchestrators, so a new chat
+    session or service user only brings its own history and context.
+    """
+
+    def __init__(self, threads=AGENT_THREADS, semantic_cache=None):
+        self.agents = import_agents()
+        self.async_agents = import_async_agents()
+        self.streaming_agents = import_streaming_agents()
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="agent")
+        if semantic_cache is None:
+            semantic_cache = SemanticCache() if SEMANTIC_CACHE else False
+        self.semantic_cache = semantic_cache or None
+        print(f"✅ Loaded {len(self.agents)} agents successfully")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_agent_pool():
+    """Shared agent pool, loaded on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = AgentPool()
+    return _pool
+
+def set_agent_pool(pool):
+    """Replace the shared pool, e.g. with AgentPool(semantic_cache=False) in benchmarks"""
+    global _pool
+    with _pool_lock:
+        _pool = pool
+
+def component_metrics():
+    """Counters the caches and image pipeline keep themselves, for the metrics endpoint.
+
+    Only components already in use are reported; collecting never creates them.
+    """
+    gauges = []
+    for agent, stats in cache_stats().items():
+        gauges += stats_metrics("agribot_response_cache", stats, agent=agent)
+    modules = {name: sys.modules.get(f"Agents.{name}") for name in
+               ('weather_client', 'image_dedup', 'image_preprocess', 'leaf_classifier', 'alert_messages', 'gateway')}
+    if modules['weather_client'] and getattr(modules['weather_client']._client, 'cache', None) is not None:
+        gauges += stats_metrics("agribot_forecast_cache", modules['weather_client']._client.cache.stats)
+    if modules['image_dedup'] and modules['image_dedup']._index is not None:
+        gauges += stats_metrics("agribot_image_dedup", modules['image_dedup']._index.metrics())
+    if modules['image_preprocess']:
+        gauges += stats_metrics("agribot_image_preprocess", modules['image_preprocess'].preprocess_stats())
+    if modules['leaf_classifier'] and modules['leaf_classifier']._classifier is not None:
+        gauges += stats_metrics("agribot_leaf_triage", modules['leaf_classifier']._classifier.stats)
+    if modules['alert_messages'] and modules['alert_messages']._cache is not None:
+        gauges += stats_metrics("agribot_alert_messages", modules['alert_messages']._cache.stats)
+    if modules['gateway'] and modules['gateway']._gateway is not None:
+        gateway = modules['gateway']._gateway
+        gauges += stats_metrics("agribot_gateway", gateway.metrics())
+        gauges += [("agribot_gateway_rpm", {"model": name}, rpm) for name, rpm in gateway.rates().items()]
+    return gauges
+
+_metrics_registered = False
+
+def register_component_metrics():
+    """Add component_metrics to the shared telemetry once per process"""
+    global _metrics_registered
+    telemetry = get_telemetry()
+    if telemetry.enabled and not _metrics_registered:
+        _metrics_registered = True
+        telemetry.add_collector(component_metrics)
+
 class SimpleAgenticOrchestrator:
-    def __init__(self):
+    def __init__(self, router_threshold=None, synthesis_mode=None, concurrent_agents=None, agent_timeouts=None,
+                 semantic_cache=None, user_id=None, history_store=None, agent_pool=None):
         print("🤖 Initializing Agentic AI System...")
-        self.agents = import_agents()
-        self.conversation_history = []
+        agent_pool = agent_pool or get_agent_pool()
+        self.agents = agent_pool.agents
+        self.async_agents = agent_pool.async_agents
+        self.streaming_agents = agent_pool.streaming_agents
+        self.intent_router = IntentRouter(threshold=router_threshold)
+        self.slot_filler = SlotFiller()
+        self.synthesis_mode = synthesis_mode or SYNTHESIS_MODE
+        self.synthesis_latency_avg = SYNTHESIS_ESTIMATE
+        self.synthesis_calls = 0
+        self.concurrent_agents = CONCURRENT_AGENTS if concurrent_agents is None else concurrent_agents
+        self.agent_timeouts = {**AGENT_TIMEOUTS, **(agent_timeouts or {})}
+        self.agent_executor = agent_pool.executor
+        if semantic_cache is None:
+            semantic_cache = agent_pool.semantic_cache or False
+        self.semantic_cache = semantic_cache or None
+        self.last_timings = {}
+        if history_store is None:
+            history_store = self.open_history_store() if PERSIST_HISTORY else False
+        self.history_store = history_store or None
+        self.user_id = None
+        self.conversation_history = ConversationHistory(store=self.history_store)
         self.user_context = {}
-        print(f"✅ Loaded {len(self.agents)} agents successfully")
+        if user_id:
+            self.set_user(user_id)
+        register_component_metrics()
     
-    def analyze_user_intent(self, user_input, has_image=False):
-        """Enhanced intent analysis with better agent classification"""
-        prompt = f"""
-        You are an expert agricultural AI classifier. Analyze this query and classify it precisely:
+    def open_history_store(self):
+        try:
+            return get_history_store()
+        except sqlite3.Error as e:
+            # e.g. a read-only data directory; history then stays in memory
+            print(f"⚠️ Conversation history not persisted: {e}")
+            return False
+    
+    def set_user(self, user_id):
+        """Switch to a user's saved profile and recent turns"""
+        self.user_id = user_id
+        self.conversation_history = ConversationHistory(user_id, self.history_store)
+        self.user_context = {}
+        if self.history_store is not None:
+            try:
+                self.conversation_history.restore()
+                self.user_context = self.history_store.load_profile(user_id)
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not load profile for {user_id}: {e}")
+    
+    def clear_history(self):
+        """Forget this user's turns and profile, in memory and on disk"""
+        if self.history_store is not None:
+            self.history_store.clear(self.conversation_history.user_id)
+        self.conversation_history.clear()
+        self.user_context = {}
+    
+    def analysis_prompt(self, user_input, has_image=False):
+        return f"""
+        You are an expert agricultural AI classifier. Analyze this query, classify it precisely
+        and extract its parameters:
         
         Query: "{user_input}"
         Has Image Attached: {has_image}
@@ -77,146 +325,397 @@ class SimpleAgenticOrchestrator:
         - market_broker: ONLY if asking where to sell, market prices, buyers, selling platforms
         - alert_system: ONLY if asking about disease alerts, area warnings, recent outbreaks
         
-        KEYWORDS TO WATCH:
-        - Disease/Health: "disease", "pest", "sick", "spots", "dying", "problem", "leaf", "analyze image", "check photo"
-        - Crop Selection: "what to grow", "which crop", "suggest crops", "best crops", "planting"
-        - Market: "sell", "buyer", "market", "price", "where to sell"
-        - Alerts: "alert", "warning", "outbreak", "recent disease"
-        
-        Return JSON:
-        {{
-            "intent": "specific intent description",
-            "agents_needed": ["ONLY the most relevant agent(s)"],
-            "primary_task": "disease_detection|crop_selection|market_info|alert_check|general",
-            "parameters": {{
-                "crop": "extracted crop name or null",
-                "location": "extracted location or null", 
-                "soil_type": "extracted soil type or null",
-                "has_image": {has_image}
-            }},
-            "confidence": 0.9,
-            "reasoning": "why you chose these agents"
-        }}
+        PARAMETERS (use null when not mentioned):
+        - crop: crop name
+        - location: city/region
+        - soil_type: soil type
+        - quantity: quantity mentioned, with its unit
+        
+        primary_task is one of: disease_detection, crop_selection, market_info, alert_check, general
         
         BE STRICT: Choose only ONE primary agent unless clearly multiple tasks are requested.
         """
-        
+    
+    def fallback_analysis(self, user_input, error):
+        print(f"Intent analysis error: {error}")
+        count("agribot_fallbacks_total", stage="analysis")
+        # Fallback simple intent detection
+        return {
+            "intent": "general agricultural query",
+            "agents_needed": ["crop_advisor"] if any(word in user_input.lower() for word in ['crop', 'grow', 'plant']) else [],
+            "primary_task": "general",
+            "parameters": validate_parameters({}),
+            "confidence": 0.5
+        }
+    
+    def analyze_request(self, user_input, has_image=False):
+        """Single structured call returning intent, agents and all parameters"""
         try:
-            response = model.generate_content(prompt)
-            # Clean the response text
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3]
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3]
-                
-            return json.loads(response_text)
+            with span("analyze_request"):
+                response = get_model(generation_config=ANALYSIS_CONFIG).generate_content(self.analysis_prompt(user_input, has_image))
+                return validate_analysis(parse_json_response(response.text), has_image)
         except Exception as e:
-            print(f"Intent analysis error: {e}")
-            # Fallback simple intent detection
-            return {
-                "intent": "general agricultural query",
-                "agents_needed": ["crop_advisor"] if any(word in user_input.lower() for word in ['crop', 'grow', 'plant']) else [],
-                "parameters": {"crop": None, "location": None, "soil_type": None, "has_image": False},
-                "confidence": 0.5
-            }
+            return self.fallback_analysis(user_input, e)
     
-    def extract_parameters(self, user_input):
-        """Extract parameters from user input"""
-        prompt = f"""
+    def analyze_user_intent(self, user_input, has_image=False):
+        """Kept for older callers, same as analyze_request"""
+        return self.analyze_request(user_input, has_image)
+    
+    def parameters_prompt(self, user_input):
+        return f"""
         Extract agricultural parameters from: "{user_input}"
         
-        Return JSON:
-        {{
-            "crop": "crop name or null",
-            "location": "city/region or null",
-            "soil_type": "soil type or null", 
-            "quantity": "quantity mentioned or null"
-        }}
+        - crop: crop name or null
+        - location: city/region or null
+        - soil_type: soil type or null
+        - quantity: quantity mentioned, with its unit, or null
         """
-        
+    
+    def extract_parameters(self, user_input):
+        """Extract parameters when the intent is already known locally"""
         try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3]
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3]
-            return json.loads(response_text)
-        except:
-            return {"crop": None, "location": None, "soil_type": None, "quantity": None}
+            with span("extract_parameters"):
+                response = get_model(generation_config=PARAMETERS_CONFIG).generate_content(self.parameters_prompt(user_input))
+                return validate_parameters(parse_json_response(response.text))
+        except Exception as e:
+            print(f"Parameter extraction error: {e}")
+            count("agribot_fallbacks_total", stage="parameters")
+            return validate_parameters({})
+    
+    def prefill_parameters(self, user_input, agents):
+        """Parameters from the query and user context, or None when extraction is still needed"""
+        parameters, carried, complete = self.slot_filler.prefill(user_input, agents, self.user_context)
+        if not complete:
+            return None
+        if carried:
+            print(f"🧩 Carried over from context: {', '.join(carried)}")
+        print("⏭️ Parameter extraction skipped")
+        count("agribot_parameter_extractions_total", source="context")
+        return parameters
+    
+    def fill_parameters(self, user_input, parameters):
+        """Fill gaps in extracted parameters from the query and the user context"""
+        count("agribot_parameter_extractions_total", source="model")
+        parameters, carried = self.slot_filler.merge(user_input, parameters, self.user_context)
+        if carried:
+            print(f"🧩 Carried over from context: {', '.join(carried)}")
+        return parameters
+    
+    def agent_arguments(self, agent_name, parameters):
+        """Positional arguments for an agent, with defaults for missing parameters"""
+        if agent_name == 'crop_advisor':
+            soil = parameters.get('soil_type') or 'mixed'
+            location = parameters.get('location') or 'India'
+            return (soil, location)
+            
+        elif agent_name == 'market_broker':
+            crop = parameters.get('crop') or 'wheat'
+            location = parameters.get('location') or 'India'
+            quantity = parameters.get('quantity')
+            return (crop, location, quantity)
+            
+        elif agent_name == 'alert_system':
+            crop = parameters.get('crop') or 'wheat'
+            location = parameters.get('location') or 'India'
+            return (crop, location)
+        
+        elif agent_name == 'disease_detector':
+            return (parameters.get('image_file'),)
+        
+        return None
+    
+    def has_uploaded_image(self, parameters):
+        """The disease detector needs an uploaded file, not just a path or nothing"""
+        return hasattr(parameters.get('image_file'), 'getvalue')
+    
+    def format_agent_result(self, agent_name, result):
+        if agent_name == 'crop_advisor':
+            advice, weather = result
+            return f"{advice}\n\n🌤️ Weather used: {weather}"
+        return result
     
     def call_agent(self, agent_name, parameters):
         """Call specific agent with parameters"""
         if agent_name not in self.agents:
             return f"Agent {agent_name} not available"
         
+        if agent_name == 'disease_detector' and not self.has_uploaded_image(parameters):
+            return "Disease detection requires image upload. Please use the web interface."
+        
         try:
-            if agent_name == 'crop_advisor':
-                soil = parameters.get('soil_type') or 'mixed'
-                location = parameters.get('location') or 'India'
-                return self.agents[agent_name](soil, location)
-                
-            elif agent_name == 'market_broker':
-                crop = parameters.get('crop') or 'wheat'
-                location = parameters.get('location') or 'India'
-                quantity = parameters.get('quantity')
-                return self.agents[agent_name](crop, location, quantity)
-                
-            elif agent_name == 'disease_detector':
-                # For now, return placeholder - implement image handling separately
-                return "Disease detection requires image upload. Please use the web interface."
-                
-            elif agent_name == 'alert_system':
-                crop = parameters.get('crop') or 'wheat'
-                location = parameters.get('location') or 'India'
-                return self.agents[agent_name](crop, location)
-                
+            result = self.agents[agent_name](*self.agent_arguments(agent_name, parameters))
+            return self.format_agent_result(agent_name, result)
         except Exception as e:
+            count("agribot_agent_errors_total", agent=agent_name)
             return f"Error calling {agent_name}: {str(e)}"
     
-    def synthesize_response(self, user_input, agent_results, intent):
-        """Create comprehensive response from agent outputs"""
-        prompt = f"""
+    async def acall_agent(self, agent_name, parameters):
+        """Async version of call_agent, sync-only agents run in a worker thread"""
+        if agent_name not in self.async_agents:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.agent_executor, self.call_agent, agent_name, parameters)
+        
+        if agent_name == 'disease_detector' and not self.has_uploaded_image(parameters):
+            return "Disease detection requires image upload. Please use the web interface."
+        
+        try:
+            result = await self.async_agents[agent_name](*self.agent_arguments(agent_name, parameters))
+            return self.format_agent_result(agent_name, result)
+        except Exception as e:
+            count("agribot_agent_errors_total", agent=agent_name)
+            return f"Error calling {agent_name}: {str(e)}"
+    
+    def stream_agent(self, agent_name, parameters):
+        """Chunks of one agent's answer; agents without a streaming variant yield it whole"""
+        if agent_name not in self.streaming_agents:
+            yield self.call_agent(agent_name, parameters)
+            return
+        
+        started = False
+        try:
+            chunks = self.streaming_agents[agent_name](*self.agent_arguments(agent_name, parameters))
+            if agent_name == 'crop_advisor':
+                chunks, weather = chunks
+            for chunk in chunks:
+                started = True
+                yield chunk
+            if agent_name == 'crop_advisor':
+                yield f"\n\n🌤️ Weather used: {weather}"
+        except Exception as e:
+            count("agribot_agent_errors_total", agent=agent_name)
+            yield ("\n\n" if started else "") + f"Error calling {agent_name}: {str(e)}"
+    
+    def run_agents(self, agent_names, parameters, timings):
+        """Call the agents, in parallel when enabled; returns (results, timed_out)"""
+        agent_names = [agent for agent in agent_names if agent in self.agents]
+        agent_results = {}
+        timed_out = []
+        
+        def timed_call(agent_name):
+            agent_start = time.perf_counter()
+            with span("agent", agent=agent_name):
+                result = self.call_agent(agent_name, parameters)
+            timings[f"agent.{agent_name}"] = round(time.perf_counter() - agent_start, 4)
+            return result
+        
+        if not self.concurrent_agents:
+            for agent_name in agent_names:
+                print(f"🤖 Calling {agent_name}...")
+                agent_results[agent_name] = timed_call(agent_name)
+            return agent_results, timed_out
+        
+        start = time.perf_counter()
+        futures = {}
+        for agent_name in agent_names:
+            print(f"🤖 Calling {agent_name}...")
+            # A copied context keeps the agent's span under this request's trace
+            futures[agent_name] = self.agent_executor.submit(contextvars.copy_context().run, timed_call, agent_name)
+        
+        # Each agent has its own deadline measured from the common start, so the
+        # whole fan-out takes about as long as the slowest agent that made it
+        for agent_name in sorted(futures, key=lambda name: self.agent_timeouts.get(name, 30)):
+            remaining = start + self.agent_timeouts.get(agent_name, 30) - time.perf_counter()
+            try:
+                agent_results[agent_name] = futures[agent_name].result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                # Queued calls are cancelled, a running thread finishes in the background
+                # and its result is discarded
+                futures[agent_name].cancel()
+                timed_out.append(agent_name)
+                count("agribot_agent_timeouts_total", agent=agent_name)
+                print(f"⏳ {agent_name} timed out")
+        
+        return agent_results, timed_out
+    
+    async def arun_agents(self, agent_names, parameters, timings):
+        """Async version of run_agents, the agents always run concurrently"""
+        agent_names = [agent for agent in agent_names if agent in self.agents]
+        
+        async def timed_call(agent_name):
+            print(f"🤖 Calling {agent_name}...")
+            agent_start = time.perf_counter()
+            # wait_for cancels the agent coroutine when its deadline passes
+            with span("agent", agent=agent_name):
+                result = await asyncio.wait_for(self.acall_agent(agent_name, parameters),
+                                                timeout=self.agent_timeouts.get(agent_name, 30))
+            timings[f"agent.{agent_name}"] = round(time.perf_counter() - agent_start, 4)
+            return result
+        
+        outcomes = await asyncio.gather(*(timed_call(agent) for agent in agent_names), return_exceptions=True)
+        agent_results = {}
+        timed_out = []
+        for agent_name, outcome in zip(agent_names, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                timed_out.append(agent_name)
+                count("agribot_agent_timeouts_total", agent=agent_name)
+                print(f"⏳ {agent_name} timed out")
+            elif isinstance(outcome, Exception):
+                agent_results[agent_name] = f"Error calling {agent_name}: {str(outcome)}"
+            else:
+                agent_results[agent_name] = outcome
+        return agent_results, timed_out
+    
+    def synthesis_prompt(self, user_input, agent_results, intent, timed_out=()):
+        return f"""
         User asked: "{user_input}"
         Intent: {intent}
         
         Agent Results:
         {json.dumps(agent_results, indent=2)}
         
+        Agents that did not answer in time: {', '.join(timed_out) or 'none'}
+        
         Create a helpful, comprehensive response that:
         1. Directly answers the user's question
-        2. Integrates all agent outputs naturally
+        2. Integrates all agent outputs naturally, and briefly says which parts are still pending
         3. Uses friendly, professional tone
         4. Provides actionable advice
         5. Includes both English and Hindi where appropriate
         
         Make it conversational and helpful.
         """
-        
+    
+    def fallback_synthesis(self, agent_results, timed_out=()):
+        result_text = ""
+        for agent, result in agent_results.items():
+            result_text += f"\n**{agent.replace('_', ' ').title()}:**\n{result}\n"
+        for agent in timed_out:
+            result_text += f"\n**{agent.replace('_', ' ').title()}:**\n{TIMEOUT_NOTE}\n"
+        return f"Here's what I found for your query:\n{result_text}"
+    
+    def synthesize_response(self, user_input, agent_results, intent, timed_out=()):
+        """Create comprehensive response from agent outputs"""
         try:
-            response = model.generate_content(prompt)
+            response = get_model().generate_content(self.synthesis_prompt(user_input, agent_results, intent, timed_out))
             return response.text.strip()
         except Exception as e:
-            # Fallback response
-            result_text = ""
-            for agent, result in agent_results.items():
-                result_text += f"\n**{agent.replace('_', ' ').title()}:**\n{result}\n"
-            return f"Here's what I found for your query:\n{result_text}"
+            count("agribot_fallbacks_total", stage="synthesis")
+            return self.fallback_synthesis(agent_results, timed_out)
     
-    def process_request(self, user_input, image_file=None):
-        """Enhanced processing method with better agent routing"""
-        print(f"\n🧠 Processing: {user_input}")
-        has_image = image_file is not None
+    def stream_synthesis(self, user_input, agent_results, intent, timed_out=()):
+        """Streaming version of synthesize_response"""
+        started = False
+        try:
+            response = get_model().generate_content(self.synthesis_prompt(user_input, agent_results, intent, timed_out),
+                                                    stream=True)
+            for text in stream_text(response):
+                # Leading whitespace only, matching the strip() of the whole answer
+                text = text if started else text.lstrip()
+                if text:
+                    started = True
+                    yield text
+        except Exception as e:
+            count("agribot_fallbacks_total", stage="synthesis")
+            # The agents' own answers are still worth showing after a half-finished synthesis
+            yield ("\n\n" if started else "") + self.fallback_synthesis(agent_results, timed_out)
+    
+    async def asynthesize_response(self, user_input, agent_results, intent, timed_out=()):
+        """Async version of synthesize_response"""
+        try:
+            response = await get_model().generate_content_async(self.synthesis_prompt(user_input, agent_results, intent, timed_out))
+            return response.text.strip()
+        except Exception as e:
+            count("agribot_fallbacks_total", stage="synthesis")
+            return self.fallback_synthesis(agent_results, timed_out)
+    
+    def merge_results(self, agent_results, timed_out=()):
+        """Template merge of several finished agent answers, no model call"""
+        sections = [f"### {AGENT_TITLES.get(agent, agent)}\n{result}" for agent, result in agent_results.items()]
+        sections += [f"### {AGENT_TITLES.get(agent, agent)}\n{TIMEOUT_NOTE}" for agent in timed_out]
+        return "\n\n---\n\n".join(sections)
+    
+    def results_conflict(self, agent_results):
+        """An active disease alert next to advice to grow or sell needs reconciling"""
+        alert = agent_results.get('alert_system')
+        if not alert or len(agent_results) < 2:
+            return False
+        if alert.startswith(ALERT_CLEAR_PREFIX):
+            return False
+        return 'crop_advisor' in agent_results or 'market_broker' in agent_results
+    
+    def choose_synthesis_policy(self, agent_results, timed_out=()):
+        """Returns (policy, answered) where policy is passthrough, template or llm"""
+        answered = {agent: result for agent, result in agent_results.items()
+                    if isinstance(result, str) and not result.startswith(AGENT_ERROR_PREFIXES)}
         
-        # Step 1: Enhanced intent analysis
-        intent_analysis = self.analyze_user_intent(user_input, has_image)
+        if not answered and timed_out:
+            return 'template', answered
+        if self.synthesis_mode == 'llm' or self.results_conflict(answered) or not answered:
+            return 'llm', answered
+        if len(answered) == 1 and not timed_out:
+            return 'passthrough', answered
+        return 'template', answered
+    
+    def record_synthesis(self, policy, start, timings):
+        """Store synthesis timing and, when the LLM was skipped, the estimated saving"""
+        elapsed = time.perf_counter() - start
+        if policy == 'llm':
+            # Running average of real synthesis calls, starting from SYNTHESIS_ESTIMATE
+            if not self.synthesis_calls:
+                self.synthesis_latency_avg = elapsed
+            else:
+                self.synthesis_latency_avg = 0.8 * self.synthesis_latency_avg + 0.2 * elapsed
+            self.synthesis_calls += 1
+        timings['synthesis_policy'] = policy
+        timings['synthesis'] = round(elapsed, 4)
+        count("agribot_synthesis_total", policy=policy)
+        observe("agribot_synthesis_seconds", elapsed, policy=policy)
+        if policy != 'llm':
+            timings['synthesis_saved_est'] = round(self.synthesis_latency_avg, 4)
+    
+    def compose_response(self, user_input, agent_results, intent, timings, timed_out=()):
+        """Apply the synthesis policy and record how long it took (or saved)"""
+        policy, answered = self.choose_synthesis_policy(agent_results, timed_out)
+        start = time.perf_counter()
+        with span("synthesis", policy=policy):
+            if policy == 'llm':
+                final_response = self.synthesize_response(user_input, agent_results, intent, timed_out)
+            elif policy == 'passthrough':
+                final_response = next(iter(answered.values()))
+            else:
+                final_response = self.merge_results(answered, timed_out)
+        self.record_synthesis(policy, start, timings)
+        return final_response
+    
+    def compose_response_stream(self, user_input, agent_results, intent, timings, timed_out=()):
+        """Streaming version of compose_response, only the llm policy yields more than one chunk"""
+        policy, answered = self.choose_synthesis_policy(agent_results, timed_out)
+        start = time.perf_counter()
+        if policy == 'llm':
+            yield from self.stream_synthesis(user_input, agent_results, intent, timed_out)
+        elif policy == 'passthrough':
+            yield next(iter(answered.values()))
+        else:
+            yield self.merge_results(answered, timed_out)
+        self.record_synthesis(policy, start, timings)
+    
+    async def acompose_response(self, user_input, agent_results, intent, timings, timed_out=()):
+        """Async version of compose_response"""
+        policy, answered = self.choose_synthesis_policy(agent_results, timed_out)
+        start = time.perf_counter()
+        with span("synthesis", policy=policy):
+            if policy == 'llm':
+                final_response = await self.asynthesize_response(user_input, agent_results, intent, timed_out)
+            elif policy == 'passthrough':
+                final_response = next(iter(answered.values()))
+            else:
+                final_response = self.merge_results(answered, timed_out)
+        self.record_synthesis(policy, start, timings)
+        return final_response
+    
+    def plan_agents(self, user_input, image_file, intent_analysis, timings, request_start):
+        """Turn the analysis into request parameters and a validated agent list"""
+        has_image = image_file is not None
+        parameters = dict(intent_analysis['parameters'])
+        if has_image:
+            parameters['image_file'] = image_file
+        timings['analysis'] = round(time.perf_counter() - request_start, 4)
         print(f"📋 Intent: {intent_analysis['intent']}")
         print(f"🎯 Primary Task: {intent_analysis.get('primary_task', 'general')}")
         print(f"🤖 Agents needed: {intent_analysis['agents_needed']}")
         print(f"💭 Reasoning: {intent_analysis.get('reasoning', 'N/A')}")
         
-        # Step 2: Validate agent selection based on task type
+        # Validate agent selection based on task type
         validated_agents = self.validate_agent_selection(
             intent_analysis['agents_needed'], 
             intent_analysis.get('primary_task'),
@@ -227,34 +726,65 @@ class SimpleAgenticOrchestrator:
         if validated_agents != intent_analysis['agents_needed']:
             print(f"🔄 Corrected agents: {validated_agents}")
         
-        # Step 3: Extract parameters
-        parameters = self.extract_parameters(user_input)
-        if has_image:
-            parameters['image_file'] = image_file
         print(f"🔧 Parameters: {parameters}")
-        
-        # Step 4: Call agents with enhanced logic
-        agent_results = {}
         for agent_name in validated_agents:
-            if agent_name in self.agents:
-                print(f"🤖 Calling {agent_name}...")
-                result = self.call_agent(agent_name, parameters)
-                agent_results[agent_name] = result
-            else:
+            if agent_name not in self.agents:
                 print(f"⚠️ Agent {agent_name} not available")
+        return parameters, validated_agents
+    
+    def lookup_semantic_cache(self, user_input, intent_analysis, parameters, agents, has_image, timings):
+        """Returns (cached response or None, query vector, scope)"""
+        if self.semantic_cache is None or has_image:
+            return None, None, None
         
-        # Step 5: Synthesize response
-        if agent_results:
-            final_response = self.synthesize_response(
-                user_input, 
-                agent_results, 
-                intent_analysis['intent']
-            )
-        else:
-            final_response = self.generate_fallback_response(user_input, intent_analysis)
+        scope = cache_scope(intent_analysis.get('primary_task'), parameters, agents)
+        if not self.semantic_cache.caches(scope):
+            return None, None, None
+        
+        start = time.perf_counter()
+        try:
+            with span("semantic_cache"):
+                response, similarity, vector = self.semantic_cache.lookup(user_input, scope)
+        except Exception as e:
+            # Missing transformers/torch or model download failure
+            print(f"⚠️ Semantic cache disabled: {e}")
+            self.semantic_cache = None
+            return None, None, None
+        
+        timings['semantic_cache'] = round(time.perf_counter() - start, 4)
+        timings['semantic_cache_hit'] = response is not None
+        count("agribot_semantic_cache_total", result="hit" if response is not None else "miss")
+        if response is not None:
+            print(f"♻️ Semantic cache hit (similarity {similarity:.2f})")
+        return response, vector, scope
+    
+    def store_semantic_cache(self, user_input, scope, vector, agent_results, timed_out, final_response):
+        """Keep complete, error-free answers for later paraphrases"""
+        if self.semantic_cache is None or scope is None or timed_out or not agent_results:
+            return
+        for result in agent_results.values():
+            if not isinstance(result, str) or result.startswith(AGENT_ERROR_PREFIXES):
+                return
+        self.semantic_cache.store(user_input, scope, final_response, vector)
+    
+    def finish_request(self, user_input, has_image, intent_analysis, parameters, validated_agents,
+                       timed_out, final_response, timings, request_start):
+        """Record timings, context and history for a finished request"""
+        timings['total'] = round(time.perf_counter() - request_start, 4)
+        self.last_timings = timings
+        primary_task = intent_analysis.get('primary_task') or 'general'
+        count("agribot_requests_total", primary_task=primary_task)
+        observe("agribot_request_seconds", timings['total'], primary_task=primary_task)
+        if 'ttft' in timings:
+            observe("agribot_request_first_chunk_seconds", timings['ttft'], primary_task=primary_task)
+        print(f"⏱️ Timings: {timings}")
         
-        # Step 6: Update context
         self.update_context(parameters, intent_analysis)
+        if self.user_id and self.history_store is not None:
+            try:
+                self.history_store.save_profile(self.user_id, self.user_context)
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not save profile: {e}")
         
         # Save to history
         self.conversation_history.append({
@@ -263,50 +793,242 @@ class SimpleAgenticOrchestrator:
             "intent": intent_analysis['intent'],
             "primary_task": intent_analysis.get('primary_task'),
             "agents_called": validated_agents,
+            "agents_timed_out": timed_out,
             "response": final_response,
-            "had_image": has_image
+            "had_image": has_image,
+            "timings": timings
         })
         
         return final_response
     
-    def validate_agent_selection(self, suggested_agents, primary_task, has_image, user_input):
-        """Validate and correct agent selection based on rules"""
+    def route_request(self, user_input, has_image=False):
+        """Intent and parameters for a request.
         
-        # Define strict keywords for each agent
-        disease_keywords = ['disease', 'pest', 'sick', 'dying', 'spots', 'leaf', 'problem', 'analyze', 'check', 'diagnose', 'health']
-        crop_keywords = ['grow', 'plant', 'suggest crops', 'which crop', 'best crop', 'suitable crop', 'recommend']
-        market_keywords = ['sell', 'buyer', 'market', 'price', 'selling', 'purchase', 'buy']
-        alert_keywords = ['alert', 'warning', 'outbreak', 'recent', 'area', 'nearby']
+        Unsure queries get intent and parameters together, routed ones only parameters.
+        """
+        intent_analysis = self.intent_router.route(user_input, has_image)
+        if intent_analysis is None:
+            count("agribot_routes_total", route="llm")
+            intent_analysis = self.analyze_request(user_input, has_image)
+            intent_analysis['parameters'] = self.fill_parameters(user_input, intent_analysis['parameters'])
+            return intent_analysis
+        count("agribot_routes_total", route="local")
+        parameters = self.prefill_parameters(user_input, intent_analysis['agents_needed'])
+        if parameters is None:
+            parameters = self.fill_parameters(user_input, self.extract_parameters(user_input))
+        intent_analysis['parameters'] = parameters
+        return intent_analysis
+    
+    def process_request(self, user_input, image_file=None):
+        """Enhanced processing method with better agent routing"""
+        has_image = image_file is not None
+        with span("request", has_image=has_image):
+            print(f"\n🧠 Processing: {user_input}")
+            timings = {}
+            request_start = time.perf_counter()
+            
+            # Step 1: Local keyword routing, one structured model call either way
+            intent_analysis = self.route_request(user_input, has_image)
+            
+            # Step 2: Validate agent selection based on task type
+            parameters, validated_agents = self.plan_agents(user_input, image_file, intent_analysis, timings, request_start)
+            
+            # Step 3: Answer paraphrases of earlier questions from the semantic cache
+            cached_response, vector, scope = self.lookup_semantic_cache(user_input, intent_analysis, parameters, validated_agents, has_image, timings)
+            if cached_response is not None:
+                return self.finish_request(user_input, has_image, intent_analysis, parameters, validated_agents,
+                                           [], cached_response, timings, request_start)
+            
+            # Step 4: Call agents, concurrently with per-agent timeouts
+            agent_start = time.perf_counter()
+            agent_results, timed_out = self.run_agents(validated_agents, parameters, timings)
+            timings['agents'] = round(time.perf_counter() - agent_start, 4)
+            
+            # Step 5: Synthesize response
+            if agent_results or timed_out:
+                final_response = self.compose_response(
+                    user_input, 
+                    agent_results, 
+                    intent_analysis['intent'],
+                    timings,
+                    timed_out
+                )
+            else:
+                final_response = self.generate_fallback_response(user_input, intent_analysis)
+            self.store_semantic_cache(user_input, scope, vector, agent_results, timed_out, final_response)
+            
+            # Step 6: Update context and history
+            return self.finish_request(user_input, has_image, intent_analysis, parameters, validated_agents,
+                                       timed_out, final_response, timings, request_start)
+    
+    def process_request_stream(self, user_input, image_file=None):
+        """Streaming version of process_request, yields the answer in chunks as it is generated.
         
-        user_lower = user_input.lower()
+        A single agent with a streaming variant is passed straight through, otherwise
+        the agents run as usual and the synthesis is streamed. timings['ttft'] is the
+        time to the first chunk, timings['total'] to the last one; the time the reader
+        spends between chunks counts in neither total nor the request span.
+        """
+        has_image = image_file is not None
+        timings = {}
+        # The request span lives in a context of its own and is only current while a
+        # chunk is produced, so it never leaks into the reader's code between chunks
+        context = contextvars.copy_context()
+        request_span = span("request", has_image=has_image, stream=True)
+        context.run(request_span.__enter__)
+        request_start = time.perf_counter()
+        chunks = self.stream_request(user_input, image_file, timings)
+        parts = []
+        reading = 0.0
+        error = (None, None, None)
+        try:
+            while True:
+                try:
+                    chunk = context.run(next, chunks)
+                except StopIteration as done:
+                    finished = done.value
+                    break
+                if not parts:
+                    timings['ttft'] = round(time.perf_counter() - request_start, 4)
+                    print(f"⚡ First chunk after {timings['ttft']}s")
+                parts.append(chunk)
+                handed_over = time.perf_counter()
+                yield chunk
+                reading += time.perf_counter() - handed_over
+            
+            context.run(self.finish_request, user_input, has_image, *finished, timings, request_start + reading)
+        except BaseException:
+            error = sys.exc_info()
+            raise
+        finally:
+            # A reader that stops early leaves the agents' spans to be closed here, in the span's context
+            context.run(chunks.close)
+            request_span.exclude(reading)
+            context.run(request_span.__exit__, *error)
+    
+    def stream_request(self, user_input, image_file, timings):
+        """Chunks of the answer for process_request_stream.
         
-        # Force disease detector if image is present or disease keywords found
-        if has_image or any(keyword in user_lower for keyword in disease_keywords):
-            return ['disease_detector']
+        Returns (intent_analysis, parameters, validated_agents, timed_out, final_response)
+        for finish_request once the last chunk is out.
+        """
+        has_image = image_file is not None
+        print(f"\n🧠 Processing (streaming): {user_input}")
+        request_start = time.perf_counter()
+        
+        intent_analysis = self.route_request(user_input, has_image)
+        parameters, validated_agents = self.plan_agents(user_input, image_file, intent_analysis, timings, request_start)
         
-        # Force crop advisor only for crop selection queries
-        elif any(keyword in user_lower for keyword in crop_keywords) and 'soil' in user_lower:
-            return ['crop_advisor']
+        cached_response, vector, scope = self.lookup_semantic_cache(user_input, intent_analysis, parameters, validated_agents, has_image, timings)
+        agent_results = {}
+        timed_out = []
         
-        # Force market broker for selling queries
-        elif any(keyword in user_lower for keyword in market_keywords):
-            return ['market_broker']
+        def answer_chunks():
+            if cached_response is not None:
+                yield cached_response
+                return
         
-        # Force alert system for alert queries
-        elif any(keyword in user_lower for keyword in alert_keywords):
-            return ['alert_system']
+            agent_start = time.perf_counter()
+            available = [agent for agent in validated_agents if agent in self.agents]
+            if len(available) == 1 and available[0] in self.streaming_agents and self.synthesis_mode != 'llm':
+                # One agent answering alone would be passed through anyway, so pass its chunks through
+                agent_name = available[0]
+                print(f"🤖 Streaming {agent_name}...")
+                parts = []
+                for chunk in self.stream_agent(agent_name, parameters):
+                    parts.append(chunk)
+                    yield chunk
+                agent_results[agent_name] = "".join(parts)
+                timings[f"agent.{agent_name}"] = timings['agents'] = round(time.perf_counter() - agent_start, 4)
+                self.record_synthesis('passthrough', time.perf_counter(), timings)
+                return
         
-        # If no clear match, return suggested agents but limit to 1
-        elif suggested_agents:
-            return [suggested_agents[0]]  # Take only the first suggestion
+            results, late = self.run_agents(validated_agents, parameters, timings)
+            agent_results.update(results)
+            timed_out.extend(late)
+            timings['agents'] = round(time.perf_counter() - agent_start, 4)
+            if agent_results or timed_out:
+                yield from self.compose_response_stream(user_input, agent_results, intent_analysis['intent'],
+                                                        timings, timed_out)
+            else:
+                yield self.generate_fallback_response(user_input, intent_analysis)
         
-        else:
-            # Default fallback based on common patterns
-            if 'what' in user_lower and ('crop' in user_lower or 'grow' in user_lower):
-                return ['crop_advisor']
+        parts = []
+        for chunk in answer_chunks():
+            parts.append(chunk)
+            yield chunk
+        
+        final_response = "".join(parts)
+        if cached_response is None:
+            self.store_semantic_cache(user_input, scope, vector, agent_results, timed_out, final_response)
+        return intent_analysis, parameters, validated_agents, timed_out, final_response
+    
+    async def aprocess_request(self, user_input, image_file=None):
+        """Async version of process_request, for serving many requests on one event loop"""
+        has_image = image_file is not None
+        with span("request", has_image=has_image):
+            print(f"\n🧠 Processing: {user_input}")
+            timings = {}
+            request_start = time.perf_counter()
+            
+            # Same routing as process_request; its model call blocks, so it runs on a
+            # worker thread, in this request's context so its spans nest under the request
+            loop = asyncio.get_running_loop()
+            intent_analysis = await loop.run_in_executor(
+                self.agent_executor, contextvars.copy_context().run, self.route_request, user_input, has_image
+            )
+            parameters, validated_agents = self.plan_agents(user_input, image_file, intent_analysis, timings, request_start)
+            
+            # Embedding is CPU work, keep it off the event loop
+            cached_response, vector, scope = await loop.run_in_executor(
+                self.agent_executor, self.lookup_semantic_cache, user_input, intent_analysis, parameters, validated_agents, has_image, timings
+            )
+            if cached_response is not None:
+                return self.finish_request(user_input, has_image, intent_analysis, parameters, validated_agents,
+                                           [], cached_response, timings, request_start)
+            
+            agent_start = time.perf_counter()
+            agent_results, timed_out = await self.arun_agents(validated_agents, parameters, timings)
+            timings['agents'] = round(time.perf_counter() - agent_start, 4)
+            
+            if agent_results or timed_out:
+                final_response = await self.acompose_response(
+                    user_input, 
+                    agent_results, 
+                    intent_analysis['intent'],
+                    timings,
+                    timed_out
+                )
             else:
-                return ['crop_advisor']  # Safe default
+                final_response = self.generate_fallback_response(user_input, intent_analysis)
+            self.store_semantic_cache(user_input, scope, vector, agent_results, timed_out, final_response)
+            
+            return self.finish_request(user_input, has_image, intent_analysis, parameters, validated_agents,
+                                       timed_out, final_response, timings, request_start)
     
+    def validate_agent_selection(self, suggested_agents, primary_task, has_image, user_input):
+        """Validate and correct agent selection based on rules"""
+        # Images always go to the disease detector
+        if has_image:
+            return ['disease_detector']
+
+        # Keep every agent we know about, in a stable order; run_agents calls them concurrently
+        known_agents = [agent for agent in AGENT_PRIORITY if agent in suggested_agents]
+        if known_agents:
+            return known_agents
+
+        # Nothing usable from the classifier, take the router's best guess
+        _, _, best = self.intent_router.score(user_input)
+        return [best or 'crop_advisor']  # Safe default
+
+    def routing_stats(self):
+        """Local-hit vs LLM-fallback counters of the intent router and parameter extractions skipped"""
+        stats = dict(self.intent_router.stats)
+        stats['local_hit_ratio'] = round(self.intent_router.hit_ratio(), 3)
+        stats.update(self.slot_filler.stats)
+        stats['extraction_skip_ratio'] = round(self.slot_filler.skip_ratio(), 3)
+        return stats
+
     def update_context(self, parameters, intent_analysis):
         """Update user context intelligently"""
         if parameters.get('location'):
@@ -367,6 +1089,8 @@ def main():
             user_input = input("\n👨‍🌾 You: ").strip()
             
             if user_input.lower() in ['exit', 'quit', 'bye']:
+                print(f"📈 Routing stats: {orchestrator.routing_stats()}")
+                print(f"📦 Cache stats: {cache_stats()}")
                 print("👋 Happy farming!")
                 break
             
@@ -0,0 +1,157 @@
+# semantic_cache.py - Paraphrase-tolerant cache of final orchestrator answers
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from Agents.response_cache import AGENT_CACHE_TTLS, normalize_crop, normalize_location, normalize_text
+from intent_router import PRIMARY_TASKS
+
+EMBEDDING_MODEL = os.getenv("AGRIBOT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SIMILARITY_THRESHOLD = float(os.getenv("AGRIBOT_SEMANTIC_THRESHOLD", "0.88"))
+
+# Seconds an answer stays valid per primary task. Prices must not outlive the
+# market agent's own cache, and alerts are never answered from an old reply.
+DEFAULT_TTL = 6 * 60 * 60
+TASK_TTLS = {
+    'market_info': AGENT_CACHE_TTLS['market_broker'],
+    'alert_check': 0,
+}
+
+
+class LocalEmbedder:
+    """Mean-pooled sentence embeddings from a small transformers model on CPU"""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from transformers import AutoModel, AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModel.from_pretrained(self.model_name).eval()
+
+    def embed(self, texts):
+        """Unit-length vectors, one row per text"""
+        import torch
+
+        if self._model is None:
+            self._load()
+        batch = self._tokenizer(texts, padding=True, truncation=True, max_length=128, return_tensors="pt")
+        with torch.inference_mode():
+            hidden = self._model(**batch).last_hidden_state
+        mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        vectors = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        return torch.nn.functional.normalize(vectors, dim=1)
+
+
+def cache_scope(primary_task, parameters, agents=()):
+    """Answers are only reused inside the same task, crop, location, soil, quantity and agents"""
+    return (
+        primary_task or 'general',
+        normalize_crop(parameters.get('crop')),
+        normalize_location(parameters.get('location')),
+        normalize_text(parameters.get('soil_type')),
+        normalize_text(parameters.get('quantity')),
+        tuple(sorted(agents)),
+    )
+
+
+class SemanticCache:
+    """Vector index of answered queries, looked up by cosine similarity per scope"""
+
+    def __init__(self, embedder=None, threshold=SIMILARITY_THRESHOLD, max_entries=2048, ttl=DEFAULT_TTL, task_ttls=None):
+        self.embedder = embedder or LocalEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.task_ttls = TASK_TTLS if task_ttls is None else task_ttls
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        # entry id -> (scope, query, vector, response, created_at), oldest first
+        self._entries = OrderedDict()
+        # scope -> (entry ids, stacked vectors), rebuilt when the scope changes
+        self._index = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def ttl_for(self, scope):
+        """Shortest TTL of the primary task and of every agent's task in the answer"""
+        tasks = {scope[0]} | {PRIMARY_TASKS.get(agent) for agent in scope[5]}
+        return min(self.task_ttls.get(task, self.ttl) for task in tasks)
+
+    def caches(self, scope):
+        """False for tasks whose answers must always be generated fresh"""
+        return self.ttl_for(scope) > 0
+
+    def embed(self, query):
+        return self.embedder.embed([query])[0]
+
+    def _expire(self, scope):
+        """Drop the scope's entries older than its TTL, so an expired best match cannot hide a fresh one"""
+        ids, _ = self._index.get(scope) or (None, None)
+        if ids is None:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry[0] == scope]
+        oldest = time.time() - self.ttl_for(scope)
+        expired = [entry_id for entry_id in ids if self._entries[entry_id][4] < oldest]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._index.pop(scope, None)
+
+    def _scope_index(self, scope):
+        index = self._index.get(scope)
+        if index is None:
+            import torch
+
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry[0] == scope]
+            vectors = torch.stack([self._entries[entry_id][2] for entry_id in ids]) if ids else None
+            index = self._index[scope] = (ids, vectors)
+        return index
+
+    def lookup(self, query, scope, vector=None):
+        """Returns (response or None, similarity, query vector)"""
+        if vector is None:
+            vector = self.embed(query)
+        with self._lock:
+            self._expire(scope)
+            ids, vectors = self._scope_index(scope)
+            if vectors is None:
+                self.stats['misses'] += 1
+                return None, 0.0, vector
+            similarities = vectors @ vector
+            best = int(similarities.argmax())
+            similarity = float(similarities[best])
+            entry_id = ids[best]
+            response = self._entries[entry_id][3]
+            if similarity < self.threshold:
+                self.stats['misses'] += 1
+                return None, similarity, vector
+            self._entries.move_to_end(entry_id)
+            self.stats['hits'] += 1
+            return response, similarity, vector
+
+    def store(self, query, scope, response, vector=None):
+        if not self.caches(scope):
+            return
+        if vector is None:
+            vector = self.embed(query)
+        with self._lock:
+            self._entries[self._next_id] = (scope, query, vector, response, time.time())
+            self._next_id += 1
+            self._index.pop(scope, None)
+            while len(self._entries) > self.max_entries:
+                _, (old_scope, _, _, _, _) = self._entries.popitem(last=False)
+                self._index.pop(old_scope, None)
+                self.stats['evictions'] += 1
+
+    def hit_ratio(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / total if total else 0.0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,460 @@
+# service.py - HTTP/JSON API for the orchestrator and the individual agents
+#
+#   python service.py [--port 8080] [--workers 8] [--queue 32]
+#
+#   POST   /chat              {"message": ..., "session_id": optional, "image": optional base64 photo}
+#   POST   /agents/<name>     {"crop": ..., "location": ..., "soil_type": ..., "quantity": ..., "image": ...}
+#   DELETE /sessions/<id>     forget a session's history and profile
+#   GET    /agents, /healthz, /readyz, /metrics
+#
+# Every session gets its own orchestrator (history and context) on top of one
+# shared agent pool. Session IDs are opaque tokens issued by the server with the
+# first answer; unknown or expired IDs get 404, and a session answers one
+# request at a time (409 while it is busy). Requests run on a bounded worker
+# pool; once its workers and queue are full, new requests get 503 with
+# Retry-After instead of piling up behind the Gemini quota.
+import os
+import json
+import time
+import base64
+import secrets
+import argparse
+import binascii
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from orchestrator import SimpleAgenticOrchestrator, get_agent_pool, AGENT_ERROR_PREFIXES, PARAMETER_KEYS
+from Agents.telemetry import get_telemetry, count, observe, stats_metrics
+
+SERVICE_PORT = int(os.getenv("AGRIBOT_SERVICE_PORT", "8080"))
+# Requests processed at once, and how many more may wait for a worker
+SERVICE_WORKERS = int(os.getenv("AGRIBOT_SERVICE_WORKERS", "8"))
+SERVICE_QUEUE = int(os.getenv("AGRIBOT_SERVICE_QUEUE", "32"))
+# Seconds a request may wait and run before the client gets a 504
+REQUEST_TIMEOUT = float(os.getenv("AGRIBOT_SERVICE_TIMEOUT", "120"))
+# Sessions kept in memory; idle or least recent ones are dropped and their IDs stop working
+MAX_SESSIONS = int(os.getenv("AGRIBOT_MAX_SESSIONS", "1000"))
+SESSION_IDLE = int(os.getenv("AGRIBOT_SESSION_IDLE", str(30 * 60)))
+MAX_BODY = 10 * 1024 * 1024
+MAX_MESSAGE = 4000
+MAX_SESSION_ID = 128
+
+
+class ServiceError(Exception):
+    """Turned into a JSON error response with the given HTTP status"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class InlineImage:
+    """A base64 photo from a request body, with the getvalue()/type/name interface of a Streamlit UploadedFile"""
+
+    def __init__(self, data, mime_type="image/jpeg", name="upload.jpg"):
+        self.data = data
+        self.type = mime_type
+        self.name = name
+
+    def getvalue(self):
+        return self.data
+
+
+def decode_image(body):
+    encoded = body.get("image")
+    if not encoded:
+        return None
+    if not isinstance(encoded, str):
+        raise ServiceError(400, "image must be a base64 string")
+    # Data URLs from browsers carry a "data:image/png;base64," prefix
+    mime_type = body.get("image_type") or "image/jpeg"
+    if encoded.startswith("data:") and "," in encoded:
+        header, encoded = encoded.split(",", 1)
+        mime_type = header[5:].split(";")[0] or mime_type
+    try:
+        data = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise ServiceError(400, "image is not valid base64")
+    return InlineImage(data, mime_type)
+
+
+class WorkerPool:
+    """Fixed worker threads with a bounded queue; submit() refuses work when both are full"""
+
+    def __init__(self, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.stats = {'accepted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'in_flight': 0}
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['rejected'] += 1
+            count("agribot_service_rejected_total")
+            raise ServiceError(503, "service busy, please retry", {"Retry-After": "2"})
+        with self._lock:
+            self.stats['accepted'] += 1
+            self.stats['in_flight'] += 1
+        queued_at = time.perf_counter()
+
+        def run():
+            observe("agribot_service_queue_seconds", time.perf_counter() - queued_at)
+            return fn(*args)
+
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, run)
+        except RuntimeError:
+            self._release(failed=True)
+            raise ServiceError(503, "service is shutting down")
+        future.add_done_callback(lambda done: self._release(failed=done.cancelled() or done.exception() is not None))
+        return future
+
+    def _release(self, failed=False):
+        self._slots.release()
+        with self._lock:
+            self.stats['in_flight'] -= 1
+            self.stats['failed' if failed else 'completed'] += 1
+
+    def queued(self):
+        return max(self.stats['in_flight'] - self.workers, 0)
+
+    def saturated(self):
+        return self.stats['in_flight'] >= self.capacity
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class Session:
+    __slots__ = ('orchestrator', 'lock', 'last_used')
+
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+        # One request at a time per session, its history and context are not shared state.
+        # Taken before a request is queued and released when it finishes, possibly by another thread
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry:
+    """Orchestrators by server-issued session ID, least recently used first"""
+
+    def __init__(self, agent_pool, max_sessions=MAX_SESSIONS, idle=SESSION_IDLE):
+        self.agent_pool = agent_pool
+        self.max_sessions = max_sessions
+        self.idle = idle
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'created': 0, 'expired': 0}
+
+    def create(self):
+        """Returns (session ID, Session) for a new conversation.
+
+        The ID is a random token, never a user ID: it is all a client needs to
+        read the conversation, so it must not be guessable. The history is filed
+        under the orchestrator's own anonymous session ID.
+        """
+        session_id = secrets.token_urlsafe(24)
+        session = Session(SimpleAgenticOrchestrator(agent_pool=self.agent_pool))
+        with self._lock:
+            self._expire()
+            self._sessions[session_id] = session
+            self.stats['created'] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats['expired'] += 1
+        return session_id, session
+
+    def get(self, session_id):
+        """Session issued under session_id, or None when unknown or expired"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = time.monotonic()
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def _expire(self):
+        deadline = time.monotonic() - self.idle
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used >= deadline:
+                break
+            self._sessions.popitem(last=False)
+            self.stats['expired'] += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class AgriBotService:
+    """Request handling behind the HTTP layer, usable without a socket"""
+
+    def __init__(self, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE, agent_pool=None,
+                 max_sessions=MAX_SESSIONS, timeout=REQUEST_TIMEOUT):
+        self.agent_pool = agent_pool or get_agent_pool()
+        self.workers = WorkerPool(workers, queue_size)
+        self.sessions = SessionRegistry(self.agent_pool, max_sessions)
+        self.timeout = timeout
+        # Direct agent calls need no history or context
+        self.direct = SimpleAgenticOrchestrator(agent_pool=self.agent_pool, semantic_cache=False,
+                                                history_store=False)
+        self.draining = False
+        get_telemetry().add_collector(self.metrics)
+
+    def metrics(self):
+        return stats_metrics("agribot_service", {**self.workers.stats, 'queued': self.workers.queued(),
+                                                 'sessions': len(self.sessions), **self.sessions.stats})
+
+    def run(self, fn, *args):
+        """Run fn on the worker pool and wait for it, within the request timeout"""
+        return self.wait(self.workers.submit(fn, *args))
+
+    def wait(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Still queued: never start it. Already running: it finishes, the answer is dropped
+            future.cancel()
+            raise ServiceError(504, "request timed out")
+
+    def chat(self, body):
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise ServiceError(400, "message is required")
+        if len(message) > MAX_MESSAGE:
+            raise ServiceError(400, f"message is longer than {MAX_MESSAGE} characters")
+        session_id = body.get("session_id")
+        if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= MAX_SESSION_ID):
+            raise ServiceError(400, "session_id must be a non-empty string")
+        image = decode_image(body)
+        if session_id is None:
+            session_id, session = self.sessions.create()
+        else:
+            session = self.find_session(session_id)
+
+        def process():
+            response = session.orchestrator.process_request(message.strip(), image)
+            turn = session.orchestrator.conversation_history[-1]
+            return {
+                "session_id": session_id,
+                "response": response,
+                "intent": turn.intent,
+                "primary_task": turn.primary_task,
+                "agents": turn.agents_called,
+                "timed_out": turn.agents_timed_out,
+                "timings": turn.timings,
+            }
+
+        # A second request of a busy session is turned away here, so it never holds a worker
+        self.claim(session)
+        try:
+            future = self.workers.submit(process)
+        except BaseException:
+            session.lock.release()
+            raise
+        # Released when the request finishes or is dropped from the queue, not when the client gives up
+        future.add_done_callback(lambda done: session.lock.release())
+        return self.wait(future)
+
+    def find_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ServiceError(404, "unknown or expired session_id, start a new session without one")
+        return session
+
+    @staticmethod
+    def claim(session):
+        if not session.lock.acquire(blocking=False):
+            count("agribot_service_busy_total")
+            raise ServiceError(409, "session is busy with an earlier request", {"Retry-After": "1"})
+
+    def call_agent(self, agent_name, body):
+        if agent_name not in self.direct.agents:
+            raise ServiceError(404, f"unknown agent {agent_name}")
+        parameters = {key: str(body[key]) for key in PARAMETER_KEYS if body.get(key) is not None}
+        image = decode_image(body)
+        if agent_name == 'disease_detector':
+            if image is None:
+                raise ServiceError(400, "disease_detector needs an image")
+            parameters['image_file'] = image
+
+        result = self.run(self.direct.call_agent, agent_name, parameters)
+        if not isinstance(result, str):
+            result = str(result)
+        if result.startswith(AGENT_ERROR_PREFIXES):
+            raise ServiceError(502, result)
+        return {"agent": agent_name, "response": result}
+
+    def clear_session(self, session_id):
+        session = self.find_session(session_id)
+        self.claim(session)
+        try:
+            session.orchestrator.clear_history()
+            self.sessions.remove(session_id)
+        finally:
+            session.lock.release()
+        return {"session_id": session_id, "cleared": True}
+
+    def readiness(self):
+        """(ready, details); not ready while draining, without agents or with a full queue"""
+        ready = bool(self.agent_pool.agents) and not self.draining and not self.workers.saturated()
+        return ready, {
+            "ready": ready,
+            "draining": self.draining,
+            "agents": sorted(self.agent_pool.agents),
+            "in_flight": self.workers.stats['in_flight'],
+            "capacity": self.workers.capacity,
+        }
+
+    def shutdown(self):
+        self.draining = True
+        self.workers.shutdown()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ServiceError(400, "invalid Content-Length")
+        if length > MAX_BODY:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            raise ServiceError(413, f"body larger than {MAX_BODY} bytes")
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw.decode("utf-8")) if raw else {}
+        except ValueError:
+            raise ServiceError(400, "body is not valid JSON")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "body must be a JSON object")
+        return body
+
+    def dispatch(self, method):
+        start = time.perf_counter()
+        path = self.path.split("?")[0].rstrip("/") or "/"
+        endpoint = path.split("/")[1] if path != "/" else "/"
+        status = 500
+        try:
+            status, payload = self.route(method, path)
+            if isinstance(payload, str):
+                body = payload.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_json(status, payload)
+        except ServiceError as e:
+            status = e.status
+            self.send_json(status, {"error": str(e)}, e.headers)
+        except Exception as e:
+            print(f"❌ Error handling {method} {path}: {e}")
+            self.send_json(status, {"error": "internal error"})
+        finally:
+            count("agribot_service_requests_total", route=endpoint, status=status)
+            observe("agribot_service_seconds", time.perf_counter() - start, route=endpoint)
+
+    def route(self, method, path):
+        service = self.service
+        parts = path.strip("/").split("/")
+        if method == "GET":
+            if path == "/healthz":
+                return 200, {"status": "ok"}
+            if path == "/readyz":
+                ready, details = service.readiness()
+                return (200 if ready else 503), details
+            if path == "/metrics":
+                return 200, get_telemetry().prometheus_text()
+            if path == "/agents":
+                return 200, {"agents": sorted(service.agent_pool.agents)}
+        elif method == "POST":
+            # Read first so a kept-alive connection is left at the next request whatever the answer
+            body = self.read_json()
+            if service.draining:
+                raise ServiceError(503, "service is shutting down")
+            if path == "/chat":
+                return 200, service.chat(body)
+            if len(parts) == 2 and parts[0] == "agents":
+                return 200, service.call_agent(parts[1], body)
+        elif method == "DELETE":
+            if len(parts) == 2 and parts[0] == "sessions":
+                return 200, service.clear_session(parts[1])
+        raise ServiceError(404, f"no route for {method} {path}")
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Pending connections the OS keeps; the default of 5 resets bursts of new clients
+    request_queue_size = 128
+
+
+def make_server(service, host="0.0.0.0", port=SERVICE_PORT):
+    """HTTP server for service; call serve_forever() on it"""
+    server = ServiceHTTPServer((host, port), ServiceHandler)
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AgriBot HTTP/JSON API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="requests processed at once")
+    parser.add_argument("--queue", type=int, default=SERVICE_QUEUE, help="requests waiting before 503s")
+    args = parser.parse_args()
+
+    service = AgriBotService(args.workers, args.queue)
+    server = make_server(service, args.host, args.port)
+    print(f"🌾 AgriBot service on http://{args.host}:{server.server_address[1]} "
+          f"({args.workers} workers, queue {args.queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down, finishing requests in flight...")
+    finally:
+        service.draining = True
+        server.server_close()
+        service.shutdown()
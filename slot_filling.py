@@ -0,0 +1,136 @@
+# slot_filling.py - Fill request parameters locally and from the user's context
+#
+# Crops, places, soil types and quantities are picked out of the query with
+# word lists and the bundled gazetteer. Location and soil type carry over from
+# earlier turns; the crop only carries over when the query refers back to it
+# ("and where can I sell it?"). When the routed agent's slots are all known
+# this way, the parameter extraction call is skipped.
+import re
+import threading
+
+from Agents.response_cache import CROP_SYNONYMS, normalize_crop
+from Agents.gazetteer import get_gazetteer
+
+SLOTS = ('crop', 'location', 'soil_type', 'quantity')
+
+# Slots each agent needs to give a specific answer instead of a default
+REQUIRED_SLOTS = {
+    'crop_advisor': ('soil_type', 'location'),
+    'market_broker': ('crop', 'location'),
+    'alert_system': ('crop', 'location'),
+    'disease_detector': (),
+}
+
+# Slot -> user_context key written by update_context
+CONTEXT_KEYS = {'location': 'location', 'crop': 'current_crop', 'soil_type': 'soil_type'}
+
+# Facts about the farm that hold across questions; the crop changes with the topic
+STICKY_SLOTS = ('location', 'soil_type')
+
+CROPS = [
+    'wheat', 'rice', 'maize', 'cotton', 'sugarcane', 'soybean', 'groundnut', 'mustard', 'chickpea',
+    'pigeon pea', 'pearl millet', 'finger millet', 'sorghum', 'barley', 'potato', 'onion', 'tomato',
+    'chilli', 'brinjal', 'cabbage', 'cauliflower', 'okra', 'banana', 'mango', 'grapes', 'pomegranate',
+    'tea', 'coffee', 'jute', 'turmeric', 'ginger', 'garlic', 'lentil', 'green gram', 'black gram',
+    'sunflower', 'sesame', 'castor', 'coconut', 'cumin', 'guava', 'papaya', 'orange', 'apple',
+]
+
+SOIL_TYPES = ['black', 'red', 'sandy', 'loamy', 'clay', 'clayey', 'alluvial', 'laterite', 'silty', 'saline',
+              'alkaline', 'mixed', 'desert', 'mountain', 'forest', 'peaty']
+
+QUANTITY_PATTERN = re.compile(
+    r"\b(\d+(?:\.\d+)?)\s*(quintals?|qtls?|kgs?|kilograms?|tons?|tonnes?|bags?|acres?|bigha)\b", re.IGNORECASE
+)
+SOIL_PATTERN = re.compile(r"\b(" + "|".join(SOIL_TYPES) + r")\s+(?:soil|mitti|land)\b", re.IGNORECASE)
+CROP_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted({re.escape(name) for name in CROPS + list(CROP_SYNONYMS)}, key=len, reverse=True))
+    + r")(?:e?s)?\b", re.IGNORECASE
+)
+# "in X", "near X": the query names a place, which may not be in the gazetteer
+PLACE_MENTION = re.compile(r"\b(?:in|at|near|around|from)\s+([a-z][a-z.-]{2,})", re.IGNORECASE)
+NOT_PLACES = {'my', 'our', 'the', 'this', 'that', 'these', 'which', 'what', 'area', 'field', 'farm', 'village',
+              'soil', 'market', 'price', 'winter', 'summer', 'monsoon', 'rabi', 'kharif', 'season', 'india'} \
+    | set(SOIL_TYPES)
+
+# Words that point back to an earlier turn (English and romanised Hindi)
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(?:and|also|what about|how about|then)\b|"
+    r"\b(?:it|its|this crop|that crop|same|them|those|there|instead|isko|ise|iska|yeh|woh|wahi|bhi)\b",
+    re.IGNORECASE
+)
+
+
+class SlotFiller:
+    """Local entity extraction and context carry-over for request parameters"""
+
+    def __init__(self):
+        self.stats = {'extractions_skipped': 0, 'extractions': 0, 'slots_carried': 0}
+        self._lock = threading.Lock()
+
+    def extract(self, user_input):
+        """Slots found in the text itself, None where nothing matched"""
+        slots = dict.fromkeys(SLOTS)
+        crop = CROP_PATTERN.search(user_input)
+        if crop:
+            slots['crop'] = normalize_crop(crop.group(1))
+        place = get_gazetteer().resolve(user_input)
+        if place is not None:
+            slots['location'] = place.name.title()
+        soil = SOIL_PATTERN.search(user_input)
+        if soil:
+            slots['soil_type'] = soil.group(1).lower()
+        quantity = QUANTITY_PATTERN.search(user_input)
+        if quantity:
+            slots['quantity'] = f"{quantity.group(1)} {quantity.group(2).lower()}"
+        return slots
+
+    @staticmethod
+    def is_follow_up(user_input):
+        return FOLLOW_UP_PATTERN.search(user_input) is not None
+
+    @staticmethod
+    def names_unknown_place(user_input, slots):
+        """The query says "in X" but X was not recognised as a place"""
+        if slots.get('location'):
+            return False
+        return any(word.lower() not in NOT_PLACES for word in PLACE_MENTION.findall(user_input))
+
+    def merge(self, user_input, parameters, context):
+        """parameters, then local matches, then context. Returns (parameters, carried slot names)"""
+        merged, carried = self._merge(user_input, parameters, context, self.extract(user_input))
+        self._record(carried)
+        return merged, carried
+
+    def _merge(self, user_input, parameters, context, local):
+        follow_up = self.is_follow_up(user_input)
+        merged = dict(parameters)
+        carried = []
+        for slot in SLOTS:
+            value = parameters.get(slot) or local.get(slot)
+            context_key = CONTEXT_KEYS.get(slot)
+            if not value and context_key and context.get(context_key) and (slot in STICKY_SLOTS or follow_up):
+                value = context[context_key]
+                carried.append(slot)
+            merged[slot] = value
+        return merged, carried
+
+    def _record(self, carried, skipped=None):
+        with self._lock:
+            self.stats['slots_carried'] += len(carried)
+            if skipped is not None:
+                self.stats['extractions_skipped' if skipped else 'extractions'] += 1
+
+    def prefill(self, user_input, agents, context):
+        """Returns (parameters, carried, complete); complete means extraction can be skipped"""
+        local = self.extract(user_input)
+        parameters, carried = self._merge(user_input, {}, context, local)
+        required = {slot for agent in agents for slot in REQUIRED_SLOTS.get(agent, ('location',))}
+        complete = all(parameters.get(slot) for slot in required) and \
+            not self.names_unknown_place(user_input, local)
+        # When extraction still runs, merge() records what ends up carried over
+        self._record(carried if complete else [], skipped=complete)
+        return parameters, carried, complete
+
+    def skip_ratio(self):
+        total = self.stats['extractions_skipped'] + self.stats['extractions']
+        return self.stats['extractions_skipped'] / total if total else 0.0